@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 from . import aux
 from . import metrics
+from . import pipeline
 from . import txtprocess
 from . import visualization
 from . import writestoredata
@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from . import auxfun
+from . import auxfun,ratelimit,records
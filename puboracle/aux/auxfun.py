@@ -1,6 +1,35 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+from concurrent.futures import ProcessPoolExecutor
 import itertools
+import os
+
+def map_in_processes(func, *iterables, n_jobs = None):
+    '''
+    Apply func to the items of iterables (as map()), in n_jobs processes
+    
+    Input
+    -----
+    func: function, must be picklable (defined at the top level of a module)
+    
+    *iterables: the iterables with the arguments of func (as in map())
+    
+    n_jobs: int, default None, nr of processes. Default None (or 1) applies 
+        func sequentially in the current process. -1 uses all cores.
+    
+    Output
+    ------
+    generator of the results of func, in the order of iterables. 
+    
+    The processes are shut down when the generator is exhausted, closed or 
+    raises (e.g., an exception raised by func is raised by the generator)
+    '''
+    if n_jobs is None or n_jobs == 1:
+        yield from map(func, *iterables)
+        return
+    if n_jobs == -1: n_jobs = os.cpu_count()
+    with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+        yield from executor.map(func, *iterables)
     
 def peekin_generator(iterable):
     '''
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+class TokenBucket():
+    '''
+    Thread-safe token bucket that limits the rate of requests sent to a 
+    service (e.g., the E-utilities or a geocoding endpoint). One TokenBucket
+    is shared by all workers, so that the requests of all workers together 
+    do not exceed rate
+    
+    Input
+    -----
+    rate: float, nr of requests per second that are allowed
+        (e.g., NCBI allows 3 requests/sec without and 10 requests/sec with 
+        an API key, see https://www.ncbi.nlm.nih.gov/books/NBK25497/)
+        
+    capacity: int, default 1, max nr of tokens that the bucket can hold, 
+        i.e., the max nr of requests that can be sent in a burst. 
+        The default of 1 spaces the requests evenly by 1/rate seconds
+    '''
+    def __init__(self, rate, capacity = 1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def acquire(self):
+        '''
+        Block until a token is available and consume it
+        '''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, 
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+
+# Fields of a publication, named as the keys of the dict returned from
+# parse_medline_xml() of pubmed_parser
+PUBLICATION_FIELDS = (
+    'pmid', 'title', 'abstract', 'journal', 'authors', 'affiliations',
+    'pubdate', 'mesh_terms', 'publication_types', 'chemical_list', 'keywords',
+    'doi', 'pmc', 'other_id', 'medline_ta', 'nlm_unique_id', 'issn_linking',
+    'country', 'delete', 'issue', 'pages', 'references'
+    )
+
+# Fields with few distinct values that are repeated across many 
+# publications (e.g., the journal). Their str are interned, so that each 
+# distinct value is stored once in memory
+INTERNED_FIELDS = frozenset((
+    'journal', 'pubdate', 'publication_types', 'medline_ta', 
+    'nlm_unique_id', 'issn_linking', 'country'
+    ))
+
+# Fields whose str as a whole is nearly unique per publication, but whose 
+# parts are repeated across many publications (e.g., the same institution 
+# in thousands of papers), with the delimeter of the parts. They are stored
+# as a tuple of interned parts and joined again when they are accessed
+SPLIT_FIELDS = {'affiliations': ';'}
+
+# Fields that are accessed as attributes or keys of a Publication
+_FIELDS = PUBLICATION_FIELDS + ('xml_file',)
+
+class Publication():
+    '''
+    Compact record of a publication. Fields are stored in __slots__ (no dict
+    per record), the str of INTERNED_FIELDS are interned and the str of 
+    SPLIT_FIELDS are stored as tuples of interned parts.
+
+    Fields are accessed as attributes (pub.affiliations) or as keys
+    (pub['affiliations']), so a Publication can be used where the dict
+    records of readwritefun are used. Fields that were not parsed are None
+
+    Input
+    -----
+    xml_file: str, default None, the xml file name that the publication was
+        read from
+
+    **fields: the values of the fields (see PUBLICATION_FIELDS)
+
+    Example
+    -------
+    pub = Publication(xml_file = 'xml_0.xml',
+                      pmid = '123',
+                      affiliations = 'Dept A, Uni B;Dept C, Uni D'
+                      )
+    print(pub.affiliations, pub['pmid'])
+    '''
+    __slots__ = tuple([('_' + field if field in SPLIT_FIELDS else field) 
+                       for field in _FIELDS])
+
+    def __init__(self, xml_file = None, **fields):
+        not_supported = [field for field in fields if field not in PUBLICATION_FIELDS]
+        if not_supported:
+            raise ValueError('Fields not supported: ' + str(not_supported) +
+                             ' supported fields: ' + str(list(PUBLICATION_FIELDS)))
+        for field in PUBLICATION_FIELDS:
+            value = fields.get(field)
+            if field in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+        self.xml_file = sys.intern(xml_file) if isinstance(xml_file, str) else xml_file
+
+    def __getitem__(self, key):
+        if key not in _FIELDS: raise KeyError(key)
+
+        return getattr(self, key)
+
+    def get(self, key, default = None):
+        value = getattr(self, key, None) if key in _FIELDS else None
+
+        return default if value is None else value
+
+    def as_dict(self, keys = None):
+        '''
+        Return the fields in keys (default all the fields that are not None)
+        as a dict
+        '''
+        if keys is None:
+            keys = [field for field in PUBLICATION_FIELDS if getattr(self, field) is not None]
+
+        return {key: getattr(self, key) for key in keys}
+
+    def __getstate__(self):
+        return tuple([getattr(self, field) for field in _FIELDS])
+
+    def __setstate__(self, state):
+        # Interning is not preserved by pickling, so intern again
+        fields = dict(zip(_FIELDS, state))
+        self.__init__(**fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, Publication): return NotImplemented
+
+        return self.__getstate__() == other.__getstate__()
+
+    def __repr__(self):
+        return 'Publication(' + ', '.join([key + '=' + repr(value) for key, value in self.as_dict().items()]) + ')'
+
+def _split_field(field, delimeter):
+    # Property of a field of SPLIT_FIELDS, stored in the slot '_' + field
+    slot = '_' + field
+
+    def get(self):
+        parts = getattr(self, slot)
+        return delimeter.join(parts) if isinstance(parts, tuple) else parts
+
+    def set(self, value):
+        if isinstance(value, str):
+            value = tuple([sys.intern(part) for part in value.split(delimeter)])
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+for field, delimeter in SPLIT_FIELDS.items():
+    setattr(Publication, field, _split_field(field, delimeter))
+
+def values_to_publications(keys_to_parse, values, xml_file = None):
+    '''
+    Convert parallel lists of values (as returned from
+    readwritefun.read_xml_to_dict()) to Publication records
+
+    Input
+    -----
+    keys_to_parse: list of str, the keys of values
+
+    values: list of len(keys_to_parse) of lists, values[i] contains the
+        values of key=keys_to_parse[i]
+
+    xml_file: str or list of str, default None, the xml file name of all
+        the publications or of each publication
+
+    Output
+    ------
+    publications: list of Publication
+    '''
+    nr_pubs = len(values[0]) if values else 0
+    if xml_file is None or isinstance(xml_file, str):
+        xml_file = [xml_file] * nr_pubs
+    publications = [Publication(xml_file = xml_file[i],
+                                **{key: values[k][i] for k, key in enumerate(keys_to_parse)})
+                    for i in range(nr_pubs)]
+
+    return publications
+
+def publications_to_values(publications, keys_to_parse = None):
+    '''
+    Convert Publication records to parallel lists of values (the inverse of
+    values_to_publications())
+
+    Input
+    -----
+    publications: list of Publication
+
+    keys_to_parse: list of str, the fields to be returned
+
+    Output
+    ------
+    values: list of len(keys_to_parse) of lists, values[i] contains the
+        values of key=keys_to_parse[i]
+
+    xml_file: list of str, the xml file name of each publication
+    '''
+    values = [[getattr(pub, key) for pub in publications] for key in keys_to_parse]
+    xml_file = [pub.xml_file for pub in publications]
+
+    return values, xml_file
+
+def get_field_values(items, key = 'affiliations'):
+    '''
+    Get the values of field key if items is a list of Publication records,
+    so that functions expecting a list of str can also be given records.
+    Otherwise return items unchanged. Missing values (None) become ''
+
+    Input
+    -----
+    items: list of str or list of Publication
+
+    key: str, default 'affiliations', the field to get from Publication
+        records
+
+    Output
+    ------
+    list of str
+    '''
+    if len(items) > 0 and isinstance(items[0], Publication):
+        return [pub.get(key, '') for pub in items]
+
+    return items
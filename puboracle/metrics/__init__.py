@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from . import netmetrics,txtmetrics
+from . import graphmetrics,netmetrics,txtmetrics
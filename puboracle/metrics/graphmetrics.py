@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import heapq
+import json
+import numpy as np
+import os
+import pandas as pd
+
+from igraph import Graph
+
+from . import netmetrics
+from ..writestoredata import readwritefun
+
+# Node metrics of compute_node_metrics(). Each function takes an igraph
+# object with the edge attribute 'weight' and returns one value per vertex
+NODE_METRICS = dict(netmetrics.SLICE_METRICS,
+                    community = lambda net: net.as_undirected(combine_edges = 'sum').community_multilevel(weights = 'weight').membership
+                    )
+
+def graph_fingerprint(net, weights = 'weight', labels = 'label'):
+    '''
+    Compute a fingerprint of a graph from its vertices, edges, weights and
+    labels. Graphs with the same fingerprint give the same metrics, so it
+    is used as the key of the metrics cache
+
+    Input
+    -----
+    net: igraph object (e.g., returned from
+        netmetrics.create_network_from_edge_wei_list())
+
+    weights: str, default 'weight', the edge attribute with the weights.
+        If None or missing, the weights are not included
+
+    labels: str, default 'label', the vertex attribute with the labels.
+        If None or missing, the labels are not included
+
+    Output
+    ------
+    fingerprint: str, the sha256 hex digest
+    '''
+    h = hashlib.sha256()
+    h.update(json.dumps([net.vcount(), net.ecount(), net.is_directed()]).encode())
+    h.update(np.asarray(net.get_edgelist(), dtype = np.int64).tobytes())
+    if weights is not None and weights in net.es.attributes():
+        h.update(np.asarray(net.es[weights], dtype = np.float64).tobytes())
+    if labels is not None and labels in net.vs.attributes():
+        h.update(json.dumps(net.vs[labels]).encode())
+
+    return h.hexdigest()
+
+def _metric_cache_key(fingerprint, metric, params = None):
+    params_hash = hashlib.sha256(json.dumps([metric, params], sort_keys = True).encode()).hexdigest()
+
+    return fingerprint + '_' + metric + '_' + params_hash[:16]
+
+# Graph of the current worker process (see _init_worker())
+_WORKER_GRAPH = {}
+
+def _graph_to_arrays(net):
+    '''
+    The vertices, edges and weights of net, to build the graph again in
+    another process
+    '''
+    weights = net.es['weight'] if 'weight' in net.es.attributes() else [1.] * net.ecount()
+
+    return net.vcount(), net.get_edgelist(), weights, net.is_directed()
+
+def _init_worker(nr_vertices, edges, weights, directed):
+    _WORKER_GRAPH['net'] = Graph(n = nr_vertices,
+                                 edges = edges,
+                                 directed = directed,
+                                 edge_attrs = {'weight': weights}
+                                 )
+
+def _compute_worker_metric(metric):
+    return np.asarray(NODE_METRICS[metric](_WORKER_GRAPH['net']), dtype = np.float64)
+
+def compute_node_metrics(net,
+                         metrics = ('degree', 'strength', 'pagerank', 'coreness', 'community'),
+                         n_jobs = None,
+                         cache_folder = None
+                         ):
+    '''
+    Compute node metrics of a graph, one metric per process
+
+    Input
+    -----
+    net: igraph object with the edge attribute 'weight' (e.g., returned from
+        netmetrics.create_network_from_edge_wei_list())
+
+    metrics: tuple of str, default ('degree', 'strength', 'pagerank',
+        'coreness', 'community'), keys of NODE_METRICS. 'community' is the
+        community of each vertex from the Louvain algorithm (on the
+        undirected graph). The Louvain algorithm is randomized, so the
+        communities can differ between runs (unless cached)
+
+    n_jobs: int, default None, nr of processes computing metrics in
+        parallel. Default None computes the metrics sequentially.
+        -1 uses all cores. Each process builds its own copy of net
+
+    cache_folder: str or pathlib.PosixPath object, default None, folder
+        where each metric is cached, keyed by the fingerprint of net
+        (see graph_fingerprint()), so metrics of the same graph are
+        computed only once. If None no cache is used
+
+    Output
+    ------
+    node_metrics: pandas.DataFrame with one row per vertex (index: the
+        labels of net, if any) and one column per metric
+
+    Example
+    -------
+    net = netmetrics.create_network_from_edge_wei_list(all_edges,
+                                                       nr_vertices = len(unique_affiliations_cleaned),
+                                                       labels = unique_affiliations_cleaned
+                                                       )
+    node_metrics = compute_node_metrics(net, n_jobs = -1, cache_folder = 'metrics_cache')
+    print(node_metrics.sort_values('pagerank', ascending = False).head(10))
+    '''
+    labels = net.vs['label'] if 'label' in net.vs.attributes() else None
+    values = {}
+    if cache_folder is not None:
+        fingerprint = graph_fingerprint(net)
+        for metric in metrics:
+            cached = readwritefun.load_from_cache(cache_folder, _metric_cache_key(fingerprint, metric))
+            if cached is not None: values[metric] = cached
+        if values: print('\nMetrics loaded from cache...:', list(values))
+    to_compute = [metric for metric in metrics if metric not in values]
+
+    if n_jobs is None or n_jobs == 1 or len(to_compute) < 2:
+        if 'weight' not in net.es.attributes():
+            _init_worker(*_graph_to_arrays(net))
+            net = _WORKER_GRAPH.pop('net')
+        results = [np.asarray(NODE_METRICS[metric](net), dtype = np.float64) for metric in to_compute]
+    else:
+        if n_jobs == -1: n_jobs = os.cpu_count()
+        with ProcessPoolExecutor(max_workers = min(n_jobs, len(to_compute)),
+                                 initializer = _init_worker,
+                                 initargs = _graph_to_arrays(net)
+                                 ) as executor:
+            # map() returns the results in the order of to_compute
+            results = list(executor.map(_compute_worker_metric, to_compute))
+    for metric, result in zip(to_compute, results):
+        values[metric] = result
+        if cache_folder is not None:
+            readwritefun.store_in_cache(cache_folder, _metric_cache_key(fingerprint, metric), result)
+
+    node_metrics = pd.DataFrame({metric: values[metric] for metric in metrics},
+                                index = labels,
+                                columns = list(metrics)
+                                )
+
+    return node_metrics
+
+def _graph_to_csr(net, weights = None):
+    '''
+    Out- and in-neighbours (CSR) of each vertex and the length of each
+    connection (1 if weights is None), as lists for fast access
+    '''
+    edges = np.asarray(net.get_edgelist(), dtype = np.int64).reshape(-1, 2)
+    if weights is None:
+        lengths = np.ones(len(edges))
+    else:
+        lengths = np.asarray(net.es[weights], dtype = np.float64)
+    rows, cols = edges[:, 0], edges[:, 1]
+    if not net.is_directed():
+        rows, cols = np.concatenate((rows, cols)), np.concatenate((cols, rows))
+        lengths = np.concatenate((lengths, lengths))
+    n = net.vcount()
+    # Keep every edge (also multiple edges), so no duplicates are summed
+    order = np.lexsort((cols, rows))
+    out_ptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength = n))))
+    order_in = np.lexsort((rows, cols))
+    in_ptr = np.concatenate(([0], np.cumsum(np.bincount(cols, minlength = n))))
+
+    return (out_ptr.tolist(), cols[order].tolist(), lengths[order].tolist(),
+            in_ptr.tolist(), rows[order_in].tolist(), lengths[order_in].tolist(),
+            weights is not None)
+
+def _single_source_dependencies(csr, source):
+    '''
+    Dependencies of the source on each vertex (Brandes, 2001), with BFS
+    (unweighted) or Dijkstra (weighted) from source
+    '''
+    out_ptr, out_idx, out_len, in_ptr, in_idx, in_len, weighted = csr
+    n = len(out_ptr) - 1
+    dist = [-1.] * n
+    sigma = [0.] * n
+    dist[source] = 0.
+    sigma[source] = 1.
+    visited = []#vertices in order of non-decreasing distance
+    if not weighted:
+        q = deque([source])
+        while q:
+            v = q.popleft()
+            visited.append(v)
+            for i in range(out_ptr[v], out_ptr[v + 1]):
+                w = out_idx[i]
+                if dist[w] < 0:
+                    dist[w] = dist[v] + 1.
+                    q.append(w)
+                if dist[w] == dist[v] + 1.: sigma[w] += sigma[v]
+    else:
+        done = [False] * n
+        heap = [(0., source)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if done[v] or d > dist[v]: continue
+            done[v] = True
+            visited.append(v)
+            for i in range(out_ptr[v], out_ptr[v + 1]):
+                w = out_idx[i]
+                if done[w]: continue
+                d_w = d + out_len[i]
+                if dist[w] < 0 or d_w < dist[w] - 1e-10 * d_w:
+                    dist[w] = d_w
+                    heapq.heappush(heap, (d_w, w))
+        # Count shortest paths in order of distance
+        for v in visited[1:]:
+            for i in range(in_ptr[v], in_ptr[v + 1]):
+                u = in_idx[i]
+                if dist[u] >= 0 and abs(dist[u] + in_len[i] - dist[v]) <= 1e-10 * dist[v]:
+                    sigma[v] += sigma[u]
+    # Accumulate dependencies in order of non-increasing distance
+    delta = [0.] * n
+    for w in reversed(visited):
+        coeff = (1. + delta[w]) / sigma[w]
+        for i in range(in_ptr[w], in_ptr[w + 1]):
+            v = in_idx[i]
+            if dist[v] < 0: continue
+            if weighted:
+                on_path = abs(dist[v] + in_len[i] - dist[w]) <= 1e-10 * dist[w]
+            else:
+                on_path = dist[v] == dist[w] - 1.
+            if on_path: delta[v] += sigma[v] * coeff
+    delta[source] = 0.
+
+    return np.asarray(delta)
+
+def _init_betweenness_worker(csr):
+    _WORKER_GRAPH['csr'] = csr
+
+def _sum_dependencies(sources):
+    '''
+    Sum and sum of squares of the dependencies of sources on each vertex
+    '''
+    csr = _WORKER_GRAPH['csr']
+    n = len(csr[0]) - 1
+    total = np.zeros(n)
+    total_sq = np.zeros(n)
+    for source in sources:
+        delta = _single_source_dependencies(csr, source)
+        total += delta
+        total_sq += delta ** 2
+
+    return total, total_sq
+
+def approximate_betweenness(net,
+                            nr_samples = 100,
+                            weights = None,
+                            seed = None,
+                            n_jobs = None,
+                            cache_folder = None
+                            ):
+    '''
+    Approximate the betweenness of each vertex from the shortest paths
+    starting at a random sample of vertices (Brandes & Pich, 2007). The
+    exact betweenness needs the shortest paths from all N vertices, so the
+    time is reduced by N / nr_samples. The sample is drawn without
+    replacement, so with nr_samples >= N the betweenness is exact
+
+    Input
+    -----
+    net: igraph object (e.g., returned from
+        netmetrics.create_network_from_edge_wei_list())
+
+    nr_samples: int, default 100, nr of source vertices
+
+    weights: str, default None, the edge attribute used as the length of
+        the edges (as in igraph.Graph.betweenness(), so larger weights are
+        longer paths). If None, all edges have length 1
+
+    seed: int, default None, seed of the sampling of the sources
+
+    n_jobs: int, default None, nr of processes computing the shortest paths
+        of the sources in parallel. Default None computes them sequentially.
+        -1 uses all cores.
+
+    cache_folder: str or pathlib.PosixPath object, default None, see
+        compute_node_metrics(). The results are cached only if seed is not
+        None
+
+    Output
+    ------
+    betweenness: pandas.DataFrame with one row per vertex (index: the
+        labels of net, if any) and the columns:
+        'betweenness': the estimated betweenness, on the scale of
+            igraph.Graph.betweenness()
+        'se': the standard error of the estimate (0 if the betweenness is
+            exact). betweenness +/- 1.96 * se is an approximate 95%
+            confidence interval
+
+    Example
+    -------
+    betweenness = approximate_betweenness(net, nr_samples = 500, seed = 0, n_jobs = -1)
+    print(betweenness.sort_values('betweenness', ascending = False).head(10))
+    '''
+    n = net.vcount()
+    nr_samples = min(nr_samples, n)
+    labels = net.vs['label'] if 'label' in net.vs.attributes() else None
+    use_cache = cache_folder is not None and seed is not None
+    if use_cache:
+        cache_key = _metric_cache_key(graph_fingerprint(net),
+                                      'betweenness',
+                                      params = [nr_samples, weights, seed]
+                                      )
+        cached = readwritefun.load_from_cache(cache_folder, cache_key)
+        if cached is not None:
+            print('\nBetweenness loaded from cache...')
+            return pd.DataFrame(cached, index = labels, columns = ['betweenness', 'se'])
+
+    sources = np.random.RandomState(seed).choice(n, size = nr_samples, replace = False).tolist()
+    csr = _graph_to_csr(net, weights = weights)
+    if n_jobs is None or n_jobs == 1:
+        _init_betweenness_worker(csr)
+        results = [_sum_dependencies(sources)]
+        _WORKER_GRAPH.pop('csr')
+    else:
+        if n_jobs == -1: n_jobs = os.cpu_count()
+        chunks = [chunk.tolist() for chunk in np.array_split(sources, n_jobs) if len(chunk)]
+        with ProcessPoolExecutor(max_workers = len(chunks),
+                                 initializer = _init_betweenness_worker,
+                                 initargs = (csr,)
+                                 ) as executor:
+            results = list(executor.map(_sum_dependencies, chunks))
+    total = sum([result[0] for result in results])
+    total_sq = sum([result[1] for result in results])
+
+    # Each sampled source estimates the betweenness with N * its dependency.
+    # Undirected paths are counted from both ends, so they are halved
+    # (as in igraph)
+    scale = n / (1. if net.is_directed() else 2.)
+    mean = total / nr_samples
+    estimate = scale * mean
+    if nr_samples > 1:
+        var = np.maximum(total_sq - nr_samples * mean ** 2, 0.) / (nr_samples - 1)
+        # Finite population correction, the sources are sampled without
+        # replacement
+        se = scale * np.sqrt(var / nr_samples * (n - nr_samples) / (n - 1))
+    else:
+        se = np.full(n, np.nan)
+    values = {'betweenness': estimate, 'se': se}
+    if use_cache: readwritefun.store_in_cache(cache_folder, cache_key, values)
+
+    return pd.DataFrame(values, index = labels, columns = ['betweenness', 'se'])
@@ -2,13 +2,22 @@
 # -*- coding: utf-8 -*-
 from collections import Counter
 import itertools
+import numpy as np
+import pandas as pd
+import pickle
+import re
+from scipy import sparse
 from tqdm import tqdm
 
 from igraph import Graph
 
+from ..aux import auxfun, records
+
 def construct_edges_list(list_unique_items, 
                          list_coitems = None,
-                         exclude = []):
+                         exclude = [],
+                         key = 'affiliations',
+                         delimeter = ';'):
     '''
     Input
     -----
@@ -18,8 +27,16 @@ def construct_edges_list(list_unique_items,
     list_coitems: list of lists, with list_items[i] containing a list of "co-occuring"
             items. A connection will be placed in the network between them.
         
+            list_coitems can also be a list of aux.records.Publication, 
+            with the co-occuring items of each publication in its field key
+            seperated by delimeter
+        
     exclude: list of str, default [], containing str that will function 
             as filter e.g., ['', ' '] 
+            
+    key: str, default 'affiliations', the field of the Publication records
+    
+    delimeter: str, default ';', the delimeter of the items in field key
     
     Output
     ------
@@ -29,6 +46,11 @@ def construct_edges_list(list_unique_items,
     the sum of each unique pair denotes the strength of the association
     between i,j
     '''           
+    if len(list_coitems) > 0 and isinstance(list_coitems[0], records.Publication):
+        list_coitems = [txt.split(delimeter) for txt in records.get_field_values(list_coitems, key = key)]
+    # Map items to vertex ids once, instead of list_unique_items.index() 
+    # for every item
+    item_ids = get_item_ids(list_unique_items)
     all_edges = []
     # Iterate list_coitems - it is a list of of list of str
     #print(' Calculating network edges...')
@@ -43,7 +65,10 @@ def construct_edges_list(list_unique_items,
             current_coitems = [cci for cci in current_coitems if cci not in exclude]   
         # Get the indexes of each coauthor in the co_authors list
         # These indexes will be vertices indexes for network
-        items_idx = [list_unique_items.index(cci) for cci in current_coitems]
+        try:
+            items_idx = [item_ids[cci] for cci in current_coitems]
+        except KeyError as e:
+            raise ValueError(str(e) + ' is not in list_unique_items')
         # Make pairs of indices between co-authors
         all_pairs = list(itertools.combinations(items_idx, 2))
         if len(all_pairs) > 1:
@@ -53,20 +78,138 @@ def construct_edges_list(list_unique_items,
         
     return all_edges
 
+def get_item_ids(list_unique_items):
+    '''
+    Map each item to its index in list_unique_items (the vertex id)
+    
+    Input
+    -----
+    list_unique_items: list of unique items to serve as nodes of the network 
+    
+    Output
+    ------
+    item_ids: dict with keys: items and values: int, the index of the first
+        occurence of each item in list_unique_items 
+        (as list_unique_items.index())
+    '''
+    item_ids = {}
+    for i, item in enumerate(list_unique_items):
+        item_ids.setdefault(item, i)
+        
+    return item_ids
+
+# Row/column indexes of all pairs (i<j) of k items, cached for each k
+_PAIR_INDEXES = {}
+
+def _pair_indexes(k):
+    if k not in _PAIR_INDEXES: _PAIR_INDEXES[k] = np.triu_indices(k, 1)
+    
+    return _PAIR_INDEXES[k]
+
+def construct_edges_array(list_unique_items, 
+                          list_coitems = None,
+                          exclude = [],
+                          key = 'affiliations',
+                          delimeter = ';',
+                          dtype = np.int32
+                          ):
+    '''
+    Array version of construct_edges_list(): the items are mapped to vertex 
+    ids with a dict (see get_item_ids()) and the edges are written in a 
+    preallocated array, so the time grows linearly with the nr of items 
+    
+    Input
+    -----
+    dtype: numpy integer type, default numpy.int32, type of the vertex ids
+    
+    For the rest of the parameters, see construct_edges_list()
+    
+    Output
+    ------
+    all_edges: ndarray of shape (E, 2) of dtype, the same edges (and in the 
+        same order) as the list of tuples returned from construct_edges_list()
+        
+        Feed it to create_network_from_edge_wei_list() directly or aggregate
+        the edges with aggregate_edges()
+    '''
+    if len(list_coitems) > 0 and isinstance(list_coitems[0], records.Publication):
+        list_coitems = [txt.split(delimeter) for txt in records.get_field_values(list_coitems, key = key)]
+    item_ids = get_item_ids(list_unique_items)
+    exclude = set(exclude)
+    
+    # First pass: the vertex ids of each list of items and the nr of edges
+    all_items_idx = []
+    nr_edges = 0
+    for current_coitems in list_coitems:
+        current_coitems = [cci for cci in current_coitems if not cci.isspace() and cci and cci not in exclude]
+        try:
+            items_idx = np.array([item_ids[cci] for cci in current_coitems], dtype = dtype)
+        except KeyError as e:
+            raise ValueError(str(e) + ' is not in list_unique_items')
+        k = len(items_idx)
+        # Keep the edges only if there are more than one pairs (k > 2), as
+        # in construct_edges_list()
+        if k * (k - 1) // 2 > 1:
+            all_items_idx.append(items_idx)
+            nr_edges += k * (k - 1) // 2
+    
+    # Second pass: write the pairs of each list of items
+    all_edges = np.empty((nr_edges, 2), dtype = dtype)
+    start = 0
+    for items_idx in all_items_idx:
+        rows, cols = _pair_indexes(len(items_idx))
+        end = start + len(rows)
+        all_edges[start:end, 0] = items_idx[rows]
+        all_edges[start:end, 1] = items_idx[cols]
+        start = end
+        
+    return all_edges
+
+def aggregate_edges(all_edges, nr_vertices = None):
+    '''
+    Count the occurences of each edge (the edge weight), vectorized 
+    
+    Input
+    -----
+    all_edges: ndarray of shape (E, 2) of int (returned from 
+        construct_edges_array()) or list of tuples (i,j)
+        
+    nr_vertices: int, default None, nr of vertices (max vertex id + 1). 
+        If None it is computed from all_edges
+    
+    Output
+    ------
+    edges: ndarray of shape (U, 2), the unique edges. (i,j) and (j,i) are 
+        counted seperately, as in create_network_from_edge_wei_list()
+        
+    weights: ndarray of shape (U,), the nr of occurences of each edge
+    '''
+    all_edges = np.asarray(all_edges, dtype = np.int64).reshape(-1, 2)
+    if nr_vertices is None: nr_vertices = int(all_edges.max()) + 1 if len(all_edges) else 0
+    # Encode each edge as one int, so that unique counts 1-d values
+    codes = all_edges[:, 0] * nr_vertices + all_edges[:, 1]
+    codes, weights = np.unique(codes, return_counts = True)
+    edges = np.column_stack((codes // max(nr_vertices, 1), codes % max(nr_vertices, 1)))
+    
+    return edges, weights
+
 def create_network_from_edge_wei_list(all_edges,
                                       nr_vertices = None,
                                       labels = None,
                                       directed = False,
                                       multiple = True,
                                       loops = False, 
-                                      combine_edges = 'mean'):
+                                      combine_edges = 'mean',
+                                      weights = None):
     '''
     Create a igraph object from the list of edges all_edges
     
     Input
     -----
     all_edges: list of tuples of int specifying pairs of nodes (each a unique 
-        int) that are connected (returned from construct_edges_list)
+        int) that are connected (returned from construct_edges_list), or 
+        ndarray of shape (E, 2) (returned from construct_edges_array()) 
+        whose edges are aggregated with aggregate_edges()
     
     nr_vertices: int, default None, a positive integer specyfying the number 
         of vertices in the graph
@@ -84,6 +227,10 @@ def create_network_from_edge_wei_list(all_edges,
         combined when simplifying the graph
         See https://igraph.org/python/doc/igraph.GraphBase-class.html#simplify 
         
+    weights: list or ndarray of len(all_edges), default None, the weights of 
+        the edges, if all_edges are already aggregated (unique edges, e.g., 
+        returned from aggregate_edges()). If None the weight of each edge is
+        its nr of occurences in all_edges
     
     Output
     ------
@@ -92,11 +239,18 @@ def create_network_from_edge_wei_list(all_edges,
     net = Graph(directed = directed)
     net.add_vertices(nr_vertices)
     
-    # Create a counter object that summarizes unique edges and their occurence
-    # The edge occurence is treated a the edge weight
-    counted_edges = Counter(all_edges)
-    edges = [pair for pair in counted_edges.keys()] # list of tuples (unique edges)
-    weights = [wei for wei in counted_edges.values()] # list of weights
+    if weights is not None:
+        edges = all_edges
+    elif isinstance(all_edges, np.ndarray):
+        edges, weights = aggregate_edges(all_edges, nr_vertices = nr_vertices)
+    else:
+        # Create a counter object that summarizes unique edges and their occurence
+        # The edge occurence is treated a the edge weight
+        counted_edges = Counter(all_edges)
+        edges = [pair for pair in counted_edges.keys()] # list of tuples (unique edges)
+        weights = [wei for wei in counted_edges.values()] # list of weights
+    if isinstance(edges, np.ndarray): edges = edges.tolist()
+    if isinstance(weights, np.ndarray): weights = weights.tolist()
     
     # Add edges and respective weights to the graph
     net.add_edges(edges)
@@ -112,3 +266,541 @@ def create_network_from_edge_wei_list(all_edges,
     net.vs['label'] = labels
     
     return net
+
+def construct_incidence_matrix(list_unique_items, 
+                               list_coitems = None,
+                               exclude = [],
+                               key = 'affiliations',
+                               delimeter = ';'
+                               ):
+    '''
+    Construct the incidence matrix B of papers x items (e.g., affiliations 
+    or authors), with B[p,i] = 1 if item i occurs in paper p 
+    
+    Input
+    -----
+    See construct_edges_list()
+    
+    Output
+    ------
+    B: scipy.sparse.csr_matrix of shape (len(list_coitems), 
+        len(list_unique_items)) of int32
+    '''
+    if len(list_coitems) > 0 and isinstance(list_coitems[0], records.Publication):
+        list_coitems = [txt.split(delimeter) for txt in records.get_field_values(list_coitems, key = key)]
+    item_ids = get_item_ids(list_unique_items)
+    exclude = set(exclude)
+    indptr = [0]
+    indices = []
+    for current_coitems in list_coitems:
+        try:
+            indices.extend([item_ids[cci] for cci in current_coitems 
+                            if not cci.isspace() and cci and cci not in exclude])
+        except KeyError as e:
+            raise ValueError(str(e) + ' is not in list_unique_items')
+        indptr.append(len(indices))
+    B = sparse.csr_matrix((np.ones(len(indices), dtype = np.int32), 
+                           np.asarray(indices, dtype = np.int32), 
+                           np.asarray(indptr, dtype = np.int64)),
+                          shape = (len(list_coitems), len(list_unique_items)))
+    # An item occuring more than once in a paper is counted once
+    B.sum_duplicates()
+    B.data[:] = 1
+    
+    return B
+
+def cooccurrence_matrix(B, normalization = None):
+    '''
+    Compute the co-occurrence (weighted adjacency) matrix C = B^T B of the 
+    items of an incidence matrix, with C[i,j] the nr of papers where items 
+    i and j co-occur (i != j) 
+    
+    Input
+    -----
+    B: scipy.sparse matrix of papers x items (returned from 
+        construct_incidence_matrix())
+        
+    normalization: str, {'association', 'salton', 'jaccard'}, default None,
+        normalization of C by the nr of papers s_i of each item:
+            'association': association strength C[i,j] / (s_i * s_j)
+            'salton': Salton's cosine C[i,j] / sqrt(s_i * s_j)
+            'jaccard': C[i,j] / (s_i + s_j - C[i,j])
+        If None, the co-occurrence counts are returned
+    
+    Output
+    ------
+    C: scipy.sparse.csr_matrix of shape (nr items, nr items), symmetric with
+        zero diagonal (float if normalization is not None)
+    '''
+    B = sparse.csr_matrix(B)
+    C = (B.T @ B).tocsr()
+    occurences = C.diagonal().astype(np.float64)#s_i, nr of papers of each item
+    C.setdiag(0)
+    C.eliminate_zeros()
+    if normalization is None: return C
+    
+    C = C.tocoo()
+    s_i = occurences[C.row]
+    s_j = occurences[C.col]
+    if normalization == 'association':
+        data = C.data / (s_i * s_j)
+    elif normalization == 'salton':
+        data = C.data / np.sqrt(s_i * s_j)
+    elif normalization == 'jaccard':
+        data = C.data / (s_i + s_j - C.data)
+    else:
+        raise ValueError('normalization must be one of: None, association, salton, jaccard')
+    C = sparse.csr_matrix((data, (C.row, C.col)), shape = C.shape)
+    
+    return C
+
+def create_network_from_adjacency(C, 
+                                  labels = None, 
+                                  directed = False
+                                  ):
+    '''
+    Create an igraph object from a sparse weighted adjacency matrix, adding
+    all the edges at once 
+    
+    Input
+    -----
+    C: scipy.sparse matrix of shape (N, N), the weighted adjacency matrix 
+        (e.g., returned from cooccurrence_matrix()). If directed is False, 
+        only the upper triangle is used
+        
+    labels: list of str of len N, default None, the labels of the vertices
+    
+    directed: bool, default False, specyfying if the graph is directed
+    
+    Output
+    ------
+    net: igraph object with the edge attribute 'weight' 
+    
+    Example
+    -------
+    B = construct_incidence_matrix(unique_affiliations_cleaned, 
+                                   list_coitems = co_occurying
+                                   )
+    C = cooccurrence_matrix(B, normalization = 'salton')
+    net = create_network_from_adjacency(C, labels = unique_affiliations_cleaned)
+    '''
+    if directed is False: C = sparse.triu(C, k = 1)
+    C = sparse.coo_matrix(C)
+    net = Graph(n = C.shape[0],
+                edges = list(zip(C.row.tolist(), C.col.tolist())),
+                directed = directed,
+                edge_attrs = {'weight': C.data.tolist()}
+                )
+    net.vs['label'] = labels
+    
+    return net
+
+class IncrementalNetwork():
+    '''
+    Co-occurrence network (e.g., of affiliations) that is updated with new 
+    batches of papers, instead of being constructed again from all papers. 
+    It holds the map of labels to vertex ids and the edge weights (the nr of
+    papers where two items co-occur, as in cooccurrence_matrix()), and an 
+    igraph object that is updated only with the new vertices and edges
+    
+    Input
+    -----
+    exclude: list of str, default [], containing str that will function 
+        as filter e.g., ['', ' '] 
+        
+    key: str, default 'affiliations', the field used if papers are 
+        aux.records.Publication
+        
+    delimeter: str, default ';', the delimeter of the items in field key
+    
+    Example
+    -------
+    inet = IncrementalNetwork()
+    inet.add_papers(co_occurying)#e.g., [ac.split(';') for ac in affiliations_cleaned]
+    net = inet.get_graph()
+    inet.add_papers(co_occurying_next_batch)
+    net = inet.get_graph()#the same igraph object, updated
+    inet.save('affil_net.pkl')
+    '''
+    def __init__(self, exclude = [], key = 'affiliations', delimeter = ';'):
+        self.exclude = set(exclude)
+        self.key = key
+        self.delimeter = delimeter
+        self.labels = []#label of each vertex id
+        self.item_ids = {}#label: vertex id
+        self.weights = {}#(i,j) with i<j: weight
+        self.nr_papers = 0
+        self._net = None
+        self._edge_ids = {}#(i,j): edge id in _net
+        self._changed = set()#edges added or updated since the last get_graph()
+        
+    def add_papers(self, list_coitems):
+        '''
+        Add papers to the network: new items become new vertices and the 
+        weight of the edge of each pair of items of a paper is increased by 1
+        
+        Input
+        -----
+        list_coitems: list of lists of str, the co-occuring items of each 
+            paper, or list of aux.records.Publication
+            
+        Output
+        ------
+        nr_new_vertices: int, nr of vertices added
+        '''
+        if len(list_coitems) > 0 and isinstance(list_coitems[0], records.Publication):
+            list_coitems = [txt.split(self.delimeter) for txt in 
+                            records.get_field_values(list_coitems, key = self.key)]
+        nr_vertices = len(self.labels)
+        for current_coitems in list_coitems:
+            items_idx = set()
+            for cci in current_coitems:
+                if cci.isspace() or not cci or cci in self.exclude: continue
+                if cci not in self.item_ids:
+                    self.item_ids[cci] = len(self.labels)
+                    self.labels.append(cci)
+                items_idx.add(self.item_ids[cci])
+            for pair in itertools.combinations(sorted(items_idx), 2):
+                self.weights[pair] = self.weights.get(pair, 0) + 1
+                self._changed.add(pair)
+        self.nr_papers += len(list_coitems)
+        
+        return len(self.labels) - nr_vertices
+    
+    def get_graph(self):
+        '''
+        Get the igraph object of the network. Only the vertices and edges
+        added or updated since the last call are added to it
+        
+        Output
+        ------
+        net: igraph object with the vertex attribute 'label' and the edge 
+            attribute 'weight'. The same object is returned (and updated) 
+            in every call, so copy it (net.copy()) to keep a snapshot
+        '''
+        if self._net is None: self._net = Graph(directed = False)
+        net = self._net
+        nr_new_vertices = len(self.labels) - net.vcount()
+        if nr_new_vertices > 0:
+            new_labels = self.labels[net.vcount():]
+            net.add_vertices(nr_new_vertices)
+            net.vs[net.vcount() - nr_new_vertices:]['label'] = new_labels
+        new_edges = [pair for pair in self._changed if pair not in self._edge_ids]
+        updated_edges = [pair for pair in self._changed if pair in self._edge_ids]
+        if updated_edges:
+            net.es.select([self._edge_ids[pair] for pair in updated_edges])['weight'] = [self.weights[pair] for pair in updated_edges]
+        if new_edges:
+            first_id = net.ecount()
+            net.add_edges(new_edges)
+            net.es[first_id:]['weight'] = [self.weights[pair] for pair in new_edges]
+            self._edge_ids.update({pair: first_id + i for i, pair in enumerate(new_edges)})
+        self._changed = set()
+        
+        return net
+    
+    def to_adjacency(self):
+        '''
+        Get the weighted adjacency matrix of the network
+        
+        Output
+        ------
+        C: scipy.sparse.csr_matrix of shape (nr vertices, nr vertices), 
+            symmetric (as returned from cooccurrence_matrix())
+        '''
+        n = len(self.labels)
+        if not self.weights: return sparse.csr_matrix((n, n), dtype = np.int64)
+        pairs = np.array(list(self.weights.keys()), dtype = np.int64)
+        data = np.array(list(self.weights.values()), dtype = np.int64)
+        C = sparse.csr_matrix((np.concatenate((data, data)), 
+                               (np.concatenate((pairs[:, 0], pairs[:, 1])), 
+                                np.concatenate((pairs[:, 1], pairs[:, 0])))),
+                              shape = (n, n))
+        
+        return C
+    
+    def save(self, path_to_file):
+        '''
+        Store the network (labels, edge weights and settings) with pickle. 
+        The igraph object is not stored, it is created again by get_graph()
+        
+        Input
+        -----
+        path_to_file: str or pathlib.PosixPath object, full path of the file
+        '''
+        state = {
+                 'exclude': list(self.exclude),
+                 'key': self.key,
+                 'delimeter': self.delimeter,
+                 'labels': self.labels,
+                 'weights': self.weights,
+                 'nr_papers': self.nr_papers
+                 }
+        with open(path_to_file, 'wb') as f:
+            pickle.dump(state, f, protocol = pickle.HIGHEST_PROTOCOL)
+            
+    @classmethod
+    def load(cls, path_to_file):
+        '''
+        Load a network stored with save()
+        
+        Input
+        -----
+        path_to_file: str or pathlib.PosixPath object, full path of the file
+        
+        Output
+        ------
+        IncrementalNetwork
+        '''
+        with open(path_to_file, 'rb') as f:
+            state = pickle.load(f)
+        inet = cls(exclude = state['exclude'], 
+                   key = state['key'], 
+                   delimeter = state['delimeter']
+                   )
+        inet.labels = state['labels']
+        inet.item_ids = {label: i for i, label in enumerate(inet.labels)}
+        inet.weights = state['weights']
+        inet.nr_papers = state['nr_papers']
+        inet._changed = set(inet.weights.keys())
+        
+        return inet
+
+def get_month_index(dates):
+    '''
+    Convert dates to month indexes (year * 12 + month - 1), so that dates can 
+    be binned in windows of months
+    
+    Input
+    -----
+    dates: list of str, 'YYYY-MM-DD', 'YYYY-MM', 'YYYY/MM/DD' etc. (e.g., the 
+        pubdate of readwritefun.extract_article_fields() with 
+        year_info_only=False)
+    
+    Output
+    ------
+    months: ndarray of int of len(dates), -1 for dates without a month 
+        (e.g., 'YYYY')
+    '''
+    months = np.full(len(dates), -1, dtype = np.int64)
+    for i, date in enumerate(dates):
+        date = re.findall(r'\d+', date or '')
+        if len(date) >= 2: months[i] = int(date[0]) * 12 + int(date[1]) - 1
+        
+    return months
+
+def get_time_windows(months, 
+                     window_months = 1, 
+                     step_months = None, 
+                     partial = False
+                     ):
+    '''
+    Compute the windows of months that cover all months. The range of the 
+    data is extended to whole blocks of window_months months aligned to 
+    multiples of window_months (e.g., calendar quarters for 
+    window_months=3), and the windows start at the start of this range
+    
+    Input
+    -----
+    months: ndarray of int (returned from get_month_index())
+    
+    window_months: int, default 1, length of each window in months 
+        (e.g., 3 for quarters)
+        
+    step_months: int, default None, months between the starts of 
+        consecutive windows. If None, step_months = window_months (tumbling
+        windows, each paper in one window). If smaller than window_months, 
+        the windows are sliding (overlapping)
+        
+    partial: bool, default False, if False, only windows that lie fully 
+        inside the range of the data are returned, so that all windows 
+        cover equally long periods. If True, sliding windows that only 
+        partly overlap the range (at its start and end) are also returned
+    
+    Output
+    ------
+    windows: list of tuples (start, end, complete) with start, end month 
+        indexes, the months of a window are start <= month < end, and 
+        complete a bool, True if the window lies fully inside the range of 
+        the data
+    '''
+    if step_months is None: step_months = window_months
+    months = months[months >= 0]
+    if len(months) == 0: return []
+    # Range of the data in whole blocks of window_months
+    first = months.min() - months.min() % window_months
+    last = months.max() - months.max() % window_months + window_months
+    if partial is True:
+        # Earliest start of a window that overlaps the range
+        first_start = first - ((window_months - 1) // step_months) * step_months
+    else:
+        first_start = first
+    windows = []
+    for start in range(first_start, last, step_months):
+        end = start + window_months
+        complete = start >= first and end <= last
+        if complete or partial is True: windows.append((start, end, complete))
+    
+    return windows
+
+def _month_to_str(month):
+    return '{:04d}-{:02d}'.format(month // 12, month % 12 + 1)
+
+def construct_temporal_networks(list_unique_items, 
+                                list_coitems = None,
+                                dates = None,
+                                window_months = 1,
+                                step_months = None,
+                                partial = False,
+                                exclude = [],
+                                key = 'affiliations',
+                                delimeter = ';'
+                                ):
+    '''
+    Construct a co-occurrence network (see cooccurrence_matrix()) for each 
+    time window, with papers binned by their date. All windows share the 
+    vertex ids of list_unique_items, so the networks (and their metrics) are 
+    comparable across windows
+    
+    Input
+    -----
+    dates: list of str of len(list_coitems), the publication date of each 
+        paper (see get_month_index()). If list_coitems are 
+        aux.records.Publication, their pubdate is used if dates is None. 
+        Papers without a month in their date are not included
+        
+    window_months, step_months, partial: see get_time_windows()
+    
+    For the rest of the parameters, see construct_edges_list()
+    
+    Output
+    ------
+    slices: list of dict, one per window, with keys:
+        'start': str, 'YYYY-MM', first month of the window
+        'end': str, 'YYYY-MM', last month of the window
+        'complete': bool, False for windows that only partly overlap the 
+            range of the data (only with partial=True), so their networks 
+            cover a shorter period than the rest
+        'nr_papers': int, nr of papers in the window
+        'adjacency': scipy.sparse.csr_matrix of shape 
+            (len(list_unique_items), len(list_unique_items)), the 
+            co-occurrence matrix of the papers of the window
+            
+    Example
+    -------
+    slices = construct_temporal_networks(unique_affiliations_cleaned,
+                                         list_coitems = co_occurying,
+                                         dates = pubdates,
+                                         window_months = 3
+                                         )
+    metrics = compute_temporal_metrics(slices, 
+                                       labels = unique_affiliations_cleaned,
+                                       n_jobs = -1
+                                       )
+    '''
+    if dates is None and len(list_coitems) > 0 and isinstance(list_coitems[0], records.Publication):
+        dates = records.get_field_values(list_coitems, key = 'pubdate')
+    B = construct_incidence_matrix(list_unique_items, 
+                                   list_coitems = list_coitems,
+                                   exclude = exclude,
+                                   key = key,
+                                   delimeter = delimeter
+                                   )
+    months = get_month_index(dates)
+    if (months < 0).any():
+        print('\nPapers without month (not included)...:', int((months < 0).sum()))
+    slices = []
+    for start, end, complete in get_time_windows(months, 
+                                                 window_months = window_months, 
+                                                 step_months = step_months,
+                                                 partial = partial
+                                                 ):
+        rows = np.flatnonzero((months >= start) & (months < end))
+        slices.append({
+                       'start': _month_to_str(start),
+                       'end': _month_to_str(end - 1),
+                       'complete': complete,
+                       'nr_papers': len(rows),
+                       'adjacency': cooccurrence_matrix(B[rows])
+                       })
+    
+    return slices
+
+# Node metrics of compute_slice_metrics(), computed on an igraph object 
+# with the edge attribute 'weight'
+SLICE_METRICS = {
+    'degree': lambda net: net.degree(),
+    'strength': lambda net: net.strength(weights = 'weight'),
+    'pagerank': lambda net: net.pagerank(weights = 'weight'),
+    'coreness': lambda net: net.coreness(),
+    'clustering': lambda net: net.transitivity_local_undirected(mode = 'zero')
+    }
+
+def compute_slice_metrics(adjacency, metrics = ('degree', 'strength', 'pagerank')):
+    '''
+    Compute node metrics of the network of one time window 
+    (the per-slice step of compute_temporal_metrics())
+    
+    Input
+    -----
+    adjacency: scipy.sparse matrix, the co-occurrence matrix of the window
+    
+    metrics: tuple of str, default ('degree', 'strength', 'pagerank'), 
+        keys of SLICE_METRICS
+    
+    Output
+    ------
+    values: dict with keys: metrics and values: ndarray of shape (N,) with 
+        the metric of each vertex
+    '''
+    net = create_network_from_adjacency(adjacency)
+    values = {metric: np.asarray(SLICE_METRICS[metric](net), dtype = np.float64) for metric in metrics}
+    
+    return values
+
+def compute_temporal_metrics(slices, 
+                             labels = None,
+                             metrics = ('degree', 'strength', 'pagerank'),
+                             n_jobs = None
+                             ):
+    '''
+    Compute node metrics of the network of each time window, in parallel 
+    across windows
+    
+    Input
+    -----
+    slices: list of dict (returned from construct_temporal_networks())
+    
+    labels: list of str, default None, the labels of the vertices 
+        (list_unique_items of construct_temporal_networks()). If None, the 
+        vertex ids are used
+        
+    metrics: tuple of str, default ('degree', 'strength', 'pagerank'), 
+        keys of SLICE_METRICS
+        
+    n_jobs: int, default None, nr of processes computing windows in 
+        parallel. Default None computes the windows sequentially. 
+        -1 uses all cores.
+    
+    Output
+    ------
+    temporal_metrics: dict with keys: metrics and values: pandas.DataFrame
+        with one row per vertex (index: labels) and one column per window 
+        (the 'start' of the window)
+    '''
+    adjacencies = [current_slice['adjacency'] for current_slice in slices]
+    # The results are returned in the order of slices
+    results = list(auxfun.map_in_processes(compute_slice_metrics, 
+                                           adjacencies, 
+                                           itertools.repeat(metrics),
+                                           n_jobs = n_jobs
+                                           ))
+    
+    columns = [current_slice['start'] for current_slice in slices]
+    temporal_metrics = {}
+    for metric in metrics:
+        temporal_metrics[metric] = pd.DataFrame(np.column_stack([values[metric] for values in results]) if results else None,
+                                                index = labels,
+                                                columns = columns
+                                                )
+    
+    return temporal_metrics
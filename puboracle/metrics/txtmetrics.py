@@ -10,6 +10,8 @@ from similarity.jaccard import Jaccard
 from sklearn.feature_extraction.text import TfidfVectorizer
 import spacy
 
+from ..aux import records
+
 def is_in_topbottomN(counter, 
                      N=10, 
                      top=True, 
@@ -301,7 +303,8 @@ def get_chars_words(list_txt, chrs_to_remove=None):
     return nr_chars, nr_words    
  
 def get_unique_strs(list_txt, 
-                    exclude = []
+                    exclude = [],
+                    key = 'affiliations'
                     ):
     '''
     Given a list of str that contains S ';' seperated strings, create a list 
@@ -317,6 +320,9 @@ def get_unique_strs(list_txt,
     exclude: list of str, default [], containing str that will function as filter
         e.g., ['', ' ']    
         
+    key: str, default 'affiliations', the field that is used if list_txt 
+        is a list of aux.records.Publication
+        
     Output
     ------
     all_strs: list of str. All the str resulting from the iteration and 
@@ -327,6 +333,7 @@ def get_unique_strs(list_txt,
     occurences: collections.Counter object. Contains info about the occurences
         of each str in un_strs based on all_strs.      
     '''
+    list_txt = records.get_field_values(list_txt, key = key)
     strs_interim = [txt.split(';') for txt in list_txt] 
     all_strs = []
     for i in strs_interim:#TODO: I am pretty positive that this can be compressed/refined for speed 
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ET
+
+from ..metrics import txtmetrics
+from ..txtprocess import txt2geo, txtfun
+from ..writestoredata import getdata, readwritefun
+
+# Marks the end of the items that flow through the queues of a pipeline
+_DONE = object()
+
+class _StageFailed():
+    '''
+    Wraps an exception raised in a stage, so that it is passed downstream
+    and raised by run_pipeline()
+    '''
+    def __init__(self, exc):
+        self.exc = exc
+
+def _put(out_queue, item, stop):
+    '''
+    Put item in the bounded out_queue, blocking while it is full, unless the
+    pipeline is stopped. Returns False if the pipeline was stopped
+    '''
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout = 0.1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+def _run_source(source, out_queue, stop):
+    '''
+    Thread target of the first stage: put the items of source in out_queue
+    '''
+    try:
+        for item in source:
+            if not _put(out_queue, item, stop): return
+        _put(out_queue, _DONE, stop)
+    except Exception as exc:
+        _put(out_queue, _StageFailed(exc), stop)
+
+def _run_stage(func, in_queue, out_queue, stop):
+    '''
+    Thread target of a stage: apply func to each item of in_queue and put
+    the result in out_queue
+    '''
+    try:
+        while not stop.is_set():
+            try:
+                item = in_queue.get(timeout = 0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE or isinstance(item, _StageFailed):
+                _put(out_queue, item, stop)
+                return
+            _put(out_queue, func(item), stop)
+    except Exception as exc:
+        _put(out_queue, _StageFailed(exc), stop)
+
+def run_pipeline(source, stages = None, queue_size = 2):
+    '''
+    Run a chain of stages concurrently, one thread per stage, connected with
+    bounded queues. Each item of source flows through the stages in order,
+    and a stage processes item i+1 while the next stage processes item i.
+    The total time approaches the time of the slowest stage instead of the
+    sum of the times of all stages
+
+    Input
+    -----
+    source: iterable (e.g., a generator) producing the items. It is
+        iterated in its own thread
+
+    stages: list of functions, stages[i] takes the output of stages[i-1]
+        (or an item of source for i=0) and returns its output
+
+    queue_size: int, default 2, max nr of items waiting between two stages.
+        A stage blocks when the queue to the next stage is full, so that a
+        fast stage does not accumulate items in memory
+
+    Output
+    ------
+    generator of the outputs of the last stage, in the order of source,
+        returned as soon as they are available
+
+    If a stage raises an exception, the pipeline stops and the exception is
+    raised by the generator. If the generator is closed before it is
+    exhausted, the pipeline stops
+
+    Example
+    -------
+    for squared in run_pipeline(range(10), stages = [lambda x: x + 1, lambda x: x ** 2]):
+        print(squared)
+    '''
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize = queue_size) for i in range(len(stages) + 1)]
+    threads = [threading.Thread(target = _run_source,
+                                args = (source, queues[0], stop),
+                                daemon = True)]
+    for i, func in enumerate(stages):
+        threads.append(threading.Thread(target = _run_stage,
+                                        args = (func, queues[i], queues[i + 1], stop),
+                                        daemon = True))
+    for thread in threads: thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE: break
+            if isinstance(item, _StageFailed): raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for thread in threads: thread.join()
+
+def iter_fetch_batches(query = None,
+                       datetype = 'pdat',
+                       mindate = None,
+                       maxdate = None,
+                       email = None,
+                       days = None,
+                       max_batch = None,
+                       retmax = 1000,
+                       api_key = None,
+                       base_url = getdata.EUTILS_URL,
+                       max_attempts = 5,
+                       timeout = 60,
+                       save_folder = None,
+                       compression = None
+                       ):
+    '''
+    Submit a query once and fetch its results window by window
+    (the fetch stage of run_affiliation_pipeline())
+
+    Input
+    -----
+    save_folder: str, default None, if not None the .xml of each batch is
+        also stored in save_folder (as in getdata.fetch_write_data())
+
+    For the rest of the parameters, see getdata.fetch_write_data_concurrent()
+
+    Output
+    ------
+    generator of dict with keys:
+        'batch': int, the batch nr
+        'data': bytes, the xml of the batch returned from efetch
+    '''
+    mindate, maxdate = getdata.resolve_date_bounds(days = days,
+                                                   mindate = mindate,
+                                                   maxdate = maxdate
+                                                   )
+    limiter = getdata.get_rate_limiter(api_key = api_key)
+    print('\nSubmitting query...')
+    search_results = getdata.search_history(query,
+                                            datetype = datetype,
+                                            mindate = mindate,
+                                            maxdate = maxdate,
+                                            email = email,
+                                            api_key = api_key,
+                                            base_url = base_url,
+                                            limiter = limiter,
+                                            max_attempts = max_attempts,
+                                            timeout = timeout
+                                            )
+    retstarts = getdata.get_retstart_windows(search_results['Count'],
+                                             retmax = retmax,
+                                             max_batch = max_batch
+                                             )
+    print('\nRecords found...:', search_results['Count'], 'in batches...:', len(retstarts))
+    for batch, retstart in enumerate(retstarts):
+        data = getdata.fetch_window(WebEnv = search_results['WebEnv'],
+                                    QueryKey = search_results['QueryKey'],
+                                    retstart = retstart,
+                                    retmax = retmax,
+                                    email = email,
+                                    api_key = api_key,
+                                    base_url = base_url,
+                                    limiter = limiter,
+                                    max_attempts = max_attempts,
+                                    timeout = timeout
+                                    )
+        if save_folder is not None:
+            filename = readwritefun.get_xml_filename(batch, compression = compression)
+            readwritefun.write_xml_data(data, os.path.join(save_folder, filename))
+        print('\nFetched batch nr...:', batch)
+        yield {'batch': batch, 'data': data}
+
+def parse_batch(batch, keys_to_parse = None):
+    '''
+    Extract the keys in keys_to_parse from the records of a fetched batch
+    (the parse stage of run_affiliation_pipeline())
+
+    Input
+    -----
+    batch: dict with key 'data' (see iter_fetch_batches())
+
+    keys_to_parse: list of str (see readwritefun.FIELD_EXTRACTORS)
+
+    Output
+    ------
+    batch: dict, the input batch with the key 'data' replaced by the keys
+        in keys_to_parse, with batch[key] a list with the values of key of
+        all records in the batch
+    '''
+    root = ET.fromstring(batch.pop('data'))
+    articles = root.findall('PubmedArticle')
+    for key in keys_to_parse:
+        batch[key] = []
+    for article in articles:
+        record = readwritefun.extract_article_fields(article, keys_to_parse = keys_to_parse)
+        for key in keys_to_parse:
+            batch[key].append(record[key])
+
+    return batch
+
+def run_affiliation_pipeline(query = None,
+                             datetype = 'pdat',
+                             mindate = None,
+                             maxdate = None,
+                             email = None,
+                             days = None,
+                             max_batch = None,
+                             retmax = 1000,
+                             api_key = None,
+                             base_url = getdata.EUTILS_URL,
+                             save_folder = None,
+                             compression = None,
+                             len_threshold = 12,
+                             delimeter = ';',
+                             exclude = ['', ' '],
+                             geocode = True,
+                             geocode_params = None,
+                             queue_size = 2
+                             ):
+    '''
+    Streaming version of the steps of one_month_summary.py: fetch the
+    results of a query, parse the affiliations, clean them, find the unique
+    affiliations and geocode them. The stages run concurrently
+    (see run_pipeline()), so the first batches are parsed and geocoded
+    while later batches are still downloading
+
+    fetch (iter_fetch_batches()) -> parse (parse_batch()) ->
+    clean (txtfun.remove_email_txtinparen()) ->
+    unique (txtmetrics.get_unique_strs()) ->
+    geocode (txt2geo.get_lat_lon_from_text())
+
+    Input
+    -----
+    len_threshold, delimeter: see txtfun.remove_email_txtinparen()
+
+    exclude: list of str, default ['', ' '], see txtmetrics.get_unique_strs()
+
+    geocode: bool, default True, geocode the new unique affiliations of each
+        batch. If False the geocode stage is skipped
+
+    geocode_params: dict, default None, keyword arguments of
+        txt2geo.get_lat_lon_from_text() (e.g., {'user_agent': 'my app',
+        'clean_string': 'unicode', 'reverse': False})
+
+    queue_size: int, default 2, see run_pipeline()
+
+    For the rest of the parameters, see iter_fetch_batches()
+
+    Output
+    ------
+    generator of dict, one per batch, with keys:
+        'batch': int, the batch nr
+        'pmid': list of str, the PMIDs of the records in the batch
+        'affiliations': list of str, the affiliations of the records
+        'affiliations_cleaned': list of str, the cleaned affiliations
+            (records without affiliations are dropped, see
+            txtfun.remove_email_txtinparen())
+        'new_affiliations': list of str, the unique cleaned affiliations
+            that did not occur in a previous batch
+        'lat', 'lon', 'txtforloc': the output of
+            txt2geo.get_lat_lon_from_text() for new_affiliations
+            (only if geocode is True)
+
+    Example
+    -------
+    for result in run_affiliation_pipeline(query = 'connectomics OR connectome',
+                                           days = 30,
+                                           email = email,
+                                           geocode_params = {'user_agent': 'geocoding test'}
+                                           ):
+        print(result['batch'], len(result['new_affiliations']))
+    '''
+    source = iter_fetch_batches(query = query,
+                                datetype = datetype,
+                                mindate = mindate,
+                                maxdate = maxdate,
+                                email = email,
+                                days = days,
+                                max_batch = max_batch,
+                                retmax = retmax,
+                                api_key = api_key,
+                                base_url = base_url,
+                                save_folder = save_folder,
+                                compression = compression
+                                )
+
+    def parse(batch):
+        return parse_batch(batch, keys_to_parse = ['pmid', 'affiliations'])
+
+    def clean(batch):
+        batch['affiliations_cleaned'] = txtfun.remove_email_txtinparen(batch['affiliations'],
+                                                                       len_threshold = len_threshold,
+                                                                       delimeter = delimeter
+                                                                       )
+        return batch
+
+    seen = set()#the unique affiliations of all previous batches
+    def unique(batch):
+        all_strs, _, _ = txtmetrics.get_unique_strs(batch['affiliations_cleaned'],
+                                                    exclude = exclude
+                                                    )
+        # Keep the order of the first occurence, so results are reproducible
+        batch['new_affiliations'] = [s for s in dict.fromkeys(all_strs) if s not in seen]
+        seen.update(batch['new_affiliations'])
+        return batch
+
+    def geocode_batch(batch):
+        (batch['lat'],
+         batch['lon'],
+         batch['txtforloc']) = txt2geo.get_lat_lon_from_text(batch['new_affiliations'],
+                                                             **(geocode_params or {}))
+        return batch
+
+    stages = [parse, clean, unique]
+    if geocode is True: stages.append(geocode_batch)
+
+    return run_pipeline(source, stages = stages, queue_size = queue_size)
@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from . import txt2geo,txtfun
+from . import geo2country,txt2geo,txtfun
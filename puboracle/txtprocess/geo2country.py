@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+import geopandas as gpd
+import pycountry
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+try:
+    from shapely import points as shapely_points#shapely>=2.0 (vectorized)
+except ImportError:
+    shapely_points = None
+
+def load_country_shapes(path_to_shapes = None):
+    '''
+    Load the country shapes used for reverse geocoding
+
+    Input
+    -----
+    path_to_shapes: str or pathlib.PosixPath object, default None, full path
+        of a file with country polygons and the columns 'name', 'iso_a3'
+        and 'continent' (e.g., naturalearth_lowres.shp or the admin 0
+        countries of https://www.naturalearthdata.com/downloads/).
+        If None, the naturalearth_lowres dataset of geopandas is used
+        (as in visfun.vis_lon_lat())
+
+    Output
+    ------
+    countries: geopandas.GeoDataFrame with the columns 'name', 'iso_a3',
+        'continent' and 'geometry'. Missing ISO codes ('-99' in 
+        naturalearth, e.g. for France and Norway) are filled from pycountry 
+        by name, where possible
+    '''
+    if path_to_shapes is None:
+        path_to_shapes = gpd.datasets.get_path('naturalearth_lowres')
+    countries = gpd.read_file(str(path_to_shapes))
+    countries = countries[['name', 'iso_a3', 'continent', 'geometry']].reset_index(drop = True)
+    for i in np.flatnonzero((countries['iso_a3'] == '-99').values):
+        try:
+            country = pycountry.countries.lookup(countries.at[i, 'name'])
+            countries.at[i, 'iso_a3'] = country.alpha_3
+        except LookupError:
+            continue
+
+    return countries
+
+def build_country_index(countries):
+    '''
+    Build a spatial index (STRtree) over the country polygons
+
+    Input
+    -----
+    countries: geopandas.GeoDataFrame (returned from load_country_shapes())
+
+    Output
+    ------
+    country_index: dict with keys:
+        'tree': shapely.strtree.STRtree of the polygons
+        'geometries': list of the polygons, in the order of countries
+        'positions': dict, id of each polygon: its position in countries
+            (used with shapely<2.0, where the tree returns polygons)
+    '''
+    geometries = list(countries.geometry)
+    country_index = {
+                     'tree': STRtree(geometries),
+                     'geometries': geometries,
+                     'positions': {id(geometry): i for i, geometry in enumerate(geometries)}
+                     }
+
+    return country_index
+
+def _locate_points(lon, lat, country_index, max_distance = None):
+    '''
+    Position (in countries) of the polygon containing each point, -1 if none
+    '''
+    positions = np.full(len(lon), -1, dtype = np.int64)
+    valid = np.flatnonzero(~(np.isnan(lon) | np.isnan(lat)))
+    tree = country_index['tree']
+    if shapely_points is not None:
+        points = shapely_points(lon[valid], lat[valid])
+        point_idx, country_idx = tree.query(points, predicate = 'intersects')
+        # Points on borders intersect more polygons, keep the first
+        point_idx, first = np.unique(point_idx, return_index = True)
+        positions[valid[point_idx]] = country_idx[first]
+        if max_distance is not None:
+            missing = np.flatnonzero(positions[valid] == -1)
+            if len(missing):
+                point_idx, country_idx = tree.query_nearest(points[missing],
+                                                            max_distance = max_distance,
+                                                            all_matches = False
+                                                            )
+                positions[valid[missing[point_idx]]] = country_idx
+    else:
+        # shapely<2.0: query() returns the polygons with an overlapping
+        # bounding box, so check each candidate
+        for i in valid:
+            point = Point(lon[i], lat[i])
+            for geometry in tree.query(point):
+                if geometry.intersects(point):
+                    positions[i] = country_index['positions'][id(geometry)]
+                    break
+            if positions[i] == -1 and max_distance is not None:
+                geometry = tree.nearest(point)
+                if geometry is not None and geometry.distance(point) <= max_distance:
+                    positions[i] = country_index['positions'][id(geometry)]
+
+    return positions
+
+def reverse_geocode_countries(lat,
+                              lon,
+                              countries = None,
+                              country_index = None,
+                              max_distance = 0.5
+                              ):
+    '''
+    Find the country of each (lat, lon) offline, with point-in-polygon
+    queries on a spatial index (STRtree) of the country polygons. With
+    shapely>=2.0 all points are queried at once
+
+    Input
+    -----
+    lat: list of float or ndarray of shape (N,), latitudes (e.g., returned
+        from txt2geo.get_lat_lon_from_text()). nan is allowed
+
+    lon: list of float or ndarray of shape (N,), longitudes
+
+    countries: geopandas.GeoDataFrame, default None, country polygons
+        (returned from load_country_shapes()). If None,
+        load_country_shapes() is used
+
+    country_index: dict, default None, spatial index of countries (returned
+        from build_country_index()). Pass it to reuse the index in many
+        calls. If None it is built
+
+    max_distance: float, default 0.5, points that are not in any polygon
+        (e.g., coastal cities, since the polygons are simplified) are
+        assigned to the nearest country within max_distance degrees.
+        If None, such points are not assigned
+
+    Output
+    ------
+    locations: pandas.DataFrame with N rows and the columns 'lat', 'lon',
+        'name', 'iso_a3' and 'continent'. The columns are missing 
+        (None/NaN) for points without a country
+
+    Example
+    -------
+    countries = load_country_shapes()
+    country_index = build_country_index(countries)
+    locations = reverse_geocode_countries([50.73, 42.36], [7.10, -71.06],
+                                          countries = countries,
+                                          country_index = country_index
+                                          )
+    print(locations['iso_a3'].tolist())
+    ['DEU', 'USA']
+    '''
+    if countries is None: countries = load_country_shapes()
+    if country_index is None: country_index = build_country_index(countries)
+    lat = np.asarray(lat, dtype = np.float64)
+    lon = np.asarray(lon, dtype = np.float64)
+    positions = _locate_points(lon, lat, country_index, max_distance = max_distance)
+
+    locations = pd.DataFrame({'lat': lat, 'lon': lon})
+    found = positions >= 0
+    for column in ('name', 'iso_a3', 'continent'):
+        values = np.full(len(positions), None, dtype = object)
+        values[found] = countries[column].values[positions[found]]
+        locations[column] = values
+
+    return locations
+
+def count_by_region(locations, by = 'iso_a3', weights = None, topN = None):
+    '''
+    Count the points (e.g., affiliations) of each country or continent
+
+    Input
+    -----
+    locations: pandas.DataFrame (returned from reverse_geocode_countries())
+
+    by: str, {'iso_a3', 'name', 'continent'}, default 'iso_a3', the column
+        to aggregate by
+
+    weights: list of float, default None, weight of each point (e.g., the
+        nr of publications of each affiliation). If None, each point counts 1
+
+    topN: int, default None, keep only the topN regions. If None all
+        regions are kept
+
+    Output
+    ------
+    counts: list of tuples (region, count) in descending order of count
+        (as collections.Counter.most_common(), so it can be visualized with
+        visfun.visualize_counter_selection()). Points without a region are
+        not counted
+    '''
+    if weights is None: weights = [1] * len(locations)
+    counts = Counter()
+    for region, weight in zip(locations[by], weights):
+        if pd.notna(region): counts[region] += weight
+
+    return counts.most_common(topN)
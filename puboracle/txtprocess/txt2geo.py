@@ -1,12 +1,191 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
 import numpy as np
+import re
+import sqlite3
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+import zipfile
 
+from geopy.exc import GeopyError
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 import pycountry
 
 from . import txtfun
+from ..aux.ratelimit import TokenBucket
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org'
+
+# Defaults of the settings of each endpoint used by geocode_concurrent()
+ENDPOINT_DEFAULTS = {
+    'rate': 1.,#requests/sec (the public Nominatim allows max 1 request/sec)
+    'concurrency': 1,#max nr of requests waiting for a response
+    'timeout': 10,
+    'max_attempts': 3,
+    'backoff_sec': 1.
+    }
+
+# Max nr of times that a geophrase is geocoded in one call of 
+# get_lat_lon_from_text() if geocoding fails due to errors (e.g., time outs,
+# HTTP 5xx, rate limits). Errors are never stored as geophrases that were not
+# found (in the cache or in the geophrases resolved in a call), so a 
+# geophrase that failed is geocoded again when it occurs in another string 
+# and in later calls
+MAX_GEOCODE_FAILURES = 3
+
+# Location read from the geocoding cache or the gazetteer, with the same 
+# attributes as the geopy.location.Location used by get_lat_lon_from_text()
+CachedLocation = namedtuple('CachedLocation', ['latitude', 'longitude'])
+
+# Columns of the GeoNames tab-separated files
+# (see https://download.geonames.org/export/dump/readme.txt)
+GEONAMES_COLUMNS = (
+    'geonameid', 'name', 'asciiname', 'alternatenames', 'latitude', 
+    'longitude', 'feature_class', 'feature_code', 'country_code', 'cc2', 
+    'admin1_code', 'admin2_code', 'admin3_code', 'admin4_code', 'population',
+    'elevation', 'dem', 'timezone', 'modification_date'
+    )
+
+# GeoNames feature codes of the rows of countries, in order of precedence 
+# (independent, section of independent, dependent, freely associated, 
+# semi-independent political entity). Historical entities (PCLH) are not used
+COUNTRY_FEATURE_CODES = ('PCLI', 'PCLIX', 'PCLD', 'PCLF', 'PCLS')
+
+# Common names of countries in affiliations that are not names of pycountry
+COUNTRY_ALIASES = {
+    'usa': 'US', 'u.s.a.': 'US', 'united states of america': 'US',
+    'uk': 'GB', 'u.k.': 'GB', 'england': 'GB', 'scotland': 'GB', 
+    'wales': 'GB', 'northern ireland': 'GB', 'great britain': 'GB',
+    'south korea': 'KR', 'korea': 'KR', 'republic of korea': 'KR',
+    'russia': 'RU', 'iran': 'IR', 'taiwan': 'TW', 'vietnam': 'VN',
+    'the netherlands': 'NL', 'czech republic': 'CZ', 'turkey': 'TR'
+    }
+
+def normalize_geophrase(geophrase):
+    '''
+    Normalize a geophrase to be used as key of the geocoding cache:
+    lowercase, with leading/trailing whitespace removed and runs of
+    whitespace replaced by one space
+    
+    Input
+    -----
+    geophrase: str
+    
+    Output
+    ------
+    str, the normalized geophrase
+    '''
+    return re.sub(r'\s+', ' ', geophrase).strip().lower()
+
+def open_geocode_cache(cache_path):
+    '''
+    Open (and create if needed) the SQLite geocoding cache
+    
+    Input
+    -----
+    cache_path: str or pathlib.PosixPath object, full path of the cache
+    
+    Output
+    ------
+    con: sqlite3.Connection to the cache
+    '''
+    con = sqlite3.connect(str(cache_path))
+    with con:
+        con.execute('CREATE TABLE IF NOT EXISTS geocodes ('
+                    'geophrase TEXT PRIMARY KEY, found INTEGER, '
+                    'latitude REAL, longitude REAL, timestamp REAL)')
+    
+    return con
+
+def lookup_geocode_cache(con, geophrase, cache_ttl_days = None):
+    '''
+    Look up a geophrase in the geocoding cache 
+    
+    Input
+    -----
+    con: sqlite3.Connection (returned from open_geocode_cache())
+    
+    geophrase: str, the geophrase (normalized with normalize_geophrase())
+    
+    cache_ttl_days: float, default None, entries older than cache_ttl_days
+        are ignored (and geocoded again). If None, entries never expire
+    
+    Output
+    ------
+    hit: bool, True if the geophrase is in the cache and not expired
+    
+    location: CachedLocation if the geophrase was geocoded, None if it 
+        was not found (a negative result) or hit is False
+    '''
+    row = con.execute('SELECT found, latitude, longitude, timestamp FROM geocodes '
+                      'WHERE geophrase = ?', (geophrase,)).fetchone()
+    if row is None: return False, None
+    found, latitude, longitude, timestamp = row
+    if cache_ttl_days is not None and time.time() - timestamp > cache_ttl_days * 86400:
+        return False, None
+    if not found: return True, None
+        
+    return True, CachedLocation(latitude, longitude)
+
+def store_geocode_cache(con, geophrase, location):
+    '''
+    Store the result of geocoding a geophrase in the geocoding cache
+    
+    Input
+    -----
+    con: sqlite3.Connection (returned from open_geocode_cache())
+    
+    geophrase: str, the geophrase (normalized with normalize_geophrase())
+    
+    location: geopy.location.Location or None if the geophrase was not found 
+    '''
+    with con:
+        if location is None:
+            row = (geophrase, 0, None, None, time.time())
+        else:
+            row = (geophrase, 1, location.latitude, location.longitude, time.time())
+        con.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)', row)
+
+def cache_geocode(geocode, con, cache_ttl_days = None):
+    '''
+    Wrap a geocode function so that geophrases are first looked up in the 
+    geocoding cache and the results of geophrases that are geocoded are 
+    stored in the cache (both locations and negative results)
+    
+    Input
+    -----
+    geocode: function, taking a geophrase and returning a 
+        geopy.location.Location or None. Must raise (and not return None)
+        on errors (e.g. time outs), so that errors are not cached as 
+        negative results
+    
+    con: sqlite3.Connection (returned from open_geocode_cache())
+    
+    cache_ttl_days: float, default None, see lookup_geocode_cache()
+    
+    Output
+    ------
+    cached_geocode: function, taking a geophrase and returning a location
+        or None. Errors of geocode are raised and not cached
+    '''
+    def cached_geocode(geophrase):
+        key = normalize_geophrase(geophrase)
+        hit, location = lookup_geocode_cache(con, key, cache_ttl_days = cache_ttl_days)
+        if hit is True: return location
+        location = geocode(geophrase)
+        store_geocode_cache(con, key, location)
+        
+        return location
+    
+    return cached_geocode
 
 def get_lat_lon_from_text(all_txt_location,
                           geophrase_delimeter = ',',
@@ -15,7 +194,12 @@ def get_lat_lon_from_text(all_txt_location,
                           verbose = False, 
                           user_agent = 'testing',
                           min_delay_seconds = 1,
-                          timeout = 10
+                          timeout = 10,
+                          cache_path = None,
+                          cache_ttl_days = None,
+                          gazetteer = None,
+                          fallback = True,
+                          endpoints = None
                           ):
     '''
     Get latitude and longitude information by using individual words from 
@@ -55,6 +239,37 @@ def get_lat_lon_from_text(all_txt_location,
       
     timeout: int, default 10, specifying the time waiting before the server for
         the geocoding times out
+    
+    cache_path: str or pathlib.PosixPath object, default None, full path of 
+        a SQLite geocoding cache (created if it does not exist). Geophrases
+        (normalized with normalize_geophrase()) that are in the cache are not 
+        sent to the server. Both locations and geophrases that were not 
+        found are cached. Errors (e.g. time outs) are not cached (see 
+        MAX_GEOCODE_FAILURES). If None no cache is used
+        
+    cache_ttl_days: float, default None, cached results older than 
+        cache_ttl_days are geocoded again. If None cached results never 
+        expire
+        
+    gazetteer: dict, default None, offline gazetteer (returned from 
+        load_gazetteer()). If not None, the geophrases of each string are 
+        first looked up (in the order they are tried) in the gazetteer and 
+        the first one that is found is used. Only strings without any 
+        geophrase in the gazetteer are geocoded with Nominatim
+        
+    fallback: bool, default True, geocode with Nominatim the strings that
+        are not found in the gazetteer. If False (and gazetteer is not None),
+        no requests are sent and the function runs fully offline
+        
+    endpoints: list of dict, default None, geocode concurrently with 
+        asyncio across one or more Nominatim endpoints (e.g., a self-hosted 
+        Nominatim), each with its own rate limit, timeout and retries 
+        (see geocode_concurrent()). The geophrases are resolved in rounds: 
+        in each round the next geophrase of every string that is not yet 
+        located is geocoded, so the same geophrases are geocoded and the 
+        output is the same as with sequential geocoding.
+        min_delay_seconds and timeout are not used (they are set per 
+        endpoint). If None, geocode sequentially with geopy
         
     Output
     ------
@@ -70,6 +285,11 @@ def get_lat_lon_from_text(all_txt_location,
     NOTE: the function will keep the first lat and lot that is not None and
         stop iterating further words in a string
         
+    NOTE: geophrases are planned for all strings first (see 
+        plan_geophrases()) and each distinct geophrase is geocoded at most
+        once, so a geophrase shared by many strings (e.g. ' Germany') costs
+        one request
+        
     Examples
     --------   
     s = [ 
@@ -89,11 +309,45 @@ def get_lat_lon_from_text(all_txt_location,
     print(txt)
     ['Arizona', 'Germany', 'Bordeaux']
     '''
+    online = gazetteer is None or fallback is True
     geolocator = Nominatim(user_agent = user_agent, timeout = timeout)
+    # Errors are raised, so that they are not taken as geophrases that were 
+    # not found (see MAX_GEOCODE_FAILURES)
     if min_delay_seconds is not None:#if wait time specified use a RateLimiter
-        geocode = RateLimiter(geolocator.geocode, min_delay_seconds = min_delay_seconds) 
+        geocode = RateLimiter(geolocator.geocode, 
+                              min_delay_seconds = min_delay_seconds,
+                              swallow_exceptions = False
+                              ) 
     else:
         geocode = geolocator.geocode   
+    con = None
+    if cache_path is not None and online is True:
+        con = open_geocode_cache(cache_path)
+        geocode = cache_geocode(geocode, con, cache_ttl_days = cache_ttl_days)
+    candidates, distinct = plan_geophrases(all_txt_location,
+                                           geophrase_delimeter = geophrase_delimeter,
+                                           clean_string = clean_string,
+                                           reverse = reverse
+                                           )
+    if verbose is True:
+        print('\nGeophrases...:', sum([len(c) for c in candidates]), 'distinct geophrases...:', len(distinct))
+    # Each distinct geophrase is geocoded at most once and its result is 
+    # reused for all the strings that contain it
+    resolved = {}
+    failures = {}#geophrase: nr of times geocoding failed due to errors
+    if endpoints is not None and online is True:
+        # Strings located with the gazetteer are not geocoded
+        to_resolve = [c for c in candidates 
+                      if gazetteer is None or not any([normalize_geophrase(loc) in gazetteer for loc in c])]
+        resolve_geophrases_concurrent(to_resolve,
+                                      resolved = resolved,
+                                      failures = failures,
+                                      endpoints = endpoints,
+                                      user_agent = user_agent,
+                                      con = con,
+                                      cache_ttl_days = cache_ttl_days,
+                                      verbose = verbose
+                                      )
     lat=[]
     lon=[]
     full_txt_location = []
@@ -106,22 +360,35 @@ def get_lat_lon_from_text(all_txt_location,
         if verbose is True:
             print('\nSearching for latitude and longitude for location description:', atl)
         location = None
-        atl_split = atl.split(geophrase_delimeter)#get geophrase to be decoded, assuming they are seperated by geophrase_delimeter
-        if reverse is True:atl_split = atl_split[::-1]#reverse so that we process the city faster (with affiliation formats, city usually near the end)
         atl_split_not_found = []#keep here all the strings that did not lead to geolocation for each step (not for all in all_txt_location)
-        for loc in atl_split:
-            if clean_string == 'unicode': loc = txtfun.keep_only_unicode(loc)
-            if clean_string == 'alphanum': loc = txtfun.keep_only_alphanum(loc)
-            location = None    
-            if loc:#if the processed string in non empty, start geocoding
-                if verbose is True:
-                    print('\nGeolocation based on...:', loc)
-                #Geocoding
-                location = geocode(loc)                                        
-                if location is None:atl_split_not_found.append(loc)
+        if gazetteer is not None:
+            for loc in candidates[counter]:
+                location = gazetteer.get(normalize_geophrase(loc))
                 if location is not None:
-                    full_txt_location.append(loc)#keep the textual description of the location that resulted in the lat lon
-                    break#if valid location is returned, exit 
+                    if verbose is True:
+                        print('\nGeolocation (gazetteer) based on...:', loc)
+                    full_txt_location.append(loc)
+                    break
+            if location is None and online is False: atl_split_not_found = candidates[counter]
+        # Geophrases to be geocoded with Nominatim (none if a geophrase was 
+        # found in the gazetteer or if running offline)
+        to_geocode = candidates[counter] if location is None and online is True else []
+        for loc in to_geocode:
+            if verbose is True:
+                print('\nGeolocation based on...:', loc)
+            #Geocoding (with endpoints, all geophrases were already geocoded)
+            if (endpoints is None and loc not in resolved 
+                and failures.get(loc, 0) < MAX_GEOCODE_FAILURES):
+                try:
+                    resolved[loc] = geocode(loc)
+                except GeopyError as e:
+                    failures[loc] = failures.get(loc, 0) + 1
+                    print('\nGeocoding failed (not cached)...:', loc, e)
+            location = resolved.get(loc)
+            if location is None:atl_split_not_found.append(loc)
+            if location is not None:
+                full_txt_location.append(loc)#keep the textual description of the location that resulted in the lat lon
+                break#if valid location is returned, exit 
         if location is None:
             if verbose is True:
                 print('\nNo latitude and longitude for...:', atl_split_not_found)
@@ -130,10 +397,562 @@ def get_lat_lon_from_text(all_txt_location,
         else:
             lat.append(location.latitude)
             lon.append(location.longitude)
+    if con is not None: con.close()
+    if verbose is True:
+        print('\nGeophrases geocoded...:', len(resolved))
             
     return lat, lon, full_txt_location
 
-def trace_countries_in_text(txt, allowed_countries = []):
+def nominatim_search(geophrase,
+                     url = NOMINATIM_URL,
+                     user_agent = 'testing',
+                     limiter = None,
+                     timeout = 10,
+                     max_attempts = 3,
+                     backoff_sec = 1.
+                     ):
+    '''
+    Geocode a geophrase with the /search API of a Nominatim endpoint
+    (see https://nominatim.org/release-docs/latest/api/Search/)
+    
+    Input
+    -----
+    geophrase: str, the geophrase to be geocoded
+    
+    url: str, default NOMINATIM_URL, base url of the Nominatim endpoint
+    
+    user_agent: str, default 'testing', specifying user id
+    
+    limiter: aux.ratelimit.TokenBucket, default None, acquired before each request
+    
+    timeout: int, default 10, seconds to wait for the server to respond
+    
+    max_attempts: int, default 3, max nr of attempts. Failed attempts due 
+        to connection errors, HTTP 429 and HTTP 5xx are retried. Other HTTP 
+        errors are raised
+        
+    backoff_sec: float, default 1, seconds to wait after the first failed 
+        attempt. The wait is doubled after every failed attempt
+    
+    Output
+    ------
+    location: CachedLocation or None if the geophrase was not found. Errors
+        are raised (ValueError for responses that are not search results)
+    '''
+    request = Request(url.rstrip('/') + '/search?' + urlencode({'q': geophrase, 
+                                                                'format': 'json',
+                                                                'limit': 1}),
+                      headers = {'User-Agent': user_agent})
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None: limiter.acquire()
+        try:
+            response = urlopen(request, timeout = timeout)
+            results = json.loads(response.read().decode('utf-8'))
+            response.close()
+            # Errors can also be returned with HTTP 200 (e.g., {'error': ...})
+            if not isinstance(results, list):
+                raise ValueError('Unexpected response: ' + str(results)[:200])
+            if not results: return None
+            return CachedLocation(float(results[0]['lat']), float(results[0]['lon']))
+        except HTTPError as e:
+            if e.code != 429 and e.code < 500: raise
+            if attempt == max_attempts: raise
+            print('\nGeocoding failed at attempt nr...', attempt, e)
+        except (URLError, OSError) as e:
+            if attempt == max_attempts: raise
+            print('\nGeocoding failed at attempt nr...', attempt, e)
+        time.sleep(backoff_sec * 2 ** (attempt - 1))
+
+def geocode_concurrent(geophrases,
+                       endpoints = None,
+                       user_agent = 'testing'
+                       ):
+    '''
+    Geocode geophrases concurrently across one or more Nominatim endpoints 
+    with asyncio. Each endpoint has a pool of concurrency workers that take 
+    the next geophrase that is not geocoded yet, so faster endpoints 
+    geocode more geophrases. The requests of each endpoint obey its rate.
+    A geophrase that fails at an endpoint (after its max_attempts) fails 
+    over to the next endpoint
+    
+    Input
+    -----
+    geophrases: list of str, the geophrases to be geocoded
+    
+    endpoints: list of dict, default None, with keys:
+        'url': str, base url of the endpoint (e.g., NOMINATIM_URL or
+            'http://localhost:8080')
+        and optionally (defaults in ENDPOINT_DEFAULTS): 
+        'rate': float, max nr of requests/sec 
+        'concurrency': int, max nr of requests waiting for a response
+        'timeout', 'max_attempts', 'backoff_sec': see nominatim_search()
+        If None, the public Nominatim is used with the defaults
+        
+    user_agent: str, default 'testing', specifying user id
+    
+    Output
+    ------
+    locations: dict with keys: the geophrases and values: CachedLocation or
+        None if the geophrase was not found
+        
+    failed: list of str, the geophrases that could not be geocoded due to 
+        errors at all the endpoints (they are not in locations)
+        
+    Example
+    -------
+    locations, failed = geocode_concurrent(['Bonn', 'Germany'],
+                                           endpoints = [{'url': 'http://localhost:8080',
+                                                         'rate': 50,
+                                                         'concurrency': 8}]
+                                           )
+    '''
+    if endpoints is None: endpoints = [{'url': NOMINATIM_URL}]
+    endpoints = [dict(ENDPOINT_DEFAULTS, **endpoint) for endpoint in endpoints]
+    locations = {}
+    failed = []
+    
+    limiters = [TokenBucket(endpoint['rate']) for endpoint in endpoints]
+    
+    async def worker(endpoint_nr, pending, executor):
+        loop = asyncio.get_event_loop()
+        while pending:
+            geophrase = pending.pop()
+            # The endpoint of the worker first, then the next endpoints
+            for k in range(len(endpoints)):
+                endpoint = endpoints[(endpoint_nr + k) % len(endpoints)]
+                limiter = limiters[(endpoint_nr + k) % len(endpoints)]
+                try:
+                    locations[geophrase] = await loop.run_in_executor(executor, 
+                                                                      lambda: nominatim_search(geophrase,
+                                                                                               url = endpoint['url'],
+                                                                                               user_agent = user_agent,
+                                                                                               limiter = limiter,
+                                                                                               timeout = endpoint['timeout'],
+                                                                                               max_attempts = endpoint['max_attempts'],
+                                                                                               backoff_sec = endpoint['backoff_sec']
+                                                                                               ))
+                    break
+                except (URLError, OSError, ValueError) as e:
+                    print('\nGeocoding failed...:', geophrase, endpoint['url'], e)
+            else:
+                failed.append(geophrase)
+    
+    async def run_workers():
+        pending = list(geophrases)[::-1]#workers pop from the end
+        max_workers = sum([endpoint['concurrency'] for endpoint in endpoints])
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            workers = []
+            for endpoint_nr, endpoint in enumerate(endpoints):
+                workers.extend([worker(endpoint_nr, pending, executor) 
+                                for i in range(endpoint['concurrency'])])
+            await asyncio.gather(*workers)
+    
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run_workers())
+    finally:
+        loop.close()
+    
+    return locations, failed
+
+def resolve_geophrases_concurrent(candidates,
+                                  resolved = None,
+                                  failures = None,
+                                  endpoints = None,
+                                  user_agent = 'testing',
+                                  con = None,
+                                  cache_ttl_days = None,
+                                  verbose = False
+                                  ):
+    '''
+    Geocode the geophrases of candidates (see plan_geophrases()) that 
+    get_lat_lon_from_text() geocodes, concurrently. In each round, the next 
+    geophrase of every string that is not located yet is geocoded with 
+    geocode_concurrent(). The geophrases that are geocoded are the same as
+    when the strings are processed sequentially
+    
+    Input
+    -----
+    candidates: list of lists of str (returned from plan_geophrases())
+    
+    resolved: dict, default None, geophrases that are already geocoded 
+        (geophrase: location or None). It is updated in place
+        
+    failures: dict, default None, nr of times that geocoding each geophrase
+        failed due to errors (geophrase: int). It is updated in place. 
+        Geophrases that failed are geocoded again in the next round, up to 
+        MAX_GEOCODE_FAILURES times
+    
+    con: sqlite3.Connection, default None, geocoding cache 
+        (see open_geocode_cache()). Cached geophrases are not geocoded and 
+        the geocoded geophrases are stored in the cache
+        
+    For the rest of the parameters, see geocode_concurrent() and 
+    lookup_geocode_cache()
+    
+    Output
+    ------
+    resolved: dict with keys: geophrases and values: CachedLocation or None
+    
+    NOTE: geophrases that failed due to errors are not in resolved and are 
+        not cached. Strings move on to their next geophrase only after 
+        MAX_GEOCODE_FAILURES failures
+    '''
+    if resolved is None: resolved = {}
+    if failures is None: failures = {}
+    
+    def is_exhausted(geophrase):
+        # Not found, or failed too many times
+        if geophrase in resolved: return resolved[geophrase] is None
+        return failures.get(geophrase, 0) >= MAX_GEOCODE_FAILURES
+    
+    position = [0] * len(candidates)#index of the geophrase tried next for each string
+    unresolved = list(range(len(candidates)))
+    round_nr = 0
+    while unresolved:
+        # Advance each string past geophrases that are not found (or failed
+        # too many times), and drop the strings that are located or exhausted
+        current = []
+        for i in unresolved:
+            while position[i] < len(candidates[i]) and is_exhausted(candidates[i][position[i]]):
+                position[i] += 1
+            if position[i] < len(candidates[i]) and candidates[i][position[i]] not in resolved:
+                current.append(i)
+        unresolved = current
+        to_geocode = list(dict.fromkeys([candidates[i][position[i]] for i in unresolved]))
+        if not to_geocode: break
+        if con is not None:
+            for geophrase in list(to_geocode):
+                hit, location = lookup_geocode_cache(con, 
+                                                     normalize_geophrase(geophrase), 
+                                                     cache_ttl_days = cache_ttl_days
+                                                     )
+                if hit is True: resolved[geophrase] = location
+            to_geocode = [geophrase for geophrase in to_geocode if geophrase not in resolved]
+        round_nr += 1
+        if verbose is True:
+            print('\nGeocoding round...:', round_nr, 'geophrases...:', len(to_geocode))
+        locations, failed = geocode_concurrent(to_geocode, 
+                                               endpoints = endpoints,
+                                               user_agent = user_agent
+                                               )
+        for geophrase, location in locations.items():
+            resolved[geophrase] = location
+            if con is not None: store_geocode_cache(con, normalize_geophrase(geophrase), location)
+        for geophrase in failed:
+            failures[geophrase] = failures.get(geophrase, 0) + 1
+    
+    return resolved
+
+def read_geonames(path_to_file):
+    '''
+    Read the rows of a GeoNames file (e.g., cities15000.txt or 
+    allCountries.txt, see https://download.geonames.org/export/dump/)
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the .txt 
+        file or of the .zip file containing it, as downloaded from GeoNames
+    
+    Output
+    ------
+    generator of dict with keys: GEONAMES_COLUMNS
+    '''
+    path_to_file = str(path_to_file)
+    if path_to_file.endswith('.zip'):
+        with zipfile.ZipFile(path_to_file) as z:
+            name = [n for n in z.namelist() if n.endswith('.txt') and n != 'readme.txt'][0]
+            with z.open(name) as f:
+                for line in io.TextIOWrapper(f, encoding = 'utf-8'):
+                    yield dict(zip(GEONAMES_COLUMNS, line.rstrip('\n').split('\t')))
+        return
+    with open(path_to_file, encoding = 'utf-8') as f:
+        for line in f:
+            yield dict(zip(GEONAMES_COLUMNS, line.rstrip('\n').split('\t')))
+
+def load_gazetteer(path_to_geonames,
+                   min_population = 0,
+                   alternate_names = False,
+                   countries = True
+                   ):
+    '''
+    Build an offline gazetteer: a dict from the normalized names (see 
+    normalize_geophrase()) of cities and countries to their latitude and 
+    longitude, so that geophrases are looked up in memory without any request
+    (see get_lat_lon_from_text())
+    
+    Input
+    -----
+    path_to_geonames: str or pathlib.PosixPath object, full path of a 
+        GeoNames file with populated places (feature class 'P'), e.g. 
+        cities15000.txt (or .zip) (see read_geonames())
+        
+    min_population: int, default 0, places with population below 
+        min_population are not included
+        
+    alternate_names: bool, default False, include also the alternate names
+        of the places (many languages and abbreviations, e.g. 'NYC')
+        
+    countries: bool, default True, include the countries of pycountry 
+        (name, official name, common name and COUNTRY_ALIASES). 
+        The coordinates of a country are taken from its row in the GeoNames 
+        file (e.g., in allCountries.txt) with feature code in 
+        COUNTRY_FEATURE_CODES (PCLI first) or, if the file does not have 
+        such a row (e.g., cities15000.txt), they are the coordinates of the 
+        most populated place of the country in the file, so that they are 
+        always a point in the country (a mean of the coordinates of the 
+        places can be outside the country, e.g., in the sea). 
+        Countries without places in the file are not included
+    
+    Output
+    ------
+    gazetteer: dict with keys: str, normalized names and values: 
+        CachedLocation. If more places have the same name, the most 
+        populated is kept. Country names take precedence over place names
+        
+    Example
+    -------
+    gazetteer = load_gazetteer('cities15000.zip')
+    lat, lon, txt = get_lat_lon_from_text(affiliations, 
+                                          gazetteer = gazetteer,
+                                          fallback = False
+                                          )
+    '''
+    places = {}#name: (population, CachedLocation)
+    country_rows = {}#country code: (precedence, CachedLocation) of the country row
+    country_places = {}#country code: (population, CachedLocation) of the most populated place
+    for row in read_geonames(path_to_geonames):
+        if len(row) < len(GEONAMES_COLUMNS): continue
+        location = CachedLocation(float(row['latitude']), float(row['longitude']))
+        population = int(row['population'] or 0)
+        if row['feature_class'] == 'A' and row['feature_code'] in COUNTRY_FEATURE_CODES:
+            precedence = COUNTRY_FEATURE_CODES.index(row['feature_code'])
+            code = row['country_code']
+            if code not in country_rows or precedence < country_rows[code][0]:
+                country_rows[code] = (precedence, location)
+            continue
+        if row['feature_class'] != 'P' or population < min_population: continue
+        code = row['country_code']
+        if code not in country_places or country_places[code][0] < population:
+            country_places[code] = (population, location)
+        names = [row['name'], row['asciiname']]
+        if alternate_names is True: names.extend(row['alternatenames'].split(','))
+        for name in names:
+            name = normalize_geophrase(name)
+            if name and (name not in places or places[name][0] < population):
+                places[name] = (population, location)
+    gazetteer = {name: location for name, (_, location) in places.items()}
+    
+    if countries is True:
+        country_names = {alias: code for alias, code in COUNTRY_ALIASES.items()}
+        for country in pycountry.countries:
+            for attr in ('name', 'official_name', 'common_name'):
+                name = getattr(country, attr, None)
+                if name: country_names[normalize_geophrase(name)] = country.alpha_2
+        for name, code in country_names.items():
+            if code in country_rows:
+                gazetteer[name] = country_rows[code][1]
+            elif code in country_places:
+                gazetteer[name] = country_places[code][1]
+    
+    return gazetteer
+
+def plan_geophrases(all_txt_location,
+                    geophrase_delimeter = ',',
+                    clean_string = None,
+                    reverse = True
+                    ):
+    '''
+    Split the strings of all_txt_location in the geophrases that 
+    get_lat_lon_from_text() tries for each string, in the order they are 
+    tried, and collect the distinct geophrases of all strings 
+    
+    Input
+    -----
+    all_txt_location, geophrase_delimeter, clean_string, reverse: see 
+        get_lat_lon_from_text()
+    
+    Output
+    ------
+    candidates: list of len M of lists of str, candidates[i] contains the 
+        (non-empty, processed) geophrases of all_txt_location[i] in the 
+        order they are tried
+        
+    distinct: list of str, the distinct geophrases of candidates, in the 
+        order they first occur
+        
+    Example
+    -------
+    s = [
+        'Dept of Physics, Boston, MA, USA',
+        'Dept of Biology, Boston, MA, USA'
+        ]
+    candidates, distinct = plan_geophrases(s)
+    print(distinct)
+    [' USA', ' MA', ' Boston', 'Dept of Physics', 'Dept of Biology']
+    '''
+    candidates = []
+    for atl in all_txt_location:
+        atl_split = atl.split(geophrase_delimeter)#get geophrase to be decoded, assuming they are seperated by geophrase_delimeter
+        if reverse is True:atl_split = atl_split[::-1]#reverse so that we process the city faster (with affiliation formats, city usually near the end)
+        current_candidates = []
+        for loc in atl_split:
+            if clean_string == 'unicode': loc = txtfun.keep_only_unicode(loc)
+            if clean_string == 'alphanum': loc = txtfun.keep_only_alphanum(loc)
+            if loc: current_candidates.append(loc)#only non-empty geophrases are geocoded
+        candidates.append(current_candidates)
+    distinct = list(dict.fromkeys([loc for current_candidates in candidates for loc in current_candidates]))
+    
+    return candidates, distinct
+
+def build_country_automaton(official_names = False,
+                            common_names = False,
+                            subdivisions = False,
+                            extra_names = None
+                            ):
+    '''
+    Build an Aho-Corasick automaton over the names of the countries of 
+    pycountry, so that all the country names in a str are found in one pass
+    over the str (see find_countries())
+    
+    Input
+    -----
+    official_names: bool, default False, include the official names 
+        (e.g., 'Federal Republic of Germany')
+        
+    common_names: bool, default False, include the common names 
+        (e.g., 'Taiwan')
+        
+    subdivisions: bool, default False, include the names of the 
+        subdivisions of the countries (e.g., 'Bavaria'), mapped to the 
+        country they belong to. Subdivisions are only matched as whole 
+        words, since many of their names are short (e.g., 'Ba' in Fiji 
+        would else be found in 'Bavaria')
+        
+    extra_names: dict, default None, additional names (keys) mapped to the 
+        name of a country (values), e.g. {'USA': 'United States'}
+        
+        The names are always included (as in trace_countries_in_text())
+    
+    Output
+    ------
+    automaton: dict with keys:
+        'goto': list of dict, the transitions (char: state) of each state
+        'fail': list of int, the failure transition of each state
+        'output': list of lists of tuples (name length, country name, 
+            whole word), the names that end at each state. Names with 
+            whole word True are only matched as whole words
+    '''
+    patterns = {}#name: country name
+    whole_word_patterns = set()#names that are only matched as whole words
+    for country in pycountry.countries:
+        patterns[country.name] = country.name
+        if official_names is True and getattr(country, 'official_name', None):
+            patterns[country.official_name] = country.name
+        if common_names is True and getattr(country, 'common_name', None):
+            patterns[country.common_name] = country.name
+    if subdivisions is True:
+        for subdivision in pycountry.subdivisions:
+            country = pycountry.countries.get(alpha_2 = subdivision.country_code)
+            if country is not None and subdivision.name not in patterns:
+                patterns[subdivision.name] = country.name
+                whole_word_patterns.add(subdivision.name)
+    if extra_names is not None: 
+        patterns.update(extra_names)
+        whole_word_patterns.difference_update(extra_names)
+    
+    # Trie of the names
+    goto = [{}]
+    output = [[]]
+    for name, country_name in patterns.items():
+        state = 0
+        for char in name:
+            if char not in goto[state]:
+                goto.append({})
+                output.append([])
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        output[state].append((len(name), country_name, name in whole_word_patterns))
+    # Failure transitions (breadth-first), so that names that are suffixes 
+    # of the matched text (e.g., 'Niger' in 'Nigeria') are also found
+    fail = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            f = fail[state]
+            while f and char not in goto[f]: f = fail[f]
+            fail[next_state] = goto[f].get(char, 0)
+            output[next_state] = output[next_state] + output[fail[next_state]]
+    
+    return {'goto': goto, 'fail': fail, 'output': output}
+
+# Automaton of the country names, built on the first use of 
+# trace_countries_in_text()
+_COUNTRY_AUTOMATON = {}
+
+def get_country_automaton():
+    '''
+    Get the default automaton of the country names (see 
+    build_country_automaton()), built once and reused
+    '''
+    if 'default' not in _COUNTRY_AUTOMATON:
+        _COUNTRY_AUTOMATON['default'] = build_country_automaton()
+    
+    return _COUNTRY_AUTOMATON['default']
+
+def find_countries(txt, automaton = None, whole_words = False):
+    '''
+    Find all the country names in a str, in one pass over the str
+    
+    Input
+    -----
+    txt: str
+    
+    automaton: dict, default None, automaton returned from 
+        build_country_automaton(). If None the default automaton (country
+        names only) is used
+        
+    whole_words: bool, default False, keep only names that are not part of
+        a longer word (e.g., 'Niger' is not found in 'Nigeria'). Subdivisions
+        are always matched as whole words (see build_country_automaton())
+    
+    Output
+    ------
+    matches: list of tuples (start, end, country name), with txt[start:end]
+        the matched name, ordered by end. Overlapping names are all 
+        returned (e.g., both 'Niger' and 'Nigeria' in 'Nigeria')
+        
+    Example
+    -------
+    print(find_countries('From Spain to France'))
+    [(5, 10, 'Spain'), (14, 20, 'France')]
+    '''
+    if automaton is None: automaton = get_country_automaton()
+    goto = automaton['goto']
+    fail = automaton['fail']
+    output = automaton['output']
+    matches = []
+    state = 0
+    for i, char in enumerate(txt):
+        while state and char not in goto[state]: state = fail[state]
+        state = goto[state].get(char, 0)
+        for length, country_name, whole_word in output[state]:
+            start = i + 1 - length
+            if (whole_words is True or whole_word is True) and (
+                    (start > 0 and txt[start - 1].isalnum()) or 
+                    (i + 1 < len(txt) and txt[i + 1].isalnum())):
+                continue
+            matches.append((start, i + 1, country_name))
+    
+    return matches
+
+def trace_countries_in_text(txt, 
+                            allowed_countries = [], 
+                            automaton = None,
+                            whole_words = False,
+                            return_matches = False
+                            ):
     '''
     Find countries in a string and keep the string based on a list of allowed
     countries
@@ -147,6 +966,16 @@ def trace_countries_in_text(txt, allowed_countries = []):
     
     allowed_countries: list of str, default [], with the counries that are 
         allowed
+        
+    automaton: dict, default None, automaton returned from 
+        build_country_automaton() (e.g., to also find official names or 
+        subdivisions). If None, only the country names are found, each 
+        str being scanned once (see find_countries())
+        
+    whole_words: bool, default False, see find_countries()
+        
+    return_matches: bool, default False, return also the countries found 
+        in each str
     
     Output
     ------
@@ -156,6 +985,10 @@ def trace_countries_in_text(txt, allowed_countries = []):
     txt_not_allowed: list of str containing countries that are not allowed 
         (in allowed_countries list) 
         
+    matches: list of len(txt) of lists of tuples (start, end, country name),
+        the countries found in each str (see find_countries()). 
+        Only if return_matches is True
+        
     Example
     ------- 
     s = [
@@ -175,16 +1008,22 @@ def trace_countries_in_text(txt, allowed_countries = []):
     print(txt_not_allowed)
     ['I was in Spain last week']
     '''
+    if automaton is None: automaton = get_country_automaton()
+    allowed_countries = set(allowed_countries)
     txt_allowed = []
     txt_not_allowed = []
+    matches = []
     for t in txt:
-        not_allowed = False
-        for country in pycountry.countries:
-            if country.name in t and country.name not in allowed_countries:
-                not_allowed = True
+        current_matches = find_countries(t, 
+                                         automaton = automaton, 
+                                         whole_words = whole_words
+                                         )
+        not_allowed = any([country_name not in allowed_countries for _, _, country_name in current_matches])
+        if return_matches is True: matches.append(current_matches)
         if not_allowed is True:
             txt_not_allowed.append(t)
         else:
             txt_allowed.append(t)
+    if return_matches is True: return txt_allowed, txt_not_allowed, matches
                            
     return txt_allowed, txt_not_allowed 
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import re 
 
+from ..aux import records
 from ..metrics import txtmetrics
 
 def remove_digits_from_str(s):
@@ -134,7 +135,8 @@ def remove_str_newline(txt):
 
 def remove_email_txtinparen(lst_str,
                             len_threshold = 15,
-                            delimeter = ';'
+                            delimeter = ';',
+                            key = 'affiliations'
                             ):
     '''
     Remove elements from list of strings:
@@ -145,12 +147,25 @@ def remove_email_txtinparen(lst_str,
     
     Input
     -----
+    lst_str: list of str or list of aux.records.Publication, the str 
+        (e.g., affiliations) to be cleaned, each potentially containing many
+        delimeter-seperated str
     
+    len_threshold: int, default 15, str with length below len_threshold 
+        are removed
+        
+    delimeter: str, default ';', the delimeter of the str in each element 
+        of lst_str
+        
+    key: str, default 'affiliations', the field that is cleaned if lst_str 
+        is a list of Publication records
     
     Output
     ------
+    lst_str_cleaned: list of str, the cleaned str joined with delimeter
     
     '''
+    lst_str = records.get_field_values(lst_str, key = key)
     lst_str_cleaned = []
     for i,affil in enumerate(lst_str):
         all_current_cleaned = []
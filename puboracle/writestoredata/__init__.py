@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from . import getdata,readwritefun
+from . import bulkingest,getdata,pmidindex,readwritefun
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import itertools
+import os
+from os.path import join
+import re
+
+import pandas as pd
+
+from ..aux import auxfun
+from ..aux import records as pubrecords
+from . import readwritefun
+
+def order_baseline_files(filenames):
+    '''
+    Order PubMed baseline and update files (e.g., pubmed24n0001.xml.gz,
+    pubmed24n1220.xml.gz) by their nr. Update files continue the numbering
+    of the baseline files, so updates are ordered after the baseline and in
+    the order they have to be applied
+
+    Input
+    -----
+    filenames: list of str, the file names
+
+    Output
+    ------
+    list of str, the ordered file names
+    '''
+    return sorted(filenames, key = lambda f: int(re.findall(r'(\d+)\.xml', f)[-1]))
+
+def _date_tuple(date):
+    '''
+    Convert a date 'YYYY', 'YYYY-MM', 'YYYY/MM/DD' etc. to a tuple of int
+    '''
+    return tuple([int(d) for d in re.findall(r'\d+', date)])
+
+def record_matches_query(record,
+                         terms = None,
+                         fields = ('title', 'abstract', 'mesh_terms'),
+                         match = 'any',
+                         mindate = None,
+                         maxdate = None
+                         ):
+    '''
+    Check if a record matches a query over its fields (the local equivalent
+    of submitting a query to PubMed)
+
+    Input
+    -----
+    record: dict, with keys: fields and 'pubdate' (if mindate or maxdate is
+        used) (returned from readwritefun.extract_article_fields())
+
+    terms: list of str, default None, terms searched (case-insensitive) in
+        fields. If None, all records match the terms
+
+    fields: tuple of str, default ('title', 'abstract', 'mesh_terms'),
+        the keys of record where terms are searched
+
+    match: str, {'any', 'all'}, default 'any', if any or all terms must be
+        found in the fields
+
+    mindate: str, 'YYYY/MM/DD', 'YYYY/MM' or 'YYYY', default None, the
+        earliest pubdate of the records that match
+
+    maxdate: str, 'YYYY/MM/DD', 'YYYY/MM' or 'YYYY', default None, the
+        latest pubdate of the records that match
+
+        Note that dates are compared up to the precision of the least
+        precise of the two dates, e.g., pubdate '2020' matches
+        mindate '2020/06/01'
+
+    Output
+    ------
+    bool, True if the record matches the query
+    '''
+    if mindate is not None or maxdate is not None:
+        pubdate = _date_tuple(record['pubdate'] or '')
+        if not pubdate: return False
+        if mindate is not None:
+            lower = _date_tuple(mindate)
+            n = min(len(pubdate), len(lower))
+            if pubdate[:n] < lower[:n]: return False
+        if maxdate is not None:
+            upper = _date_tuple(maxdate)
+            n = min(len(pubdate), len(upper))
+            if pubdate[:n] > upper[:n]: return False
+    if terms:
+        txt = ' '.join([record[field] or '' for field in fields]).lower()
+        found = [term.lower() in txt for term in terms]
+        if match == 'all': return all(found)
+        return any(found)
+
+    return True
+
+def ingest_file(path_to_file,
+                keys_to_parse = None,
+                query = None,
+                predicate = None,
+                year_info_only = True
+                ):
+    '''
+    Stream-parse one baseline or update file (the per-file step of
+    ingest_pubmed_files())
+
+    Input
+    -----
+    path_to_file: str, full path of the file
+
+    For the rest of the parameters, see ingest_pubmed_files()
+
+    Output
+    ------
+    matched: dict, with keys: PMID and values: dict with keys: keys_to_parse,
+        for the records that match the query
+
+    seen: list of str, the PMIDs of all the records in the file (matched
+        or not), since they supersede older versions of the records
+
+    deleted: list of str, the PMIDs in the DeleteCitation of the file
+    '''
+    print('\nIngesting file...:', os.path.basename(path_to_file))
+    keys = list(keys_to_parse)
+    if query is not None:
+        keys.extend(query.get('fields', ('title', 'abstract', 'mesh_terms')))
+        if 'mindate' in query or 'maxdate' in query: keys.append('pubdate')
+    keys = list(dict.fromkeys(['pmid'] + keys))
+    matched = {}
+    seen = []
+    deleted = []
+    for elem in readwritefun.iter_pubmed_articles(path_to_file,
+                                                  tag = ('PubmedArticle', 'DeleteCitation')
+                                                  ):
+        if elem.tag == 'DeleteCitation':
+            deleted.extend([pmid.text.strip() for pmid in elem.iter('PMID')])
+            continue
+        record = readwritefun.extract_article_fields(elem,
+                                                     keys_to_parse = keys,
+                                                     year_info_only = year_info_only
+                                                     )
+        seen.append(record['pmid'])
+        if query is not None and not record_matches_query(record, **query): continue
+        if predicate is not None and not predicate(record): continue
+        matched[record['pmid']] = {key: record[key] for key in keys_to_parse}
+
+    return matched, seen, deleted
+
+def ingest_pubmed_files(folder_to_xmls,
+                        all_xml_files = None,
+                        keys_to_parse = None,
+                        query = None,
+                        predicate = None,
+                        n_jobs = None,
+                        year_info_only = True,
+                        as_table = False,
+                        as_records = False
+                        ):
+    '''
+    Ingest locally downloaded PubMed annual baseline and daily update files
+    (https://ftp.ncbi.nlm.nih.gov/pubmed/baseline and .../updatefiles),
+    without any network requests
+
+    The files are stream-parsed (in parallel with n_jobs) and applied in
+    order with update/delete semantics by PMID: a record in a later file
+    replaces the record of an earlier file and the PMIDs in DeleteCitation
+    are removed. Only the records (in their latest version) that match the
+    query are kept
+
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder
+        containing the baseline and update files
+
+    all_xml_files: list of str, the file names in folder_to_xmls
+        (.xml, .xml.gz or .xml.zst). Can be obtained from
+        readwritefun.get_files_in_folder(). The files are ordered with
+        order_baseline_files()
+
+    keys_to_parse: list of str, the keys to be extracted
+        (see readwritefun.FIELD_EXTRACTORS)
+
+    query: dict, default None, the parameters of record_matches_query(),
+        e.g. {'terms': ['connectome'], 'mindate': '2015'}. If None, all
+        records are kept
+
+    predicate: function, default None, taking a record (dict with keys:
+        keys_to_parse and the fields of query) and returning True if the
+        record must be kept. Applied after query. Must be a module-level
+        function if n_jobs is used (it is sent to other processes)
+
+    n_jobs: int, default None, nr of processes parsing files in parallel.
+        Default None parses the files sequentially. -1 uses all cores.
+
+    year_info_only: bool, default True
+        (see readwritefun.extract_article_fields())
+
+    as_table: bool, default False, return a table as
+        readwritefun.read_xml_to_table() instead of lists as
+        readwritefun.read_xml_to_dict()
+
+    as_records: bool, default False, return a list of compact
+        aux.records.Publication records (see readwritefun.read_xml_to_dict())
+
+    Output
+    ------
+    if as_records is True:
+    publications: list of aux.records.Publication with fields:
+        keys_to_parse and xml_file
+
+    if as_table is True:
+    table: pandas.DataFrame indexed by 'pmid' with one column per key in
+        keys_to_parse and the column 'xml_file'
+
+    else:
+    all_values: list of len(keys_to_parse) of lists, all_values[i] contains
+        the values of key=keys_to_parse[i] of all records that were kept
+
+    xml_file: list of str, the file name that each record was read from
+
+    Example
+    -------
+    all_xml_files = readwritefun.get_files_in_folder(folder_to_xmls)
+    table = ingest_pubmed_files(folder_to_xmls,
+                                all_xml_files = all_xml_files,
+                                keys_to_parse = ['affiliations', 'pubdate'],
+                                query = {'terms': ['connectome', 'connectomics'],
+                                         'mindate': '2010'},
+                                n_jobs = -1,
+                                as_table = True
+                                )
+    '''
+    all_xml_files = order_baseline_files(all_xml_files)
+    paths = [join(folder_to_xmls, current_xml) for current_xml in all_xml_files]
+    # The results are returned in the order of the files, so updates are 
+    # applied in order
+    results = auxfun.map_in_processes(ingest_file,
+                                      paths,
+                                      itertools.repeat(keys_to_parse),
+                                      itertools.repeat(query),
+                                      itertools.repeat(predicate),
+                                      itertools.repeat(year_info_only),
+                                      n_jobs = n_jobs
+                                      )
+    records = {}#PMID: (record, file name), kept in the order they were added
+    for current_xml, (matched, seen, deleted) in zip(all_xml_files, results):
+        # Newer versions of records (matching or not) and deleted records
+        # remove the older versions
+        for pmid in itertools.chain(seen, deleted):
+            records.pop(pmid, None)
+        for pmid, record in matched.items():
+            records[pmid] = (record, current_xml)
+    print('\nRecords kept...:', len(records))
+
+    if as_records is True:
+        return [pubrecords.Publication(xml_file = current_xml, **record)
+                for record, current_xml in records.values()]
+    if as_table is True:
+        table = pd.DataFrame([record for record, _ in records.values()],
+                             columns = keys_to_parse,
+                             index = pd.Index(list(records.keys()), name = 'pmid')
+                             )
+        table = table.drop(columns = 'pmid', errors = 'ignore')
+        table['xml_file'] = [current_xml for _, current_xml in records.values()]
+        return table
+
+    all_values = [[record[key] for record, _ in records.values()] for key in keys_to_parse]
+    xml_file = [current_xml for _, current_xml in records.values()]
+
+    return all_values, xml_file
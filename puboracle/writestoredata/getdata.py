@@ -1,10 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import itertools
 import numpy as np
+import os
+import threading
 import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import xml.etree.ElementTree as ET
 
 from Bio import Entrez
 
+from ..aux.ratelimit import TokenBucket
+from . import readwritefun
+
+# Base url of the NCBI E-utilities. Can be swapped for the url of a local 
+# stand-in server (e.g., for testing)
+EUTILS_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+
 def submit_query(query, 
                  days = 10,
                  datetype = None,
@@ -151,6 +167,222 @@ def fetch_by_query(WebEnv = None,
    
     return data
 
+def resolve_date_bounds(days = None, mindate = None, maxdate = None):
+    '''
+    Convert a relative date constraint (the past N days) to the absolute 
+    mindate and maxdate that it corresponds to today 
+    
+    Input
+    -----
+    days, mindate, maxdate: see the docstring of submit_query()
+    
+    Output
+    ------
+    mindate: str, 'YYYY/MM/DD' if days is not None, else the mindate param
+    
+    maxdate: str, 'YYYY/MM/DD' if days is not None, else the maxdate param
+    '''
+    if days is None or mindate is not None or maxdate is not None:
+        return mindate, maxdate
+    today = datetime.date.today()
+    mindate = (today - datetime.timedelta(days = days)).strftime('%Y/%m/%d')
+    maxdate = today.strftime('%Y/%m/%d')
+    
+    return mindate, maxdate
+
+def open_manifest(save_folder,
+                  query = None,
+                  datetype = None,
+                  days = None,
+                  mindate = None,
+                  maxdate = None,
+                  retmax = None,
+                  resume = False
+                  ):
+    '''
+    Get the manifest that keeps track of the progress of a harvest in 
+    save_folder. The manifest records the query, its (absolute) date bounds,
+    the retmax and Count of the query, for every completed retstart 
+    window, the stored file with its byte size and sha256 checksum and the 
+    batch nrs of the windows that could not be fetched ('failed')
+    
+    Input
+    -----
+    save_folder: str containing the path to the folder where the .xml files
+        and the manifest.json are stored
+        
+    resume: bool, default False, if True, the manifest.json in save_folder
+        is returned (if it exists). If False, a new manifest is created 
+        
+    For the rest of the parameters, see the docstring of fetch_write_data()
+    
+    Output
+    ------
+    manifest: dict
+    '''
+    manifest = None
+    if resume is True:
+        manifest = readwritefun.read_manifest(save_folder)
+    if manifest is not None:
+        # The harvest in save_folder must correspond to the same query
+        to_check = [('query', query), ('datetype', datetype), ('retmax', retmax)]
+        if days is None: to_check.extend([('mindate', mindate), ('maxdate', maxdate)])
+        for key, value in to_check:
+            if manifest[key] != value:
+                raise ValueError('Cannot resume: ' + key + ' differs from the ' 
+                                 'one in the manifest (' + str(manifest[key]) + ')')
+        # Manifests written before failed windows were recorded
+        manifest.setdefault('failed', [])
+        print('\nResuming harvest with...:', len(manifest['windows']), 
+              'completed batches')
+        return manifest
+    
+    mindate, maxdate = resolve_date_bounds(days = days, 
+                                           mindate = mindate, 
+                                           maxdate = maxdate
+                                           )
+    manifest = {
+                'query': query,
+                'datetype': datetype,
+                'mindate': mindate,
+                'maxdate': maxdate,
+                'retmax': retmax,
+                'count': None,
+                'windows': {},
+                'failed': []
+                }
+    readwritefun.write_manifest(manifest, save_folder)
+    
+    return manifest
+
+def set_manifest_count(manifest, count):
+    '''
+    Store the Count of the query in the manifest. A warning is printed if 
+    the Count changed since the manifest was created, since the records 
+    then shift between the retstart windows
+    
+    Input
+    -----
+    manifest: dict (returned from open_manifest())
+    
+    count: int, total nr of records of the query
+    '''
+    if manifest['count'] is not None and manifest['count'] != count:
+        print('\nWARNING: Count changed from...:', manifest['count'], 
+              'to...:', count, 'records may be missing or duplicated')
+    manifest['count'] = count
+    
+def get_pending_windows(manifest, save_folder, retstarts):
+    '''
+    Find the retstart windows that still have to be fetched, i.e., windows
+    that are not in the manifest or whose file is missing or does not match 
+    the byte size and checksum in the manifest
+    
+    Input
+    -----
+    manifest: dict (returned from open_manifest())
+    
+    save_folder: str containing the path to the folder where the .xml files
+        are stored
+        
+    retstarts: list of int (returned from get_retstart_windows())
+    
+    Output
+    ------
+    pending: list of int, the batch nrs (indexes of retstarts) to be fetched
+    '''
+    pending = []
+    for batch, rs in enumerate(retstarts):
+        window = manifest['windows'].get(str(batch))
+        if window is None or window['retstart'] != rs:
+            pending.append(batch)
+            continue
+        path_to_file = os.path.join(save_folder, window['file'])
+        if (not os.path.isfile(path_to_file) 
+            or os.path.getsize(path_to_file) != window['bytes']
+            or readwritefun.file_checksum(path_to_file) != window['sha256']):
+            print('\nMissing or corrupt file for batch nr...:', batch)
+            pending.append(batch)
+            
+    return pending
+
+def record_window(manifest, 
+                  save_folder,
+                  batch = None,
+                  retstart = None,
+                  filename = None
+                  ):
+    '''
+    Record a completed retstart window in the manifest and store the 
+    manifest in save_folder
+    
+    Input
+    -----
+    manifest: dict (returned from open_manifest())
+    
+    save_folder: str containing the path to the folder where the .xml files
+        and the manifest.json are stored
+        
+    batch: int, the batch nr
+    
+    retstart: int, the retstart of the window
+    
+    filename: str, the file name (in save_folder) where the data of the 
+        window was stored
+    '''
+    path_to_file = os.path.join(save_folder, filename)
+    manifest['windows'][str(batch)] = {
+                                       'retstart': retstart,
+                                       'file': filename,
+                                       'bytes': os.path.getsize(path_to_file),
+                                       'sha256': readwritefun.file_checksum(path_to_file)
+                                       }
+    if batch in manifest['failed']: manifest['failed'].remove(batch)
+    readwritefun.write_manifest(manifest, save_folder)
+
+def record_failed_window(manifest, save_folder, batch = None):
+    '''
+    Record a retstart window that could not be fetched in the manifest and 
+    store the manifest in save_folder. The window is not completed, so it is
+    fetched again when the harvest is resumed (see get_pending_windows())
+    
+    Input
+    -----
+    manifest: dict (returned from open_manifest())
+    
+    save_folder: str containing the path to the folder where the .xml files
+        and the manifest.json are stored
+        
+    batch: int, the batch nr
+    '''
+    manifest['windows'].pop(str(batch), None)
+    if batch not in manifest['failed']: manifest['failed'].append(batch)
+    readwritefun.write_manifest(manifest, save_folder)
+
+def get_retstart_windows(count, retmax = 1000, max_batch = None):
+    '''
+    Compute the retstart values of the windows of length retmax that cover
+    all the count records of a query
+    
+    Input
+    -----
+    count: int, total nr of records of the query (Count returned from 
+        submit_query())
+        
+    retmax: int, default 1000, length of each window
+    
+    max_batch: int, default None, max nr of windows to be returned. 
+        Default None returns all windows
+        
+    Output
+    ------
+    retstarts: list of int, with the retstart value of each window
+    '''
+    retstarts = list(range(0, count, retmax))
+    if max_batch is not None: retstarts = retstarts[:max_batch]
+    
+    return retstarts
+
 def fetch_write_data(query = None,
                      datetype = 'pdat',
                      mindate = None,
@@ -159,7 +391,10 @@ def fetch_write_data(query = None,
                      days = None,
                      max_batch = None,
                      retmax = 1000,
-                     save_folder = None 
+                     save_folder = None,
+                     single_search = False,
+                     resume = False,
+                     compression = None
                      ):
     '''
     Wrapper function for fetching and storing xml files based on queries to the
@@ -175,9 +410,38 @@ def fetch_write_data(query = None,
         
     save_folder: str containing the path to the folder where the .xml files
         will be stored
-    
+        
+    single_search: bool, default False, if True, submit the query only 
+        once and page efetch over the stored WebEnv and QueryKey with the 
+        retstart windows computed from the Count of the query 
+        (see get_retstart_windows()). The harvest terminates after the last 
+        window. Windows that cannot be fetched are recorded as failed in the
+        manifest.json and are fetched again with resume=True.
+        If False, the query is submitted again for every batch and the 
+        harvest stops when fetch_by_query() returns None
+
+    resume: bool, default False, resume a previous harvest in save_folder
+        based on its manifest.json (only with single_search=True). Only the
+        windows that are missing or whose files do not match the byte size
+        and checksum in the manifest are fetched
+
+        Note that with single_search=True the manifest.json is always
+        written to save_folder and relative dates (days) are converted to
+        absolute mindate and maxdate, so that a resumed harvest uses the
+        same date bounds (see resolve_date_bounds())
+
+    compression: str, {None, 'gzip', 'zstd'}, default None, compression of 
+        the stored files (xml_<batch>.xml.gz or xml_<batch>.xml.zst). 
+        Compressed files are read transparently by the readwritefun functions
+
     For the rest of the parameters, see the doscstring of
     submit_query() and fetch_by_query()
+    
+    Output
+    ------
+    failed: list of int, the batch nrs of the windows that could not be 
+        fetched (only with single_search=True, else always empty). 
+        The harvest is complete if failed is empty
     '''
     rs = 0#counter to start fetching records - will be updated by retmax at every batch 
     batch = 0
@@ -185,6 +449,59 @@ def fetch_write_data(query = None,
     # If min or max date is used, then set days to None
     if mindate is not None or maxdate is not None: days = None
     
+    if single_search is True:
+        manifest = open_manifest(save_folder,
+                                 query = query,
+                                 datetype = datetype,
+                                 days = days,
+                                 mindate = mindate,
+                                 maxdate = maxdate,
+                                 retmax = retmax,
+                                 resume = resume
+                                 )
+        # Submit the query once (retmax=0) to get Count, WebEnv and QueryKey
+        search_results = submit_query(query, 
+                                      days = None,
+                                      datetype = datetype,
+                                      mindate = manifest['mindate'],
+                                      maxdate = manifest['maxdate'],
+                                      email = email,
+                                      retstart = 0, 
+                                      retmax = 0
+                                      )
+        set_manifest_count(manifest, int(search_results['Count']))
+        retstarts = get_retstart_windows(int(search_results['Count']), 
+                                         retmax = retmax,
+                                         max_batch = max_batch
+                                         )
+        pending = get_pending_windows(manifest, save_folder, retstarts)
+        print('\nRecords found...:', search_results['Count'], 
+              'in batches...:', len(retstarts), 
+              'batches to fetch...:', len(pending))
+        for batch in pending:
+            print('\nBatch nr...:', batch)
+            data = fetch_by_query(WebEnv = search_results['WebEnv'],  
+                                  QueryKey = search_results['QueryKey'], 
+                                  retstart = retstarts[batch], 
+                                  retmax = retmax,
+                                  max_attempts = 10
+                                  )
+            if data is None: 
+                print('\nNo data for batch nr...:', batch, 'recorded as failed...')
+                record_failed_window(manifest, save_folder, batch = batch)
+                continue
+            filename = readwritefun.get_xml_filename(batch, compression = compression)
+            readwritefun.write_xml_data(data, os.path.join(save_folder, filename))
+            record_window(manifest, save_folder, 
+                          batch = batch, 
+                          retstart = retstarts[batch], 
+                          filename = filename
+                          )
+        if manifest['failed']:
+            print('\nFailed batches (fetched again with resume=True)...:', manifest['failed'])
+        
+        return list(manifest['failed'])
+    
     # TODO find a rigid valid stoping criterion (this hangs-up after 
     # max_attempts when no more results to fetch exist) 
     while True:
@@ -194,7 +511,7 @@ def fetch_write_data(query = None,
         # Submit the query for each incremental retstart and retmax values
         search_results = submit_query(query, 
                                       days = days,
-                                      datetype = 'pdat',
+                                      datetype = datetype,
                                       mindate = mindate,
                                       maxdate = maxdate,
                                       email = email,
@@ -212,9 +529,682 @@ def fetch_write_data(query = None,
         if data is None: break#if empty results, exit
         # Save data as xml    
         if data is not None: 
-            f=open(save_folder + 'xml_' + str(batch) + '.xml' ,'wb')
-            f.write(data)
-            f.close()
+            filename = readwritefun.get_xml_filename(batch, compression = compression)
+            readwritefun.write_xml_data(data, os.path.join(save_folder, filename))
             
         batch += 1
-    
\ No newline at end of file
+        
+    return []
+
+def get_rate_limiter(api_key = None):
+    '''
+    Get a TokenBucket obeying the NCBI rate limits: 3 requests/sec without 
+    and 10 requests/sec with an API key
+    
+    Input
+    -----
+    api_key: str, default None, NCBI API key
+    
+    Output
+    ------
+    limiter: TokenBucket object
+    '''
+    if api_key is None:
+        return TokenBucket(3)
+    else:
+        return TokenBucket(10)
+
+def eutils_request(utility, 
+                   params,
+                   base_url = EUTILS_URL,
+                   limiter = None,
+                   post = False,
+                   max_attempts = 5,
+                   backoff_sec = 1,
+                   timeout = 60
+                   ):
+    '''
+    Send a request to one of the E-utilities and return the raw response
+    
+    Input
+    -----
+    utility: str, {'esearch', 'efetch', ...}, the E-utility to be used
+    
+    params: dict, with the parameters of the request. Parameters with value 
+        None are not sent
+        
+    base_url: str, default EUTILS_URL, url where the E-utilities are served 
+        from. Swap for the url of a local server for testing
+        
+    limiter: TokenBucket object, default None, shared rate limiter. A token 
+        is acquired before every attempt. If None no rate limiting is applied
+        
+    post: bool, default False, send the request as HTTP POST (needed for 
+        long lists of ids) instead of GET
+        
+    max_attempts: int, default 5, max nr of attempts for the request. 
+        Failed attempts due to connection errors, HTTP 429 (too many requests)
+        and HTTP 5xx (server busy) are retried. Other HTTP errors are raised
+        
+    backoff_sec: float, default 1, seconds to wait after the first failed 
+        attempt. The wait is doubled after every failed attempt
+        
+    timeout: int, default 60, seconds to wait for the server to respond
+    
+    Output
+    ------
+    data: bytes, the body of the response
+    '''
+    url = base_url + utility + '.fcgi'
+    encoded = urlencode({k: v for k, v in params.items() if v is not None})
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None: limiter.acquire()
+        try:
+            if post is True:
+                response = urlopen(url, data = encoded.encode(), timeout = timeout)
+            else:
+                response = urlopen(url + '?' + encoded, timeout = timeout)
+            data = response.read()
+            response.close()
+            return data
+        except HTTPError as e:
+            if e.code != 429 and e.code < 500: raise
+            if attempt == max_attempts: raise
+            print('\nRequest failed at attempt nr...', attempt, e)
+        except (URLError, OSError) as e:
+            if attempt == max_attempts: raise
+            print('\nRequest failed at attempt nr...', attempt, e)
+        time.sleep(backoff_sec * 2 ** (attempt - 1))
+        
+def search_history(query, 
+                   days = None,
+                   datetype = None,
+                   mindate = None,
+                   maxdate = None,
+                   email = None,
+                   api_key = None,
+                   retstart = 0,
+                   retmax = 0,
+                   usehistory = True,
+                   base_url = EUTILS_URL,
+                   limiter = None,
+                   max_attempts = 5,
+                   timeout = 60
+                   ):
+    '''
+    Submit a query to esearch and return the total nr of hits (Count) and,
+    if usehistory is True, the WebEnv and QueryKey of the results stored on 
+    the history server
+    
+    Input
+    -----
+    api_key: str, default None, NCBI API key
+    
+    retmax: int, default 0, nr of PMIDs to be returned in IdList. The default
+        returns only the Count (and WebEnv, QueryKey)
+    
+    usehistory: bool, default True, store the results on the history server
+    
+    base_url, limiter, max_attempts, timeout: see eutils_request()
+    
+    For the rest of the parameters, see the docstring of submit_query()
+    
+    Output
+    ------
+    search_results: dict with keys:
+        'Count': int, total nr of hits of the query
+        'WebEnv': str or None
+        'QueryKey': str or None 
+        'IdList': list of str, the PMIDs in [retstart, retstart+retmax)
+    '''
+    params = {
+              'db': 'pubmed',
+              'term': query,
+              'reldate': days,
+              'datetype': datetype,
+              'mindate': mindate,
+              'maxdate': maxdate,
+              'retstart': retstart,
+              'retmax': retmax,
+              'usehistory': 'y' if usehistory is True else None,
+              'tool': 'puboracle',
+              'email': email,
+              'api_key': api_key
+              }
+    data = eutils_request('esearch', 
+                          params,
+                          base_url = base_url,
+                          limiter = limiter,
+                          max_attempts = max_attempts,
+                          timeout = timeout
+                          )
+    root = ET.fromstring(data)
+    error = root.find('ERROR')
+    if error is not None:
+        raise ValueError('esearch returned an error: ' + str(error.text))
+    search_results = {
+                      'Count': int(root.findtext('Count', default = '0')),
+                      'WebEnv': root.findtext('WebEnv'),
+                      'QueryKey': root.findtext('QueryKey'),
+                      'IdList': [i.text for i in root.iterfind('IdList/Id')]
+                      }
+    
+    return search_results
+
+def fetch_window(WebEnv = None,
+                 QueryKey = None,
+                 retstart = 0,
+                 retmax = 1000,
+                 email = None,
+                 api_key = None,
+                 base_url = EUTILS_URL,
+                 limiter = None,
+                 max_attempts = 5,
+                 timeout = 60
+                 ):
+    '''
+    Fetch from efetch the xml of the records [retstart, retstart+retmax) of 
+    the results stored on the history server 
+    
+    Input
+    -----
+    See the docstrings of fetch_by_query() and search_history()
+    
+    Output
+    ------
+    data: bytes, the xml returned from efetch
+    '''
+    params = {
+              'db': 'pubmed',
+              'retmode': 'xml',
+              'WebEnv': WebEnv,
+              'query_key': QueryKey,
+              'retstart': retstart,
+              'retmax': retmax,
+              'tool': 'puboracle',
+              'email': email,
+              'api_key': api_key
+              }
+    data = eutils_request('efetch', 
+                          params,
+                          base_url = base_url,
+                          limiter = limiter,
+                          max_attempts = max_attempts,
+                          timeout = timeout
+                          )
+    
+    return data
+
+def fetch_write_data_concurrent(query = None,
+                                datetype = 'pdat',
+                                mindate = None,
+                                maxdate = None,
+                                email = None,
+                                days = None,
+                                max_batch = None,
+                                retmax = 1000,
+                                save_folder = None,
+                                api_key = None,
+                                max_workers = None,
+                                base_url = EUTILS_URL,
+                                max_attempts = 5,
+                                timeout = 60,
+                                resume = False,
+                                compression = None
+                                ):
+    '''
+    Concurrent version of fetch_write_data(). The query is submitted once
+    and the retstart windows of length retmax are fetched by a pool of 
+    workers that share one TokenBucket, so that downloads run as fast as
+    the NCBI rate limits allow (3 requests/sec without and 10 requests/sec 
+    with an API key)
+    
+    Input
+    -----
+    api_key: str, default None, NCBI API key
+    
+    max_workers: int, default None, nr of workers fetching windows 
+        concurrently. Default None uses twice the nr of requests/sec allowed
+        
+    base_url, max_attempts, timeout: see eutils_request()
+    
+    For the rest of the parameters, see the docstring of fetch_write_data()
+    
+    Output
+    ------
+    files: list of str, the full paths of the stored .xml files ordered by 
+        batch nr
+    '''
+    # If min or max date is used, then set days to None
+    if mindate is not None or maxdate is not None: days = None
+    
+    limiter = get_rate_limiter(api_key = api_key)
+    if max_workers is None: max_workers = int(2 * limiter.rate)
+    
+    manifest = open_manifest(save_folder,
+                             query = query,
+                             datetype = datetype,
+                             days = days,
+                             mindate = mindate,
+                             maxdate = maxdate,
+                             retmax = retmax,
+                             resume = resume
+                             )
+    print('\nSubmitting query...')
+    search_results = search_history(query,
+                                    datetype = datetype,
+                                    mindate = manifest['mindate'],
+                                    maxdate = manifest['maxdate'],
+                                    email = email,
+                                    api_key = api_key,
+                                    base_url = base_url,
+                                    limiter = limiter,
+                                    max_attempts = max_attempts,
+                                    timeout = timeout
+                                    )
+    set_manifest_count(manifest, search_results['Count'])
+    retstarts = get_retstart_windows(search_results['Count'], 
+                                     retmax = retmax,
+                                     max_batch = max_batch
+                                     )
+    pending = get_pending_windows(manifest, save_folder, retstarts)
+    print('\nRecords found...:', search_results['Count'], 
+          'in batches...:', len(retstarts),
+          'batches to fetch...:', len(pending))
+    
+    manifest_lock = threading.Lock()
+    def fetch_and_write(batch):
+        data = fetch_window(WebEnv = search_results['WebEnv'],
+                            QueryKey = search_results['QueryKey'],
+                            retstart = retstarts[batch],
+                            retmax = retmax,
+                            email = email,
+                            api_key = api_key,
+                            base_url = base_url,
+                            limiter = limiter,
+                            max_attempts = max_attempts,
+                            timeout = timeout
+                            )
+        filename = readwritefun.get_xml_filename(batch, compression = compression)
+        readwritefun.write_xml_data(data, os.path.join(save_folder, filename))
+        with manifest_lock:
+            record_window(manifest, save_folder,
+                          batch = batch,
+                          retstart = retstarts[batch],
+                          filename = filename
+                          )
+        print('\nStored batch nr...:', batch)
+    
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        list(executor.map(fetch_and_write, pending))
+        
+    files = [os.path.join(save_folder, manifest['windows'][str(batch)]['file']) 
+             for batch in range(len(retstarts))]
+        
+    return files
+
+def parse_query_date(date, end = False):
+    '''
+    Convert a date of the form 'YYYY/MM/DD', 'YYYY/MM' or 'YYYY' (as used by 
+    mindate and maxdate) to a datetime.date object
+    
+    Input
+    -----
+    date: str, the date to be converted
+    
+    end: bool, default False, if True, incomplete dates are converted to the
+        last day of the month or year they denote (as for maxdate), else to 
+        the first day (as for mindate)
+        
+    Output
+    ------
+    datetime.date object
+    '''
+    parts = [int(p) for p in date.replace('-', '/').split('/')]
+    if len(parts) == 3: return datetime.date(*parts)
+    if len(parts) == 1: parts.append(12 if end is True else 1)
+    first_day = datetime.date(parts[0], parts[1], 1)
+    if end is False: return first_day
+    # Last day of the month: first day of next month minus one day
+    next_month = (first_day + datetime.timedelta(days = 32)).replace(day = 1)
+    
+    return next_month - datetime.timedelta(days = 1)
+
+def shard_date_range(query,
+                     datetype = 'pdat',
+                     mindate = None,
+                     maxdate = None,
+                     cap = 10000,
+                     email = None,
+                     api_key = None,
+                     base_url = EUTILS_URL,
+                     limiter = None,
+                     max_workers = None,
+                     max_attempts = 5,
+                     timeout = 60
+                     ):
+    '''
+    Recursively split the date range [mindate, maxdate] in halves until the
+    Count of the query in each date range (shard) is not above cap 
+    
+    esearch can only retrieve the first 10000 PMIDs of a query (see 
+    https://www.ncbi.nlm.nih.gov/books/NBK25499/), so queries over broad date
+    ranges have to be split in shards that are retrieved separately 
+    
+    Input
+    -----
+    cap: int, default 10000, max Count allowed for each shard
+    
+    max_workers: int, default None, nr of workers submitting the queries of 
+        each level of the recursion concurrently. Default None uses twice the 
+        nr of requests/sec allowed by limiter 
+    
+    For the rest of the parameters, see the docstring of search_history()
+    
+    Output
+    ------
+    shards: list of tuples (mindate, maxdate, count) ordered by date, with
+        mindate and maxdate str of the form 'YYYY/MM/DD' and count the Count 
+        of the query in [mindate, maxdate]
+        
+    NOTE: a shard of a single day with Count above cap cannot be split further.
+        Such shards are kept and a warning is printed, since only cap PMIDs
+        can be retrieved from them
+    '''
+    if limiter is None: limiter = get_rate_limiter(api_key = api_key)
+    if max_workers is None: max_workers = int(2 * limiter.rate)
+    
+    def count_range(date_range):
+        search_results = search_history(query,
+                                        datetype = datetype,
+                                        mindate = date_range[0].strftime('%Y/%m/%d'),
+                                        maxdate = date_range[1].strftime('%Y/%m/%d'),
+                                        email = email,
+                                        api_key = api_key,
+                                        usehistory = False,
+                                        base_url = base_url,
+                                        limiter = limiter,
+                                        max_attempts = max_attempts,
+                                        timeout = timeout
+                                        )
+        return search_results['Count']
+    
+    shards = []
+    to_split = [(parse_query_date(mindate), parse_query_date(maxdate, end = True))]
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        # Submit the queries of each level of the recursion concurrently
+        while to_split:
+            counts = list(executor.map(count_range, to_split))
+            next_split = []
+            for (lo, hi), count in zip(to_split, counts):
+                if count <= cap or lo == hi:
+                    if count > cap:
+                        print('\nWARNING: Count...:', count, 'above cap for...:', 
+                              lo, 'only', cap, 'records will be retrieved')
+                    shards.append((lo, hi, count))
+                else:
+                    mid = lo + (hi - lo) // 2
+                    next_split.extend([(lo, mid), (mid + datetime.timedelta(days = 1), hi)])
+            to_split = next_split
+    
+    shards.sort()
+    shards = [(lo.strftime('%Y/%m/%d'), hi.strftime('%Y/%m/%d'), count) for lo, hi, count in shards]
+            
+    return shards
+
+def fetch_ids(pmids,
+              email = None,
+              api_key = None,
+              base_url = EUTILS_URL,
+              limiter = None,
+              max_attempts = 5,
+              timeout = 60
+              ):
+    '''
+    Fetch from efetch the xml of the records with the given PMIDs. The 
+    request is sent as HTTP POST, so long lists of PMIDs can be fetched
+    
+    Input
+    -----
+    pmids: list of str, the PMIDs to be fetched
+    
+    For the rest of the parameters, see the docstring of search_history()
+    
+    Output
+    ------
+    data: bytes, the xml returned from efetch
+    '''
+    params = {
+              'db': 'pubmed',
+              'retmode': 'xml',
+              'id': ','.join(pmids),
+              'tool': 'puboracle',
+              'email': email,
+              'api_key': api_key
+              }
+    data = eutils_request('efetch', 
+                          params,
+                          base_url = base_url,
+                          limiter = limiter,
+                          post = True,
+                          max_attempts = max_attempts,
+                          timeout = timeout
+                          )
+    
+    return data
+
+def fetch_write_data_sharded(query = None,
+                             datetype = 'pdat',
+                             mindate = None,
+                             maxdate = None,
+                             email = None,
+                             days = None,
+                             retmax = 1000,
+                             save_folder = None,
+                             cap = 10000,
+                             api_key = None,
+                             max_workers = None,
+                             base_url = EUTILS_URL,
+                             max_attempts = 5,
+                             timeout = 60,
+                             file_prefix = 'xml_',
+                             compression = None
+                             ):
+    '''
+    Fetch and store xml files for queries whose Count is above the nr of 
+    records that can be retrieved from a single esearch (see 
+    shard_date_range())
+    
+    The date range [mindate, maxdate] is split in shards with Count not above 
+    cap and the PMIDs of all shards are retrieved concurrently. The PMIDs are 
+    deduplicated (keeping the order of the shards) and fetched concurrently in
+    batches of retmax PMIDs that are stored as <file_prefix><batch>.xml 
+    (see readwritefun.get_xml_filename())
+    
+    Input
+    -----
+    cap: int, default 10000, max Count allowed for each shard
+    
+    file_prefix: str, default 'xml_', prefix of the names of the stored files
+    
+    For the rest of the parameters, see the docstrings of 
+    fetch_write_data_concurrent() and shard_date_range()
+    
+    Output
+    ------
+    files: list of str, the full paths of the stored .xml files ordered by 
+        batch nr
+    '''
+    mindate, maxdate = resolve_date_bounds(days = days, 
+                                           mindate = mindate, 
+                                           maxdate = maxdate
+                                           )
+    if mindate is None or maxdate is None:
+        raise ValueError('Sharding needs a date range: specify days or '
+                         'mindate and maxdate')
+    
+    limiter = get_rate_limiter(api_key = api_key)
+    if max_workers is None: max_workers = int(2 * limiter.rate)
+    
+    print('\nSharding date range...:', mindate, '-', maxdate)
+    shards = shard_date_range(query,
+                              datetype = datetype,
+                              mindate = mindate,
+                              maxdate = maxdate,
+                              cap = cap,
+                              email = email,
+                              api_key = api_key,
+                              base_url = base_url,
+                              limiter = limiter,
+                              max_workers = max_workers,
+                              max_attempts = max_attempts,
+                              timeout = timeout
+                              )
+    print('\nShards...:', len(shards), 
+          'records found...:', sum(shard[2] for shard in shards))
+    
+    def get_shard_ids(shard):
+        search_results = search_history(query,
+                                        datetype = datetype,
+                                        mindate = shard[0],
+                                        maxdate = shard[1],
+                                        email = email,
+                                        api_key = api_key,
+                                        retmax = min(shard[2], cap),
+                                        usehistory = False,
+                                        base_url = base_url,
+                                        limiter = limiter,
+                                        max_attempts = max_attempts,
+                                        timeout = timeout
+                                        )
+        return search_results['IdList']
+    
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        shard_ids = list(executor.map(get_shard_ids, shards))
+        # Deduplicate PMIDs, keeping the order of the shards
+        pmids = list(dict.fromkeys(itertools.chain.from_iterable(shard_ids)))
+        print('\nUnique PMIDs...:', len(pmids))
+        batches = [pmids[i:i + retmax] for i in range(0, len(pmids), retmax)]
+        
+        def fetch_and_write(batch):
+            data = fetch_ids(batches[batch],
+                             email = email,
+                             api_key = api_key,
+                             base_url = base_url,
+                             limiter = limiter,
+                             max_attempts = max_attempts,
+                             timeout = timeout
+                             )
+            filename = os.path.join(save_folder, 
+                                    readwritefun.get_xml_filename(batch, 
+                                                                  prefix = file_prefix,
+                                                                  compression = compression
+                                                                  ))
+            readwritefun.write_xml_data(data, filename)
+            print('\nStored batch nr...:', batch)
+            
+            return filename
+        
+        files = list(executor.map(fetch_and_write, range(len(batches))))
+        
+    return files
+
+def sync_query(query = None,
+               save_folder = None,
+               datetype = 'mdat',
+               initial_mindate = None,
+               overlap_days = 1,
+               email = None,
+               retmax = 1000,
+               cap = 10000,
+               api_key = None,
+               max_workers = None,
+               base_url = EUTILS_URL,
+               max_attempts = 5,
+               timeout = 60,
+               state_filename = 'sync_state.json',
+               compression = None
+               ):
+    '''
+    Incrementally synchronize the records of a query in save_folder. Only 
+    the records added (datetype='edat') or modified (datetype='mdat') since 
+    the last sync are fetched and merged into the store in save_folder, 
+    keyed by PMID (see readwritefun.merge_into_store())
+    
+    A watermark (the maxdate of the last sync) is kept for each query in 
+    save_folder/state_filename. Each sync fetches [watermark - overlap_days, 
+    today] with fetch_write_data_sharded() and advances the watermark
+    
+    Input
+    -----
+    datetype: str, {'mdat', 'edat'}, default 'mdat', the date that the 
+        watermark refers to (modification or Entrez date)
+        
+    initial_mindate: str, 'YYYY/MM/DD', default None, mindate of the first 
+        sync of the query (when no watermark exists yet)
+        
+    overlap_days: int, default 1, nr of days before the watermark that are 
+        fetched again, so that records dated on the day of the last sync 
+        after it was run are not missed 
+        
+    state_filename: str, default 'sync_state.json', file name of the 
+        watermarks in save_folder
+        
+    For the rest of the parameters, see the docstring of 
+    fetch_write_data_sharded()
+    
+    Output
+    ------
+    nr_new: int, nr of new PMIDs added to the store
+    
+    nr_updated: int, nr of PMIDs in the store that were replaced by a newer 
+        version
+    '''
+    sync_state = readwritefun.read_manifest(save_folder, filename = state_filename)
+    if sync_state is None: sync_state = {}
+    if query in sync_state:
+        if sync_state[query]['datetype'] != datetype:
+            raise ValueError('The watermark of the query refers to datetype: ' 
+                             + sync_state[query]['datetype'])
+        watermark = parse_query_date(sync_state[query]['watermark'])
+        mindate = (watermark - datetime.timedelta(days = overlap_days)).strftime('%Y/%m/%d')
+    elif initial_mindate is not None:
+        mindate = initial_mindate
+    else:
+        raise ValueError('No watermark for the query: specify initial_mindate')
+    maxdate = datetime.date.today().strftime('%Y/%m/%d')
+    
+    print('\nSynchronizing records with', datetype, 'in...:', mindate, '-', maxdate)
+    # Prefix the new files with the time of the sync so they do not overwrite
+    # the files of the store
+    file_prefix = 'sync_' + datetime.datetime.now().strftime('%Y%m%d%H%M%S') + '_'
+    files = fetch_write_data_sharded(query = query,
+                                     datetype = datetype,
+                                     mindate = mindate,
+                                     maxdate = maxdate,
+                                     email = email,
+                                     retmax = retmax,
+                                     save_folder = save_folder,
+                                     cap = cap,
+                                     api_key = api_key,
+                                     max_workers = max_workers,
+                                     base_url = base_url,
+                                     max_attempts = max_attempts,
+                                     timeout = timeout,
+                                     file_prefix = file_prefix,
+                                     compression = compression
+                                     )
+    nr_new, nr_updated = readwritefun.merge_into_store(save_folder, 
+                                                       [os.path.basename(f) for f in files]
+                                                       )
+    print('\nNew records...:', nr_new, 'updated records...:', nr_updated)
+    
+    # Advance the watermark only after the store was updated
+    sync_state[query] = {
+                         'datetype': datetype,
+                         'watermark': maxdate,
+                         'last_sync': datetime.datetime.now().isoformat()
+                         }
+    readwritefun.write_manifest(sync_state, save_folder, filename = state_filename)
+    
+    return nr_new, nr_updated
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+import sqlite3
+from os.path import join
+import xml.etree.ElementTree as ET
+
+from . import readwritefun
+
+# Start and end of a PubmedArticle element and the PMID it contains. The
+# first PMID of a PubmedArticle is the one of its MedlineCitation
+ARTICLE_START = re.compile(rb'<PubmedArticle[\s>]')
+ARTICLE_END = b'</PubmedArticle>'
+ARTICLE_PMID = re.compile(rb'<PMID[^>]*>\s*(\d+)\s*</PMID>')
+
+def scan_article_offsets(path_to_file, chunk_size = 4194304):
+    '''
+    Scan a .xml file and find the byte offset and length of each
+    PubmedArticle element, without parsing the xml
+
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the .xml
+        file. Compressed files are scanned decompressed, so offsets refer to
+        the decompressed content (see readwritefun.open_xml_file())
+
+    chunk_size: int, default 4194304 (4MB), nr of bytes read at a time
+
+    Output
+    ------
+    generator of tuples (pmid, offset, length), with pmid int
+    '''
+    with readwritefun.open_xml_file(path_to_file) as f:
+        buffer = b''
+        buffer_offset = 0#offset of buffer[0] in the file
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            pos = 0
+            while True:
+                start = ARTICLE_START.search(buffer, pos)
+                if start is None: break
+                end = buffer.find(ARTICLE_END, start.start())
+                if end == -1: break#the element continues in the next chunk
+                end += len(ARTICLE_END)
+                pmid = ARTICLE_PMID.search(buffer, start.start(), end)
+                if pmid is not None:
+                    yield int(pmid.group(1)), buffer_offset + start.start(), end - start.start()
+                pos = end
+            if not chunk: break
+            # Keep only the part of buffer that was not processed (an
+            # incomplete element or a possibly incomplete start tag)
+            if start is not None:
+                cut = start.start()
+            else:
+                cut = max(pos, len(buffer) - len(ARTICLE_END))
+            buffer_offset += cut
+            buffer = buffer[cut:]
+
+def build_pmid_index(folder_to_xmls,
+                     all_xml_files = None,
+                     path_to_index = None,
+                     chunk_size = 4194304
+                     ):
+    '''
+    Build an index (SQLite database) with the file, byte offset and length
+    of the PubmedArticle element of each PMID in the .xml files, so that
+    specific records can be read without parsing all files
+    (see get_records())
+
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder
+        containing all the .xml files to be indexed
+
+    all_xml_files: list of str, denoting the file names to be indexed in the
+        folder_to_xmls. Can be obtained from get_files_in_folder().
+        If a PMID is contained in more than one file, the last file is kept
+
+    path_to_index: str or pathlib.PosixPath object, full path of the index
+        to be created. An existing index is replaced
+
+    chunk_size: int, default 4194304 (4MB), see scan_article_offsets()
+
+    Output
+    ------
+    nr_indexed: int, nr of PMIDs in the index
+    '''
+    con = sqlite3.connect(str(path_to_index))
+    with con:
+        con.execute('DROP TABLE IF EXISTS files')
+        con.execute('DROP TABLE IF EXISTS articles')
+        con.execute('CREATE TABLE files (file_id INTEGER PRIMARY KEY, name TEXT)')
+        con.execute('CREATE TABLE articles (pmid INTEGER PRIMARY KEY, '
+                    'file_id INTEGER, offset INTEGER, length INTEGER)')
+        for file_id, current_xml in enumerate(all_xml_files):
+            print('\nIndexing file...:', current_xml)
+            con.execute('INSERT INTO files VALUES (?, ?)', (file_id, current_xml))
+            con.executemany('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?)',
+                            ((pmid, file_id, offset, length) for pmid, offset, length
+                             in scan_article_offsets(join(folder_to_xmls, current_xml),
+                                                     chunk_size = chunk_size))
+                            )
+    nr_indexed = con.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+    con.close()
+
+    return nr_indexed
+
+def get_records(pmids,
+                path_to_index = None,
+                folder_to_xmls = None,
+                keys_to_parse = None
+                ):
+    '''
+    Read the records of specific PMIDs by seeking to their PubmedArticle
+    element with the index built with build_pmid_index(). Only these
+    elements are read and parsed
+
+    Input
+    -----
+    pmids: list of int or str, the PMIDs of the records to be read
+
+    path_to_index: str or pathlib.PosixPath object, full path of the index
+
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder
+        containing the indexed .xml files
+
+    keys_to_parse: list of str, default None, the keys to be extracted
+        (see readwritefun.FIELD_EXTRACTORS). If None, the
+        xml.etree.ElementTree.Element of each record is returned
+
+    Output
+    ------
+    records: dict with keys: the PMIDs (str) that were found in the index
+        and values: dict with keys: keys_to_parse (or Element if
+        keys_to_parse is None)
+    '''
+    pmids = [int(pmid) for pmid in pmids]
+    con = sqlite3.connect(str(path_to_index))
+    locations = []
+    # Query in chunks to stay below the max nr of SQLite variables
+    for i in range(0, len(pmids), 500):
+        chunk = pmids[i:i + 500]
+        locations.extend(con.execute('SELECT articles.pmid, files.name, offset, length '
+                                     'FROM articles JOIN files USING (file_id) '
+                                     'WHERE articles.pmid IN (' + ','.join('?' * len(chunk)) + ')',
+                                     chunk).fetchall())
+    con.close()
+    if len(locations) < len(set(pmids)):
+        print('\nPMIDs not in the index...:', len(set(pmids)) - len(locations))
+
+    # Read each file once, seeking forward (compressed files can only be
+    # read sequentially)
+    locations.sort(key = lambda location: (location[1], location[2]))
+    records = {}
+    current_xml = None
+    f = None
+    for pmid, filename, offset, length in locations:
+        if filename != current_xml:
+            if f is not None: f.close()
+            current_xml = filename
+            f = readwritefun.open_xml_file(join(folder_to_xmls, current_xml))
+        f.seek(offset)
+        article = ET.fromstring(f.read(length))
+        if keys_to_parse is not None:
+            article = readwritefun.extract_article_fields(article, keys_to_parse = keys_to_parse)
+        records[str(pmid)] = article
+    if f is not None: f.close()
+
+    return records
@@ -1,10 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import itertools
+import json
+import os
 from os import listdir
 from os.path import isfile, join
 import re
+import xml.etree.ElementTree as ET
 
+import pandas as pd
+import pickle
 import pubmed_parser as pp
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..aux import auxfun, records
+    
+# Extensions of the (compressed) .xml files that can be read and written
+XML_EXTENSIONS = ('.xml', '.xml.gz', '.xml.zst')
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
 
 def get_files_in_folder(folder_path, order=False):
     '''
@@ -23,9 +41,12 @@ def get_files_in_folder(folder_path, order=False):
     ------
     filenames: list of str, with the file names in folder_path 
         (including the extension)  
+        
+    NOTE: .xml files as well as gzip (.xml.gz) and zstd (.xml.zst) compressed
+        .xml files are returned 
     
     '''
-    filenames = [f for f in listdir(folder_path) if isfile(join(folder_path, f)) and f.endswith('.xml')]
+    filenames = [f for f in listdir(folder_path) if isfile(join(folder_path, f)) and f.endswith(XML_EXTENSIONS)]
     # Order filenames by assuming only one digit in their filename. 
     # This digit will define the ordering. 
     if order is True:
@@ -33,6 +54,107 @@ def get_files_in_folder(folder_path, order=False):
     
     return filenames  
 
+def get_xml_filename(batch, prefix = 'xml_', compression = None):
+    '''
+    Get the file name for storing the .xml data of a batch
+    
+    Input
+    -----
+    batch: int, the batch nr
+    
+    prefix: str, default 'xml_', prefix of the file name
+    
+    compression: str, {None, 'gzip', 'zstd'}, default None, compression 
+        of the file 
+        
+    Output
+    ------
+    filename: str, e.g. 'xml_0.xml', 'xml_0.xml.gz' or 'xml_0.xml.zst'
+    '''
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError('compression must be one of: ' + str(list(COMPRESSION_EXTENSIONS)))
+        
+    return prefix + str(batch) + '.xml' + COMPRESSION_EXTENSIONS[compression]
+
+def get_compression(path_to_file):
+    '''
+    Get the compression of a .xml file from its extension 
+    (.xml.gz: 'gzip', .xml.zst: 'zstd', else None)
+    '''
+    path_to_file = str(path_to_file)
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if extension and path_to_file.endswith(extension): return compression
+    
+    return None
+
+def open_xml_file(path_to_file, mode = 'rb', compression = 'infer'):
+    '''
+    Open a .xml file and transparently (de)compress it based on its 
+    extension (.xml.gz: gzip, .xml.zst: zstd)
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the file
+    
+    mode: str, {'rb', 'wb'}, default 'rb'
+    
+    compression: str, {'infer', None, 'gzip', 'zstd'}, default 'infer', 
+        the compression of the file. 'infer' gets it from the extension of 
+        path_to_file (see get_compression())
+    
+    Output
+    ------
+    file object
+    
+    NOTE: zstd needs the zstandard package
+    '''
+    path_to_file = str(path_to_file)
+    if compression == 'infer': compression = get_compression(path_to_file)
+    if compression == 'gzip':
+        return gzip.open(path_to_file, mode)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is needed for .zst files (pip install zstandard)')
+        return zstandard.open(path_to_file, mode)
+    
+    return open(path_to_file, mode)
+
+def write_xml_data(data, path_to_file):
+    '''
+    Write .xml data to a file, compressed based on the extension of the file
+    (see open_xml_file())
+    
+    Input
+    -----
+    data: bytes, the .xml data
+    
+    path_to_file: str or pathlib.PosixPath object, full path of the file
+    '''
+    with open_xml_file(path_to_file, 'wb') as f:
+        f.write(data)
+        
+def get_parseable_xml(path_to_file):
+    '''
+    Get the input for pubmed_parser for a (compressed) .xml file. lxml 
+    reads .xml and .xml.gz files from their path, whereas .xml.zst files are
+    decompressed in memory
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the file
+    
+    Output
+    ------
+    str, the path for .xml and .xml.gz files, or bytes, the decompressed 
+        content for .xml.zst files
+    '''
+    path_to_file = str(path_to_file)
+    if path_to_file.endswith('.zst'):
+        with open_xml_file(path_to_file) as f:
+            return f.read()
+        
+    return path_to_file
+
 def read_swap_write(path_file_for_edit, 
                     path_new_file = None, 
                     filename_new = None,
@@ -88,9 +210,72 @@ def read_swap_write(path_file_for_edit,
     f_read.close() 
     f_write.close() 
     
+def parse_xml_file(folder_to_xmls, 
+                   current_xml, 
+                   keys_to_parse = None, 
+                   cache_folder = None
+                   ):
+    '''
+    Read the xml data of one file in dict and store the desired dict values 
+    corresponding to the values specified in the list keys_to_parse
+    (the per-file step of read_xml_to_dict())
+    
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder 
+        containing the .xml file
+        
+    current_xml: str, file name of the .xml file to be read
+    
+    keys_to_parse: list of str (see read_xml_to_dict())
+    
+    cache_folder: str or pathlib.PosixPath object, default None, folder of 
+        the parse cache (see get_cache_key()). If None no cache is used
+    
+    Output
+    ------
+    values: list of len(keys_to_parse) of lists, values[i] contains all the 
+        values corresponding to key=keys_to_parse[i] in current_xml
+        
+    xml_file: list of str, current_xml for each value that was read
+    '''
+    if cache_folder is not None:
+        cache_key = get_cache_key(folder_to_xmls/current_xml, 
+                                  keys_to_parse = keys_to_parse, 
+                                  kind = 'dict'
+                                  )
+        values = load_from_cache(cache_folder, cache_key)
+        if values is not None:
+            print('\nLoading from cache file...:', current_xml)
+            xml_file = [current_xml] * sum([len(v) for v in values])
+            return values, xml_file
+    
+    print('\nIterating file...:', current_xml)
+    xml_file = []
+    values = [[] for key in keys_to_parse]
+    # Normaly parse_medline_xml() should work (since we get data from pubmed), 
+    # but this does not appear to be the case. 
+    # Instead parse_medline_xml() gets the desired info from the xml files. 
+    # To be further checked.  
+    dicts_out = pp.parse_medline_xml(get_parseable_xml(folder_to_xmls/current_xml))
+    for d in dicts_out:
+        for i, key in enumerate(keys_to_parse):
+            try:
+                values[i].append(d[key])
+                xml_file.append(current_xml)# keep xml file name
+            except:
+                print('\nKey ', key, ' not found!')
+    if cache_folder is not None: store_in_cache(cache_folder, cache_key, values)
+                
+    return values, xml_file
+
 def read_xml_to_dict(folder_to_xmls, 
                      all_xml_files = None,
-                     keys_to_parse = None
+                     keys_to_parse = None,
+                     n_jobs = None,
+                     cache_folder = None,
+                     max_cache_bytes = None,
+                     as_records = False
                      ):
     '''
     Read xml data in dict and store the desired dict values corresponding to
@@ -102,44 +287,817 @@ def read_xml_to_dict(folder_to_xmls,
         containing all the .xml files to be read
         
     all_xml_files: list of str, denoting the file names to be read in the 
-        folder_to_xmls. Can be obtained from get_files_in_folder() 
+        folder_to_xmls. Can be obtained from get_files_in_folder(). 
+        Files can be gzip (.xml.gz) or zstd (.xml.zst) compressed 
         
     keys_to_parse: list of str, denoting the keys of the dictionary holding 
         all the xml data from each file. The dictionary is created from
         parse_medline_xml() part of the pubmed_parser package 
+        
+    n_jobs: int, default None, nr of processes parsing files in parallel. 
+        Default None parses the files sequentially. -1 uses all cores.
+        The results of each file are merged in the order of all_xml_files,
+        so the output is the same as with sequential parsing
+        
+    cache_folder: str or pathlib.PosixPath object, default None, folder 
+        where the values extracted from each file are cached, keyed by the 
+        content hash of the file and keys_to_parse. Unchanged files are 
+        loaded from the cache instead of being parsed again. 
+        If None no cache is used
+        
+    max_cache_bytes: int, default None, max size of cache_folder. The least
+        recently used entries are evicted after reading (see evict_cache()).
+        If None the cache is not evicted
+        
+    as_records: bool, default False, if True, return a list of compact 
+        aux.records.Publication records instead of lists of values. 
+        The values of each file are converted as soon as the file is read,
+        so the lists of values of all files are never held in memory
     
     Output
     ------
+    if as_records is True:
+    publications: list of aux.records.Publication with fields: 
+        keys_to_parse and xml_file
+    
+    if as_records is False:
     all_values: list of len(keys_to_parse) of lists L
         all_values[i] contains a list L with all the values corresponding to
         key=keys_to_parse[i]. 
         len(L) depends on the data contained in the .xml 
         files that will be read.
+        
+    xml_file: list of str, the xml file name from which each value was read    
     '''
     xml_file = [] #keep here the xml file name from which the data are read
     
     # Initialize a list with N empty lists with N=len(keys_to_parse) 
     # This is where we store all the valeus from the keys_to_parse keys 
     # for a every dict
-    all_values = [[]] * len(keys_to_parse)
-    for current_xml in all_xml_files:
-        print('\nIterating file...:', current_xml)
-        # Normaly parse_medline_xml() should work (since we get data from pubmed), 
-        # but this does not appear to be the case. 
-        # Instead parse_medline_xml() gets the desired info from the xml files. 
-        # To be further checked.  
-        dicts_out = pp.parse_medline_xml(str(folder_to_xmls/current_xml))
-        for d in dicts_out:
-            for i, key in enumerate(keys_to_parse):
-                try:
-                    if all_values[i]:
-                        all_values[i].append(d[key])
-                    else:
-                        # Store the value of key in a list so it can be further 
-                        # appended in the loop
-                        all_values[i] = [d[key]]
-                    xml_file.append(current_xml)# keep xml file name
-                except:
-                    print('\nKey ', key, ' not found!')
+    all_values = [[] for key in keys_to_parse]
+    # The results are returned in the order of all_xml_files 
+    results = auxfun.map_in_processes(parse_xml_file, 
+                                      itertools.repeat(folder_to_xmls),
+                                      all_xml_files,
+                                      itertools.repeat(keys_to_parse),
+                                      itertools.repeat(cache_folder),
+                                      n_jobs = n_jobs
+                                      )
+    publications = []
+    for values, current_xml_file in results:
+        if as_records is True:
+            publications.extend(records.values_to_publications(keys_to_parse, 
+                                                               values, 
+                                                               xml_file = current_xml_file[0] if current_xml_file else None
+                                                               ))
+            continue
+        for i in range(len(keys_to_parse)):
+            all_values[i].extend(values[i])
+        xml_file.extend(current_xml_file)
+    if cache_folder is not None and max_cache_bytes is not None:
+        evict_cache(cache_folder, max_cache_bytes)
+    if as_records is True: return publications
                       
-    return all_values, xml_file    
\ No newline at end of file
+    return all_values, xml_file
+
+def file_checksum(path_to_file, algorithm = 'sha256', chunk_size = 1048576):
+    '''
+    Compute the checksum of a file by reading it in chunks
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the file
+    
+    algorithm: str, default 'sha256', any algorithm supported by hashlib
+    
+    chunk_size: int, default 1048576 (1MB), nr of bytes read at a time
+    
+    Output
+    ------
+    checksum: str, the hex digest of the file content
+    '''
+    h = hashlib.new(algorithm)
+    with open(path_to_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+            
+    return h.hexdigest()
+
+def read_manifest(folder_path, filename = 'manifest.json'):
+    '''
+    Read the manifest (.json) that keeps track of the progress of a harvest
+    (see getdata.fetch_write_data())
+    
+    Input
+    -----
+    folder_path: str or pathlib.PosixPath object, the folder containing the 
+        manifest
+        
+    filename: str, default 'manifest.json', file name of the manifest
+    
+    Output
+    ------
+    manifest: dict, or None if no manifest exists in folder_path
+    '''
+    path_to_manifest = join(folder_path, filename)
+    if not isfile(path_to_manifest): return None
+    with open(path_to_manifest, 'r') as f:
+        manifest = json.load(f)
+        
+    return manifest
+
+def write_manifest(manifest, folder_path, filename = 'manifest.json'):
+    '''
+    Write the manifest (.json) that keeps track of the progress of a harvest 
+    (see getdata.fetch_write_data())
+    
+    The manifest is first written to a temporary file that then replaces the 
+    old manifest, so an interrupted write never leaves a corrupt manifest
+    
+    Input
+    -----
+    manifest: dict, json serializable
+    
+    folder_path: str or pathlib.PosixPath object, the folder where the 
+        manifest will be stored
+        
+    filename: str, default 'manifest.json', file name of the manifest
+    '''
+    path_to_manifest = join(folder_path, filename)
+    with open(path_to_manifest + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    os.replace(path_to_manifest + '.tmp', path_to_manifest)
+
+def iter_pubmed_articles(path_to_file, tag = 'PubmedArticle'):
+    '''
+    Iterate the PubmedArticle elements of a PubMed .xml file incrementally. 
+    Each element is cleared after it is processed, so memory does not grow 
+    with the size of the file
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the .xml 
+        file (can be compressed, see open_xml_file())
+        
+    tag: str or tuple of str, default 'PubmedArticle', tag(s) of the 
+        elements to be returned (e.g., ('PubmedArticle', 'DeleteCitation'))
+    
+    Output
+    ------
+    generator of xml.etree.ElementTree.Element objects
+    
+    NOTE: the elements are only valid until the next element is requested.
+        Copy anything that must be kept. 
+    '''
+    tags = (tag,) if isinstance(tag, str) else tuple(tag)
+    root = None
+    with open_xml_file(path_to_file) as f:
+        for event, elem in ET.iterparse(f, events = ('start', 'end')):
+            if root is None: 
+                root = elem
+                continue
+            if event == 'end' and elem.tag in tags:
+                yield elem
+                # Drop the processed element(s) from the tree
+                root.clear()
+
+def get_article_pmid(article):
+    '''
+    Get the PMID of a PubmedArticle element
+    
+    Input
+    -----
+    article: xml.etree.ElementTree.Element object, a PubmedArticle
+    
+    Output
+    ------
+    pmid: str, or None if the element contains no PMID
+    '''
+    pmid = article.findtext('MedlineCitation/PMID')
+    if pmid is not None: pmid = pmid.strip()
+    
+    return pmid
+
+def write_pubmed_articles(articles, path_to_file, compression = 'infer'):
+    '''
+    Write PubmedArticle elements to a PubMed .xml file (PubmedArticleSet)
+    
+    Input
+    -----
+    articles: iterable of xml.etree.ElementTree.Element objects
+    
+    path_to_file: str or pathlib.PosixPath object, full path of the .xml 
+        file to be written
+        
+    compression: str, default 'infer', the compression of the file (see 
+        open_xml_file())
+        
+    Output
+    ------
+    nr_articles: int, nr of articles written
+    '''
+    nr_articles = 0
+    with open_xml_file(path_to_file, 'wb', compression = compression) as f:
+        f.write(b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n')
+        for article in articles:
+            article.tail = '\n'
+            f.write(ET.tostring(article))
+            nr_articles += 1
+        f.write(b'</PubmedArticleSet>\n')
+        
+    return nr_articles
+
+def build_store_index(folder_path, exclude = []):
+    '''
+    Build the index (PMID: file name) of a store of .xml files from the 
+    files themselves (e.g., for a store harvested before the index existed)
+    
+    Input
+    -----
+    folder_path: str or pathlib.PosixPath object, the folder of the store
+    
+    exclude: list of str, default [], file names not to be indexed
+    
+    Output
+    ------
+    pmid_index: dict, PMID: name of the file containing it. If a PMID is 
+        contained in more than one file, the last file in sorted order of 
+        file names is kept
+    '''
+    pmid_index = {}
+    for filename in sorted(get_files_in_folder(folder_path)):
+        if filename in exclude: continue
+        for article in iter_pubmed_articles(join(folder_path, filename)):
+            pmid = get_article_pmid(article)
+            if pmid is not None: pmid_index[pmid] = filename
+            
+    return pmid_index
+
+def merge_into_store(folder_path, 
+                     new_files, 
+                     index_filename = 'pmid_index.json'
+                     ):
+    '''
+    Merge new .xml files into a store of .xml files keyed by PMID, so that
+    each PMID is contained in exactly one file of the store
+    
+    The store keeps an index (PMID: file name) in folder_path. If the index
+    does not exist, it is built from the files of the store (see 
+    build_store_index()). The PMIDs in new_files supersede the ones already 
+    in the store: superseded articles are removed from the older files 
+    (files left empty are deleted) 
+    
+    Input
+    -----
+    folder_path: str or pathlib.PosixPath object, the folder of the store
+    
+    new_files: list of str, the file names (already in folder_path) to be 
+        merged into the store. If a PMID is contained in more than one of the 
+        new files, the last one is kept
+        
+    index_filename: str, default 'pmid_index.json', file name of the index
+    
+    Output
+    ------
+    nr_new: int, nr of PMIDs that were not in the store (each PMID is 
+        counted once, even if it is contained in more than one new file)
+    
+    nr_updated: int, nr of PMIDs that were already in the store and were 
+        replaced
+    '''
+    path_to_index = join(folder_path, index_filename)
+    if isfile(path_to_index):
+        with open(path_to_index, 'r') as f:
+            pmid_index = json.load(f)
+    else:
+        print('\nBuilding the index of the store...')
+        pmid_index = build_store_index(folder_path, exclude = new_files)
+    
+    superseded = {}#file name: set of PMIDs to be removed from the file
+    merged = set()#PMIDs of the new files merged so far
+    nr_new = 0
+    nr_updated = 0
+    for new_file in new_files:
+        for article in iter_pubmed_articles(join(folder_path, new_file)):
+            pmid = get_article_pmid(article)
+            old_file = pmid_index.get(pmid)
+            if old_file is not None and old_file != new_file:
+                superseded.setdefault(old_file, set()).add(pmid)
+            # Count each PMID once, when it is first seen in new_files
+            if pmid not in merged:
+                if old_file is None:
+                    nr_new += 1
+                else:
+                    nr_updated += 1
+                merged.add(pmid)
+            pmid_index[pmid] = new_file
+    
+    # Rewrite the files containing superseded articles without them
+    for old_file, pmids in superseded.items():
+        path_old_file = join(folder_path, old_file)
+        if not isfile(path_old_file): continue
+        # The temporary file is not a .xml file, so that it is not taken 
+        # as a file of the store if the merge is interrupted. It is written 
+        # with the compression of old_file
+        path_tmp_file = path_old_file + '.' + str(os.getpid()) + '.tmp'
+        kept = (article for article in iter_pubmed_articles(path_old_file) 
+                if get_article_pmid(article) not in pmids)
+        nr_kept = write_pubmed_articles(kept, 
+                                        path_tmp_file, 
+                                        compression = get_compression(old_file)
+                                        )
+        if nr_kept > 0:
+            os.replace(path_tmp_file, path_old_file)
+        else:
+            os.remove(path_tmp_file)
+            os.remove(path_old_file)
+        
+    with open(path_to_index + '.tmp', 'w') as f:
+        json.dump(pmid_index, f)
+    os.replace(path_to_index + '.tmp', path_to_index)
+    
+    return nr_new, nr_updated
+
+def _text(elem):
+    '''
+    All the text contained in an element (including its children), stripped
+    '''
+    if elem is None: return ''
+    
+    return ''.join(elem.itertext()).strip()
+
+def _join_ui_text(elems):
+    '''
+    Join elements as 'UI:text' separated by '; ' (as pubmed_parser does for
+    MeSH terms, publication types and chemicals)
+    '''
+    return '; '.join([e.attrib.get('UI', '') + ':' + _text(e) for e in elems])
+
+def _month_or_day(txt):
+    '''
+    Convert a month (e.g., 'Jan' or '1') or day to a zero-padded str of 
+    len 2 
+    '''
+    months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 
+              'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+    txt = txt.strip()
+    if txt[:3].lower() in months: return '{:02d}'.format(months.index(txt[:3].lower()) + 1)
+    if txt.isdigit(): return '{:02d}'.format(int(txt))
+    
+    return None
+
+def _get_abstract(article):
+    abstract_texts = article.findall('MedlineCitation/Article/Abstract/AbstractText')
+    if len(abstract_texts) > 1:
+        # Structured abstract: section labels followed by section text
+        abstract_list = []
+        for abstract in abstract_texts:
+            section = abstract.attrib.get('Label', '')
+            if section != 'UNASSIGNED':
+                abstract_list.append('\n')
+                abstract_list.append(section)
+            abstract_list.append(_text(abstract))
+        return '\n'.join(abstract_list).strip()
+    if len(abstract_texts) == 1: return _text(abstract_texts[0])
+    
+    return _text(article.find('MedlineCitation/Article/Abstract'))
+
+def _get_authors(article):
+    authors = []
+    for author in article.findall('MedlineCitation/Article/AuthorList/Author'):
+        authors.append('|'.join([_text(author.find('LastName')),
+                                 _text(author.find('ForeName')),
+                                 _text(author.find('Initials')),
+                                 _text(author.find('Identifier'))
+                                 ]))
+        
+    return ';'.join(authors)
+
+def _get_affiliations(article):
+    affiliations = []
+    for author in article.findall('MedlineCitation/Article/AuthorList/Author'):
+        affiliation = author.findtext('AffiliationInfo/Affiliation') or ''
+        affiliation = affiliation.replace("For a full list of the authors' "
+                                          "affiliations please see the "
+                                          "Acknowledgements section.", '')
+        if affiliation != '': affiliations.append(affiliation)
+        
+    return ';'.join(affiliations)
+
+def _get_pubdate(article, year_info_only = True):
+    pubdate = article.find('MedlineCitation/Article/Journal/JournalIssue/PubDate')
+    if pubdate is None: return ''
+    if pubdate.find('Year') is None:
+        year = re.findall(r'\d{4}', pubdate.findtext('MedlineDate') or '')
+        return year[0] if year else ''
+    date = [_text(pubdate.find('Year'))]
+    if year_info_only is False and pubdate.find('Month') is not None:
+        date.append(_month_or_day(_text(pubdate.find('Month'))))
+        if date[-1] is not None and pubdate.find('Day') is not None:
+            date.append(_month_or_day(_text(pubdate.find('Day'))))
+            
+    return '-'.join([d for d in date if d])
+
+def _get_doi(article):
+    # As pubmed_parser.parse_doi(): if there are ELocationIDs, the last one 
+    # is used (empty if it is not a doi), else the doi in ArticleIdList
+    elocation_ids = article.findall('MedlineCitation/Article/ELocationID')
+    if elocation_ids:
+        elocation_id = elocation_ids[-1]
+        return _text(elocation_id) if elocation_id.attrib.get('EIdType', '') == 'doi' else ''
+    
+    return _text(article.find('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]'))
+
+def _get_issue(article):
+    # 'volume(issue)', empty if there is no volume
+    volume = article.findtext('MedlineCitation/Article/Journal/JournalIssue/Volume') or ''
+    if volume == '': return ''
+    issue = article.findtext('MedlineCitation/Article/Journal/JournalIssue/Issue') or ''
+    
+    return volume + '(' + issue + ')'
+
+def _get_references(article):
+    # PMIDs of the references separated by ';'
+    pmids = []
+    for reference in article.findall('PubmedData/ReferenceList/Reference'):
+        pmid = _text(reference.find('ArticleIdList/ArticleId[@IdType="pubmed"]'))
+        if pmid != '': pmids.append(pmid)
+        
+    return ';'.join(pmids)
+
+def _get_other_ids(article, pmc = False):
+    other_ids = [_text(oid) for oid in article.findall('MedlineCitation/OtherID')]
+    if pmc is True:
+        pmcs = [oid for oid in other_ids if 'PMC' in oid]
+        return pmcs[-1] if pmcs else ''
+    
+    return '; '.join([oid for oid in other_ids if 'PMC' not in oid])
+
+# Functions extracting each of the keys of parse_medline_xml() (pubmed_parser)
+# from a PubmedArticle element, with the same format of values 
+FIELD_EXTRACTORS = {
+    'pmid': lambda a: get_article_pmid(a) or '',
+    'title': lambda a: _text(a.find('MedlineCitation/Article/ArticleTitle')),
+    'issue': _get_issue,
+    'pages': lambda a: a.findtext('MedlineCitation/Article/Pagination/MedlinePgn') or '',
+    'abstract': _get_abstract,
+    'journal': lambda a: ' '.join([t.text or '' for t in a.findall('MedlineCitation/Article/Journal/Title')]),
+    'authors': _get_authors,
+    'affiliations': _get_affiliations,
+    'pubdate': _get_pubdate,
+    'mesh_terms': lambda a: _join_ui_text(a.findall('MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName')),
+    'publication_types': lambda a: _join_ui_text(a.findall('MedlineCitation/Article/PublicationTypeList/PublicationType')),
+    'chemical_list': lambda a: _join_ui_text(a.findall('MedlineCitation/ChemicalList/Chemical/NameOfSubstance')),
+    'keywords': lambda a: '; '.join([k.text for k in a.findall('MedlineCitation/KeywordList/Keyword') if k.text is not None]),
+    'doi': _get_doi,
+    'references': _get_references,
+    'pmc': lambda a: _get_other_ids(a, pmc = True),
+    'other_id': _get_other_ids,
+    'medline_ta': lambda a: _text(a.find('MedlineCitation/MedlineJournalInfo/MedlineTA')),
+    'nlm_unique_id': lambda a: _text(a.find('MedlineCitation/MedlineJournalInfo/NlmUniqueID')),
+    'issn_linking': lambda a: _text(a.find('MedlineCitation/MedlineJournalInfo/ISSNLinking')),
+    'country': lambda a: _text(a.find('MedlineCitation/MedlineJournalInfo/Country')),
+    'delete': lambda a: False
+    }
+
+def extract_article_fields(article, 
+                           keys_to_parse = None, 
+                           year_info_only = True
+                           ):
+    '''
+    Extract only the keys in keys_to_parse from a PubmedArticle element
+    
+    Input
+    -----
+    article: xml.etree.ElementTree.Element object, a PubmedArticle
+    
+    keys_to_parse: list of str, keys of FIELD_EXTRACTORS (named as the keys 
+        of the dict returned from parse_medline_xml() of pubmed_parser)
+        
+    year_info_only: bool, default True, if True, pubdate contains only the 
+        year, else 'YYYY-MM-DD' (or 'YYYY-MM', 'YYYY' if day or month are 
+        not available) 
+        
+    Output
+    ------
+    record: dict with keys: keys_to_parse
+    '''
+    record = {}
+    for key in keys_to_parse:
+        if key == 'pubdate':
+            record[key] = _get_pubdate(article, year_info_only = year_info_only)
+        else:
+            record[key] = FIELD_EXTRACTORS[key](article)
+            
+    return record
+
+def iter_xml_records(folder_to_xmls, 
+                     all_xml_files = None,
+                     keys_to_parse = None,
+                     year_info_only = True,
+                     as_records = False
+                     ):
+    '''
+    Stream the records of .xml files, extracting only the keys in 
+    keys_to_parse. 
+    
+    In contrast to read_xml_to_dict(), the PubmedArticle elements are parsed
+    incrementally and cleared after use and no other keys are extracted, so 
+    memory does not grow with the size of the files 
+    
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder 
+        containing all the .xml files to be read
+        
+    all_xml_files: list of str, denoting the file names to be read in the 
+        folder_to_xmls. Can be obtained from get_files_in_folder(). 
+        Files can be gzip (.xml.gz) or zstd (.xml.zst) compressed 
+        
+    keys_to_parse: list of str, the keys to be extracted 
+        (see FIELD_EXTRACTORS for the supported keys)
+        
+    year_info_only: bool, default True (see extract_article_fields())
+    
+    as_records: bool, default False, if True, record is a compact 
+        aux.records.Publication instead of a dict
+    
+    Output
+    ------
+    generator of tuples (record, xml_file) with record a dict with keys: 
+        keys_to_parse and xml_file the file name that the record was read from
+    
+    Example
+    -------
+    for record, xml_file in iter_xml_records(folder_to_xmls, 
+                                             all_xml_files = all_xml_files,
+                                             keys_to_parse = ['pmid', 'affiliations']
+                                             ):
+        print(record['pmid'], record['affiliations'])
+    '''
+    not_supported = [key for key in keys_to_parse if key not in FIELD_EXTRACTORS]
+    if not_supported:
+        raise ValueError('Keys not supported: ' + str(not_supported) + 
+                         ' supported keys: ' + str(list(FIELD_EXTRACTORS)))
+    for current_xml in all_xml_files:
+        for article in iter_pubmed_articles(join(folder_to_xmls, current_xml)):
+            record = extract_article_fields(article, 
+                                            keys_to_parse = keys_to_parse,
+                                            year_info_only = year_info_only
+                                            )
+            if as_records is True:
+                record = records.Publication(xml_file = current_xml, **record)
+            yield record, current_xml
+
+def read_xml_columns(folder_to_xmls, 
+                     current_xml, 
+                     keys_to_parse = None,
+                     cache_folder = None
+                     ):
+    '''
+    Read the values of keys_to_parse of all the records of one .xml file in 
+    columns (the per-file step of read_xml_to_table())
+    
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder 
+        containing the .xml file
+        
+    current_xml: str, file name of the .xml file to be read
+    
+    keys_to_parse: list of str (see iter_xml_records())
+    
+    cache_folder: str or pathlib.PosixPath object, default None, folder of 
+        the parse cache (see get_cache_key()). If None no cache is used
+    
+    Output
+    ------
+    columns: dict with keys: keys_to_parse and values: list with the value of
+        the key for each record of current_xml
+    '''
+    if cache_folder is not None:
+        cache_key = get_cache_key(join(folder_to_xmls, current_xml), 
+                                  keys_to_parse = keys_to_parse, 
+                                  kind = 'columns'
+                                  )
+        columns = load_from_cache(cache_folder, cache_key)
+        if columns is not None:
+            print('\nLoading from cache file...:', current_xml)
+            return columns
+        
+    print('\nIterating file...:', current_xml)
+    columns = {key: [] for key in keys_to_parse}
+    for record, _ in iter_xml_records(folder_to_xmls, 
+                                      all_xml_files = [current_xml],
+                                      keys_to_parse = keys_to_parse
+                                      ):
+        for key in keys_to_parse:
+            columns[key].append(record[key])
+    if cache_folder is not None: store_in_cache(cache_folder, cache_key, columns)
+            
+    return columns
+
+def read_xml_to_table(folder_to_xmls, 
+                      all_xml_files = None,
+                      keys_to_parse = None,
+                      n_jobs = None,
+                      cache_folder = None,
+                      max_cache_bytes = None
+                      ):
+    '''
+    Read the values of keys_to_parse of all the records of the .xml files in
+    a table indexed by PMID with one column per key
+    
+    In contrast to read_xml_to_dict(), the rows are aligned to the PMIDs and
+    the table can be stored in a columnar format (see write_table_parquet()),
+    so that later steps can load only the columns they need
+    
+    Input
+    -----
+    folder_to_xmls: pathlib.PosixPath object denoting the path to the folder 
+        containing all the .xml files to be read
+        
+    all_xml_files: list of str, denoting the file names to be read in the 
+        folder_to_xmls. Can be obtained from get_files_in_folder(). 
+        
+    keys_to_parse: list of str, the keys to be extracted 
+        (see FIELD_EXTRACTORS for the supported keys)
+        
+    n_jobs: int, default None, nr of processes reading files in parallel. 
+        Default None reads the files sequentially. -1 uses all cores.
+        
+    cache_folder, max_cache_bytes: see read_xml_to_dict()
+    
+    Output
+    ------
+    table: pandas.DataFrame indexed by 'pmid' with one column per key in 
+        keys_to_parse and the column 'xml_file' with the file name that each 
+        record was read from. 
+        If a PMID is contained in more than one record, the last is kept 
+        
+    Example
+    -------
+    table = read_xml_to_table(folder_to_xmls, 
+                              all_xml_files = all_xml_files,
+                              keys_to_parse = ['affiliations', 'pubdate']
+                              )
+    affiliations = table['affiliations'].tolist()
+    '''
+    keys = ['pmid'] + [key for key in keys_to_parse if key != 'pmid']
+    results = auxfun.map_in_processes(read_xml_columns, 
+                                      itertools.repeat(folder_to_xmls),
+                                      all_xml_files,
+                                      itertools.repeat(keys),
+                                      itertools.repeat(cache_folder),
+                                      n_jobs = n_jobs
+                                      )
+    all_columns = {key: [] for key in keys}
+    all_columns['xml_file'] = []
+    for current_xml, columns in zip(all_xml_files, results):
+        for key in keys:
+            all_columns[key].extend(columns[key])
+        all_columns['xml_file'].extend([current_xml] * len(columns['pmid']))
+    if cache_folder is not None and max_cache_bytes is not None:
+        evict_cache(cache_folder, max_cache_bytes)
+    
+    table = pd.DataFrame(all_columns).set_index('pmid')
+    table = table[~table.index.duplicated(keep = 'last')]
+    
+    return table
+
+def write_table_parquet(table, path_to_file):
+    '''
+    Store a table (returned from read_xml_to_table()) as a Parquet file
+    
+    Input
+    -----
+    table: pandas.DataFrame
+    
+    path_to_file: str or pathlib.PosixPath object, full path of the .parquet
+        file
+        
+    NOTE: needs pyarrow (or fastparquet)
+    '''
+    table.to_parquet(path_to_file)
+
+def read_table_parquet(path_to_file, columns = None):
+    '''
+    Read a table stored with write_table_parquet()
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the .parquet
+        file
+        
+    columns: list of str, default None, the columns to be read. Only these
+        columns are read from disk. Default None reads all columns
+        
+    Output
+    ------
+    table: pandas.DataFrame indexed by 'pmid'
+    '''
+    return pd.read_parquet(path_to_file, columns = columns)
+
+def get_cache_key(path_to_file, keys_to_parse = None, kind = 'dict'):
+    '''
+    Get the key of the parse cache for a .xml file. The key depends on the 
+    content of the file (not its name or time of modification) and on the 
+    keys that are extracted, so an entry is only reused for the same data 
+    and the same keys
+    
+    Input
+    -----
+    path_to_file: str or pathlib.PosixPath object, full path of the .xml file
+    
+    keys_to_parse: list of str, the keys extracted from the file
+    
+    kind: str, default 'dict', the format of the cached values, so that 
+        the values of different readers are cached separately
+        
+    Output
+    ------
+    cache_key: str
+    '''
+    keys_hash = hashlib.sha256(json.dumps([kind] + list(keys_to_parse)).encode()).hexdigest()
+    
+    return file_checksum(path_to_file) + '_' + keys_hash[:16]
+
+def load_from_cache(cache_folder, cache_key):
+    '''
+    Load an entry of the parse cache. The time of modification of the entry 
+    is updated, so that the least recently used entries are evicted first 
+    (see evict_cache())
+    
+    Input
+    -----
+    cache_folder: str or pathlib.PosixPath object, folder of the cache
+    
+    cache_key: str (returned from get_cache_key())
+    
+    Output
+    ------
+    the cached object, or None if no entry exists for cache_key
+    '''
+    path_to_entry = join(cache_folder, cache_key + '.pkl')
+    try:
+        with open(path_to_entry, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(path_to_entry)
+    
+    return cached
+
+def store_in_cache(cache_folder, cache_key, obj):
+    '''
+    Store an entry in the parse cache
+    
+    Input
+    -----
+    cache_folder: str or pathlib.PosixPath object, folder of the cache. It 
+        is created if it does not exist
+    
+    cache_key: str (returned from get_cache_key())
+    
+    obj: the object to be cached (must be picklable)
+    '''
+    os.makedirs(cache_folder, exist_ok = True)
+    path_to_entry = join(cache_folder, cache_key + '.pkl')
+    # Write to a temporary file first, so that parallel readers never see 
+    # a partially written entry
+    path_tmp_entry = path_to_entry + '.' + str(os.getpid()) + '.tmp'
+    with open(path_tmp_entry, 'wb') as f:
+        pickle.dump(obj, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(path_tmp_entry, path_to_entry)
+    
+def evict_cache(cache_folder, max_cache_bytes):
+    '''
+    Remove the least recently used entries of the parse cache until its size
+    is not above max_cache_bytes
+    
+    Input
+    -----
+    cache_folder: str or pathlib.PosixPath object, folder of the cache
+    
+    max_cache_bytes: int, max size of the cache in bytes
+    
+    Output
+    ------
+    nr_evicted: int, nr of entries removed
+    '''
+    if not os.path.isdir(cache_folder): return 0
+    entries = []
+    for f in listdir(cache_folder):
+        if f.endswith('.pkl'):
+            stat = os.stat(join(cache_folder, f))
+            entries.append((stat.st_mtime, stat.st_size, f))
+    entries.sort()#least recently used first
+    total_bytes = sum([entry[1] for entry in entries])
+    nr_evicted = 0
+    for mtime, size, f in entries:
+        if total_bytes <= max_cache_bytes: break
+        os.remove(join(cache_folder, f))
+        total_bytes -= size
+        nr_evicted += 1
+        
+    return nr_evicted
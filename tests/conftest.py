@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+def _article(pmid, title):
+    # A minimal PubmedArticle element (as xml str)
+    return ('<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM">'
+            '<PMID Version="1">' + str(pmid) + '</PMID><Article>'
+            '<Journal><Title>Journal</Title><JournalIssue><PubDate>'
+            '<Year>2020</Year></PubDate></JournalIssue></Journal>'
+            '<ArticleTitle>' + title + '</ArticleTitle></Article>'
+            '</MedlineCitation></PubmedArticle>')
+
+def _pubmed_xml(pmids, title_prefix = 'Title of paper ', deleted = ()):
+    articles = [_article(pmid, title_prefix + str(pmid)) for pmid in pmids]
+    if deleted:
+        articles.append('<DeleteCitation>' +
+                        ''.join(['<PMID Version="1">' + str(pmid) + '</PMID>' for pmid in deleted]) +
+                        '</DeleteCitation>')
+    return ('<?xml version="1.0" ?>\n<PubmedArticleSet>\n' +
+            '\n'.join(articles) + '\n</PubmedArticleSet>\n').encode()
+
+@pytest.fixture
+def pubmed_xml():
+    '''
+    Build the bytes of a PubmedArticleSet with the articles of the PMIDs
+    pmids (titled title_prefix + PMID) and a DeleteCitation of the PMIDs
+    deleted
+    '''
+    return _pubmed_xml
+
+@pytest.fixture
+def write_pubmed_xml(tmp_path):
+    '''
+    Write a PubMed .xml file with the articles of the PMIDs pmids in
+    tmp_path
+    '''
+    def write(filename, pmids, title_prefix = 'Title of paper ', deleted = ()):
+        (tmp_path / filename).write_bytes(_pubmed_xml(pmids,
+                                                      title_prefix = title_prefix,
+                                                      deleted = deleted
+                                                      ))
+        return tmp_path / filename
+
+    return write
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class LocalServer():
+    '''
+    HTTP server on 127.0.0.1 (a free port) answering every request with
+    respond(path, params), which returns (status, body bytes). The requests
+    are kept in requests as (time.monotonic(), path, params)
+    '''
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_request(self, body = ''):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                params.update(parse_qsl(body))
+                server.requests.append((time.monotonic(), url.path, params))
+                status, data = server.respond(url.path, params)
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_request()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.handle_request(self.rfile.read(length).decode())
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:' + str(self._httpd.server_address[1]) + '/'
+        self._thread = threading.Thread(target = self._httpd.serve_forever, 
+                                        kwargs = {'poll_interval': 0.05},
+                                        daemon = True)
+        self._thread.start()
+
+    def paths(self):
+        return [path for _, path, _ in self.requests]
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+@pytest.fixture
+def local_server():
+    '''
+    Start LocalServer objects with local_server(respond), shut down at the
+    end of the test
+    '''
+    servers = []
+    def start(respond):
+        servers.append(LocalServer(respond))
+        return servers[-1]
+
+    yield start
+    for server in servers: server.close()
+
+class EutilsStub():
+    '''
+    Canned answers of esearch and efetch. The query matches the PMIDs
+    1..count, which efetch returns in windows (retstart, retmax) of the
+    history server or by id. Set count_of(mindate, maxdate) to give the
+    Count of date ranges (as 'YYYY/MM/DD'), with PMIDs
+    '<mindate without />-<i>'
+    '''
+    def __init__(self, count = 0):
+        self.count = count
+        self.count_of = None
+
+    def respond(self, path, params):
+        if path.endswith('esearch.fcgi'):
+            if self.count_of is None:
+                count = self.count
+                pmids = [str(i) for i in range(1, count + 1)]
+            else:
+                count = self.count_of(params['mindate'], params['maxdate'])
+                pmids = [params['mindate'].replace('/', '') + '-' + str(i) for i in range(1, count + 1)]
+            retstart = int(params.get('retstart', 0))
+            pmids = pmids[retstart:retstart + int(params.get('retmax', 20))]
+            data = ('<eSearchResult><Count>' + str(count) + '</Count>' +
+                    '<RetMax>' + str(len(pmids)) + '</RetMax>'
+                    '<QueryKey>1</QueryKey><WebEnv>webenv</WebEnv><IdList>' +
+                    ''.join(['<Id>' + pmid + '</Id>' for pmid in pmids]) +
+                    '</IdList></eSearchResult>')
+            return 200, data.encode()
+        if path.endswith('efetch.fcgi'):
+            if 'id' in params:
+                pmids = params['id'].split(',')
+            else:
+                retstart = int(params['retstart'])
+                pmids = range(retstart + 1, min(retstart + int(params['retmax']), self.count) + 1)
+            return 200, _pubmed_xml(pmids)
+
+        return 404, b''
+
+@pytest.fixture
+def eutils_server(local_server):
+    '''
+    A local stand-in of the E-utilities (see EutilsStub). Pass
+    eutils_server.url as the base_url of the getdata functions
+    '''
+    stub = EutilsStub()
+    server = local_server(stub.respond)
+    server.stub = stub
+
+    return server
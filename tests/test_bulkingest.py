@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from puboracle.writestoredata import bulkingest
+
+@pytest.fixture
+def baseline_folder(tmp_path, write_pubmed_xml):
+    write_pubmed_xml('pubmed24n0001.xml', range(1, 11))
+    write_pubmed_xml('pubmed24n0002.xml', range(11, 21))
+    write_pubmed_xml('pubmed24n0003.xml', [2, 12], deleted = [5, 15], title_prefix = 'Updated ')
+    
+    return tmp_path
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_updates_and_deletes_are_applied_in_order(baseline_folder, n_jobs):
+    table = bulkingest.ingest_pubmed_files(baseline_folder,
+                                           all_xml_files = ['pubmed24n0003.xml', 'pubmed24n0001.xml', 'pubmed24n0002.xml'],
+                                           keys_to_parse = ['pmid', 'title'],
+                                           n_jobs = n_jobs,
+                                           as_table = True
+                                           )
+    
+    assert sorted(table.index, key = int) == [str(pmid) for pmid in range(1, 21) if pmid not in (5, 15)]
+    assert table.loc['2', 'title'] == 'Updated 2'
+    assert table.loc['12', 'xml_file'] == 'pubmed24n0003.xml'
+    assert table.loc['3', 'title'] == 'Title of paper 3'
+
+def test_query_filters_latest_version(baseline_folder):
+    all_values, xml_file = bulkingest.ingest_pubmed_files(baseline_folder,
+                                                          all_xml_files = ['pubmed24n0001.xml', 'pubmed24n0002.xml', 'pubmed24n0003.xml'],
+                                                          keys_to_parse = ['pmid'],
+                                                          query = {'terms': ['updated'], 'fields': ['title']}
+                                                          )
+    
+    assert sorted(all_values[0]) == ['12', '2']
+    assert xml_file == ['pubmed24n0003.xml'] * 2
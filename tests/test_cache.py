@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from puboracle.writestoredata import readwritefun
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    '''
+    The files parsed with parse_medline_xml()
+    '''
+    parsed = []
+    parse_medline_xml = readwritefun.pp.parse_medline_xml
+    def counting_parse(path_to_file, *args, **kwargs):
+        parsed.append(path_to_file)
+        return parse_medline_xml(path_to_file, *args, **kwargs)
+    monkeypatch.setattr(readwritefun.pp, 'parse_medline_xml', counting_parse)
+    
+    return parsed
+
+def read(folder_path, cache_folder, **kwargs):
+    return readwritefun.read_xml_to_dict(folder_path,
+                                         all_xml_files = ['xml_0.xml', 'xml_1.xml'],
+                                         keys_to_parse = ['pmid', 'title'],
+                                         cache_folder = cache_folder,
+                                         **kwargs
+                                         )
+
+def test_second_read_is_served_from_cache(tmp_path, write_pubmed_xml, parsed_files):
+    write_pubmed_xml('xml_0.xml', range(1, 6))
+    write_pubmed_xml('xml_1.xml', range(6, 11))
+    cache_folder = tmp_path / 'cache'
+    
+    first = read(tmp_path, cache_folder)
+    assert len(parsed_files) == 2
+    second = read(tmp_path, cache_folder)
+    
+    assert second == first
+    assert len(parsed_files) == 2
+    assert first[0][0] == [str(pmid) for pmid in range(1, 11)]
+    # Other keys are cached separately
+    values, _ = readwritefun.read_xml_to_dict(tmp_path,
+                                              all_xml_files = ['xml_0.xml', 'xml_1.xml'],
+                                              keys_to_parse = ['pmid'],
+                                              cache_folder = cache_folder
+                                              )
+    assert values == [first[0][0]]
+    assert len(parsed_files) == 4
+
+def test_modified_file_is_parsed_again(tmp_path, write_pubmed_xml, parsed_files):
+    write_pubmed_xml('xml_0.xml', range(1, 6))
+    write_pubmed_xml('xml_1.xml', range(6, 11))
+    cache_folder = tmp_path / 'cache'
+    read(tmp_path, cache_folder)
+    
+    write_pubmed_xml('xml_1.xml', range(6, 11), title_prefix = 'Corrected ')
+    del parsed_files[:]
+    values, xml_file = read(tmp_path, cache_folder)
+    
+    assert [str(f).split('/')[-1] for f in parsed_files] == ['xml_1.xml']
+    assert values[1][5:] == ['Corrected ' + str(pmid) for pmid in range(6, 11)]
+    assert values[1][:5] == ['Title of paper ' + str(pmid) for pmid in range(1, 6)]
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_folder = tmp_path / 'cache'
+    for i in range(4):
+        readwritefun.store_in_cache(cache_folder, 'entry_' + str(i), b'x' * 1000)
+        # Entry i was last used at time 1000 * i
+        os.utime(cache_folder / ('entry_' + str(i) + '.pkl'), (1000 * i, 1000 * i))
+    entry_size = os.path.getsize(cache_folder / 'entry_0.pkl')
+    # Loading entry 0 makes it the most recently used
+    assert readwritefun.load_from_cache(cache_folder, 'entry_0') == b'x' * 1000
+    
+    nr_evicted = readwritefun.evict_cache(cache_folder, max_cache_bytes = 2 * entry_size)
+    
+    assert nr_evicted == 2
+    assert sorted(os.listdir(cache_folder)) == ['entry_0.pkl', 'entry_3.pkl']
+    assert readwritefun.evict_cache(cache_folder, max_cache_bytes = 2 * entry_size) == 0
+    assert readwritefun.load_from_cache(cache_folder, 'entry_1') is None
+
+def test_read_evicts_over_budget(tmp_path, write_pubmed_xml):
+    write_pubmed_xml('xml_0.xml', range(1, 6))
+    write_pubmed_xml('xml_1.xml', range(6, 11))
+    cache_folder = tmp_path / 'cache'
+    
+    values = read(tmp_path, cache_folder, max_cache_bytes = 0)
+    
+    assert values[0][0] == [str(pmid) for pmid in range(1, 11)]
+    assert os.listdir(cache_folder) == []
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from puboracle.writestoredata import getdata, readwritefun
+
+COMPRESSIONS = [
+    'gzip', 
+    pytest.param('zstd', marks = pytest.mark.skipif(readwritefun.zstandard is None, 
+                                                    reason = 'zstandard is not installed'))
+    ]
+
+def harvest(save_folder, base_url, compression = None):
+    save_folder.mkdir()
+    return getdata.fetch_write_data_concurrent(query = 'connectome',
+                                               mindate = '2020/01/01',
+                                               maxdate = '2020/12/31',
+                                               retmax = 4,
+                                               save_folder = str(save_folder),
+                                               api_key = 'key',
+                                               base_url = base_url,
+                                               compression = compression
+                                               )
+
+def read_back(save_folder):
+    all_xml_files = readwritefun.get_files_in_folder(save_folder, order = True)
+    values, xml_file = readwritefun.read_xml_to_dict(save_folder,
+                                                     all_xml_files = all_xml_files,
+                                                     keys_to_parse = ['pmid', 'title', 'pubdate']
+                                                     )
+    articles = [(readwritefun.get_article_pmid(article), article.findtext('.//ArticleTitle'))
+                for current_xml in all_xml_files
+                for article in readwritefun.iter_pubmed_articles(save_folder / current_xml)]
+    
+    return all_xml_files, values, articles
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_compressed_batches_read_as_plain(tmp_path, eutils_server, compression):
+    eutils_server.stub.count = 10
+    harvest(tmp_path / 'plain', eutils_server.url)
+    files = harvest(tmp_path / compression, eutils_server.url, compression = compression)
+    
+    plain_files, plain_values, plain_articles = read_back(tmp_path / 'plain')
+    all_xml_files, values, articles = read_back(tmp_path / compression)
+    
+    extension = readwritefun.COMPRESSION_EXTENSIONS[compression]
+    assert all_xml_files == [f + extension for f in plain_files] == ['xml_0.xml' + extension, 
+                                                                     'xml_1.xml' + extension, 
+                                                                     'xml_2.xml' + extension]
+    assert [f.split('/')[-1] for f in files] == all_xml_files
+    # The files are compressed on disk
+    with open(files[0], 'rb') as f:
+        assert not f.read().startswith(b'<?xml')
+    assert values == plain_values
+    assert values[0] == [str(pmid) for pmid in range(1, 11)]
+    assert articles == plain_articles
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+import pubmed_parser as pp
+import pytest
+
+from puboracle.writestoredata import readwritefun
+
+DATA_FOLDER = Path(__file__).parent / 'data'
+SAMPLE_XML = 'pubmed_sample.xml'
+KEYS = [key for key in readwritefun.FIELD_EXTRACTORS if key != 'delete']
+
+@pytest.mark.parametrize('year_info_only', [True, False])
+def test_streaming_fields_match_parse_medline_xml(year_info_only):
+    expected = pp.parse_medline_xml(str(DATA_FOLDER / SAMPLE_XML), year_info_only = year_info_only)
+    
+    streamed = [record for record, _ in readwritefun.iter_xml_records(DATA_FOLDER, 
+                                                                      all_xml_files = [SAMPLE_XML],
+                                                                      keys_to_parse = KEYS + ['delete'],
+                                                                      year_info_only = year_info_only
+                                                                      )]
+    
+    assert len(streamed) == len(expected)
+    for record, d in zip(streamed, expected):
+        assert record == {key: d[key] for key in KEYS + ['delete']}
+
+def test_parser_keys_are_supported():
+    expected = pp.parse_medline_xml(str(DATA_FOLDER / SAMPLE_XML))
+    
+    assert set(expected[0]) == set(readwritefun.FIELD_EXTRACTORS)
+
+def test_read_xml_columns_supports_all_keys():
+    columns = readwritefun.read_xml_columns(DATA_FOLDER, SAMPLE_XML, keys_to_parse = ['pmid', 'issue', 'pages', 'references', 'doi'])
+    
+    assert columns == {'pmid': ['31000001', '31000002', '31000003'],
+                       'issue': ['195(2)', '', '12()'],
+                       'pages': ['120-131', '', 'e45'],
+                       'references': ['16201007;18597554', '', ''],
+                       'doi': ['10.1016/j.neuroimage.2019.01.001', '', '10.1089/brain.2020.0003']}
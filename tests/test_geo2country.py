@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+from puboracle.txtprocess import geo2country
+
+def column(locations, name):
+    # Points without a country are None or NaN
+    return [value if pd.notna(value) else None for value in locations[name]]
+
+@pytest.fixture
+def countries():
+    '''
+    Two box countries: Aland (lon 0-10) and Beland (lon 20-30), lat 0-10
+    '''
+    return gpd.GeoDataFrame({'name': ['Aland', 'Beland'],
+                             'iso_a3': ['AAA', 'BBB'],
+                             'continent': ['Europe', 'Asia']},
+                            geometry = [box(0, 0, 10, 10), box(20, 0, 30, 10)])
+
+def test_points_in_boxes_and_missing_points(countries):
+    lat = [5., 5., np.nan, 5., 5., 5.]
+    lon = [5., 25., 5., np.nan, 10.3, 15.]
+    
+    locations = geo2country.reverse_geocode_countries(lat, lon, countries = countries)
+    
+    assert column(locations, 'iso_a3') == ['AAA', 'BBB', None, None, 'AAA', None]
+    assert column(locations, 'continent') == ['Europe', 'Asia', None, None, 'Europe', None]
+    assert np.isnan(locations['lat'][2]) and locations['lon'][4] == 10.3
+
+def test_max_distance_fallback(countries):
+    lat = [5., 5., 5.]
+    lon = [10.3, 19., 15.]
+    country_index = geo2country.build_country_index(countries)
+    
+    exact = geo2country.reverse_geocode_countries(lat, lon, 
+                                                  countries = countries,
+                                                  country_index = country_index,
+                                                  max_distance = None
+                                                  )
+    near = geo2country.reverse_geocode_countries(lat, lon, 
+                                                 countries = countries,
+                                                 country_index = country_index,
+                                                 max_distance = 2.
+                                                 )
+    
+    assert column(exact, 'iso_a3') == [None, None, None]
+    # Within 2 degrees of Aland and Beland, but 5 degrees from both
+    assert column(near, 'iso_a3') == ['AAA', 'BBB', None]
+
+def test_count_by_region(countries):
+    locations = geo2country.reverse_geocode_countries([5., 5., 5., np.nan], [1., 2., 25., 1.], 
+                                                      countries = countries)
+    
+    assert geo2country.count_by_region(locations) == [('AAA', 2), ('BBB', 1)]
+    assert geo2country.count_by_region(locations, by = 'continent', weights = [1, 1, 5, 10]) == [('Asia', 5), ('Europe', 2)]
+    assert geo2country.count_by_region(locations, topN = 1) == [('AAA', 2)]
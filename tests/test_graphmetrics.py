@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+import pytest
+from igraph import Graph
+
+from puboracle.metrics import graphmetrics
+
+def make_graph(directed = False, nr_vertices = 40, nr_edges = 90, seed = 2):
+    rng = random.Random(seed)
+    edges = set()
+    while len(edges) < nr_edges:
+        i, j = rng.sample(range(nr_vertices), 2)
+        if directed is False: i, j = min(i, j), max(i, j)
+        edges.add((i, j))
+    edges = sorted(edges)
+    # Integer weights, so that there are ties of shortest paths
+    net = Graph(n = nr_vertices,
+                edges = edges,
+                directed = directed,
+                edge_attrs = {'weight': [rng.randint(1, 3) for _ in edges]}
+                )
+    net.vs['label'] = ['v' + str(i) for i in range(nr_vertices)]
+
+    return net
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('weights', [None, 'weight'])
+def test_full_sample_betweenness_is_exact(directed, weights):
+    net = make_graph(directed = directed)
+    betweenness = graphmetrics.approximate_betweenness(net,
+                                                       nr_samples = net.vcount(),
+                                                       weights = weights,
+                                                       seed = 0
+                                                       )
+
+    assert np.allclose(betweenness['betweenness'].values, net.betweenness(weights = weights))
+    assert np.allclose(betweenness['se'].values, 0.)
+    assert betweenness.index.tolist() == net.vs['label']
+
+def test_betweenness_in_processes_and_cache(tmp_path):
+    net = make_graph()
+    sequential = graphmetrics.approximate_betweenness(net, nr_samples = 15, seed = 3)
+    parallel = graphmetrics.approximate_betweenness(net,
+                                                    nr_samples = 15,
+                                                    seed = 3,
+                                                    n_jobs = 2,
+                                                    cache_folder = tmp_path
+                                                    )
+    cached = graphmetrics.approximate_betweenness(net,
+                                                  nr_samples = 15,
+                                                  seed = 3,
+                                                  cache_folder = tmp_path
+                                                  )
+
+    assert np.allclose(sequential.values, parallel.values)
+    assert np.allclose(cached.values, parallel.values)
+
+def test_node_metrics_cache(tmp_path, monkeypatch):
+    net = make_graph()
+    metrics = ('degree', 'strength', 'pagerank')
+    node_metrics = graphmetrics.compute_node_metrics(net, metrics = metrics, cache_folder = tmp_path)
+
+    assert np.allclose(node_metrics['degree'].values, net.degree())
+    assert np.allclose(node_metrics['strength'].values, net.strength(weights = 'weight'))
+    # The metrics of the same graph are loaded from the cache
+    def fail(net):
+        raise AssertionError('metric computed again')
+    monkeypatch.setattr(graphmetrics, 'NODE_METRICS', {metric: fail for metric in metrics})
+    cached = graphmetrics.compute_node_metrics(net.copy(), metrics = metrics, cache_folder = tmp_path)
+
+    assert np.allclose(cached.values, node_metrics.values)
+    # A different graph is not
+    other = net.copy()
+    other.es['weight'] = [w + 1 for w in other.es['weight']]
+    with pytest.raises(AssertionError):
+        graphmetrics.compute_node_metrics(other, metrics = metrics, cache_folder = tmp_path)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from puboracle.writestoredata import getdata, readwritefun
+
+def fake_submit_query(count):
+    def submit_query(query, **kwargs):
+        return {'Count': str(count), 'WebEnv': 'webenv', 'QueryKey': '1'}
+    
+    return submit_query
+
+@pytest.fixture
+def fake_fetch_by_query(pubmed_xml):
+    def make(fetched, fail_retstarts = ()):
+        def fetch_by_query(WebEnv = None, QueryKey = None, retstart = 0, retmax = 2, **kwargs):
+            fetched.append(retstart)
+            if retstart in fail_retstarts: return None
+            return pubmed_xml(range(retstart + 1, retstart + retmax + 1))
+        
+        return fetch_by_query
+    
+    return make
+
+def harvest(tmp_path, **kwargs):
+    return getdata.fetch_write_data(query = 'connectome',
+                                    mindate = '2020/01/01',
+                                    maxdate = '2020/12/31',
+                                    retmax = 2,
+                                    save_folder = str(tmp_path),
+                                    single_search = True,
+                                    **kwargs
+                                    )
+
+def test_failed_window_is_recorded_and_resumed(tmp_path, monkeypatch, fake_fetch_by_query):
+    fetched = []
+    monkeypatch.setattr(getdata, 'submit_query', fake_submit_query(6))
+    monkeypatch.setattr(getdata, 'fetch_by_query', fake_fetch_by_query(fetched, fail_retstarts = (2,)))
+    
+    failed = harvest(tmp_path)
+    
+    assert failed == [1]
+    assert fetched == [0, 2, 4]
+    manifest = readwritefun.read_manifest(tmp_path)
+    assert manifest['failed'] == [1]
+    assert sorted(manifest['windows']) == ['0', '2']
+    
+    fetched.clear()
+    monkeypatch.setattr(getdata, 'fetch_by_query', fake_fetch_by_query(fetched))
+    failed = harvest(tmp_path, resume = True)
+    
+    assert failed == []
+    assert fetched == [2]
+    manifest = readwritefun.read_manifest(tmp_path)
+    assert manifest['failed'] == []
+    assert sorted(manifest['windows']) == ['0', '1', '2']
+    assert sorted(readwritefun.get_files_in_folder(tmp_path)) == ['xml_0.xml', 'xml_1.xml', 'xml_2.xml']
+
+def test_resume_fetches_corrupt_windows_again(tmp_path, monkeypatch, fake_fetch_by_query):
+    fetched = []
+    monkeypatch.setattr(getdata, 'submit_query', fake_submit_query(6))
+    monkeypatch.setattr(getdata, 'fetch_by_query', fake_fetch_by_query(fetched))
+    assert harvest(tmp_path) == []
+    (tmp_path / 'xml_1.xml').write_bytes(b'<PubmedArticleSet>')
+    (tmp_path / 'xml_2.xml').unlink()
+    
+    fetched.clear()
+    assert harvest(tmp_path, resume = True) == []
+    
+    assert fetched == [2, 4]
+    pmids = [readwritefun.get_article_pmid(article) 
+             for article in readwritefun.iter_pubmed_articles(tmp_path / 'xml_1.xml')]
+    assert pmids == ['3', '4']
+
+def test_concurrent_resume_fetches_pending_windows(tmp_path, monkeypatch, fake_fetch_by_query):
+    fetched = []
+    def fetch_window(WebEnv = None, QueryKey = None, retstart = 0, retmax = 2, **kwargs):
+        return fake_fetch_by_query(fetched)(retstart = retstart, retmax = retmax)
+    monkeypatch.setattr(getdata, 'search_history', 
+                        lambda query, **kwargs: {'Count': 5, 'WebEnv': 'webenv', 'QueryKey': '1', 'IdList': []})
+    monkeypatch.setattr(getdata, 'fetch_window', fetch_window)
+    params = {'query': 'connectome', 'mindate': '2020/01/01', 'maxdate': '2020/12/31',
+              'retmax': 2, 'save_folder': str(tmp_path), 'max_workers': 2}
+    getdata.fetch_write_data_concurrent(**params)
+    (tmp_path / 'xml_0.xml').unlink()
+    
+    fetched.clear()
+    files = getdata.fetch_write_data_concurrent(resume = True, **params)
+    
+    assert fetched == [0]
+    assert [f.split('/')[-1] for f in files] == ['xml_0.xml', 'xml_1.xml', 'xml_2.xml']
+
+def test_concurrent_harvest_from_local_eutils(tmp_path, eutils_server):
+    eutils_server.stub.count = 23
+    
+    files = getdata.fetch_write_data_concurrent(query = 'connectome',
+                                                mindate = '2020/01/01',
+                                                maxdate = '2020/12/31',
+                                                retmax = 5,
+                                                save_folder = str(tmp_path),
+                                                api_key = 'key',#10 requests/sec
+                                                max_workers = 4,
+                                                base_url = eutils_server.url
+                                                )
+    
+    assert [f.split('/')[-1] for f in files] == ['xml_' + str(batch) + '.xml' for batch in range(5)]
+    pmids = [readwritefun.get_article_pmid(article) 
+             for f in files for article in readwritefun.iter_pubmed_articles(f)]
+    assert pmids == [str(pmid) for pmid in range(1, 24)]
+    assert eutils_server.paths() == ['/esearch.fcgi'] + ['/efetch.fcgi'] * 5
+    assert sorted(int(params['retstart']) for _, path, params in eutils_server.requests[1:]) == [0, 5, 10, 15, 20]
+    assert all(params['api_key'] == 'key' for _, _, params in eutils_server.requests)
+    manifest = readwritefun.read_manifest(tmp_path)
+    assert sorted(manifest['windows'], key = int) == ['0', '1', '2', '3', '4']
+    # The 4 workers share one TokenBucket of 10 requests/sec
+    times = [t for t, _, _ in eutils_server.requests]
+    assert times[-1] - times[0] >= 0.9 * (len(times) - 1) / 10.
+    assert min([later - earlier for earlier, later in zip(times, times[1:])]) >= 0.05
+
+def test_eutils_request_retries_busy_server(eutils_server):
+    eutils_server.stub.count = 3
+    statuses = [503, 429]
+    def respond(path, params):
+        if statuses: return statuses.pop(0), b''
+        return eutils_server.stub.respond(path, params)
+    eutils_server.respond = respond
+    
+    data = getdata.eutils_request('esearch', 
+                                  {'db': 'pubmed', 'term': 'connectome'},
+                                  base_url = eutils_server.url,
+                                  backoff_sec = 0.01
+                                  )
+    
+    assert b'<Count>3</Count>' in data
+    assert eutils_server.paths() == ['/esearch.fcgi'] * 3
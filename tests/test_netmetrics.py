@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+
+from puboracle.metrics import netmetrics
+
+def make_papers(nr_papers = 300, nr_items = 30, seed = 1):
+    rng = random.Random(seed)
+    items = ['affil_' + str(i) for i in range(nr_items)]
+    list_coitems = [rng.sample(items, rng.randint(0, 5)) for _ in range(nr_papers)]
+    # Items repeated in a paper, empty items and excluded items
+    list_coitems[0] = ['affil_1', 'affil_2', 'affil_1', '', ' ']
+    list_coitems[1] = ['affil_3', 'excluded', 'affil_4']
+
+    return list_coitems
+
+def cooccurrence_of(labels, list_coitems, exclude = []):
+    B = netmetrics.construct_incidence_matrix(labels,
+                                              list_coitems = list_coitems,
+                                              exclude = exclude
+                                              )
+    return netmetrics.cooccurrence_matrix(B)
+
+def triu_nnz(C):
+    C = C.tocoo()
+    return int(np.sum(C.row < C.col))
+
+def test_incremental_network_matches_cooccurrence_matrix():
+    list_coitems = make_papers()
+    inet = netmetrics.IncrementalNetwork(exclude = ['excluded'])
+    for start in range(0, len(list_coitems), 70):#in batches
+        inet.add_papers(list_coitems[start:start + 70])
+        net = inet.get_graph()
+    C = cooccurrence_of(inet.labels, list_coitems, exclude = ['excluded'])
+
+    assert 'excluded' not in inet.labels
+    assert inet.nr_papers == len(list_coitems)
+    assert (inet.to_adjacency() != C).nnz == 0
+    # The igraph object updated in batches has the same edges and weights
+    assert net.vcount() == len(inet.labels) and net.vs['label'] == inet.labels
+    assert net.ecount() == triu_nnz(C)
+    for edge in net.es:
+        assert edge['weight'] == C[edge.source, edge.target]
+
+def test_incremental_network_save_load(tmp_path):
+    list_coitems = make_papers()
+    inet = netmetrics.IncrementalNetwork(exclude = ['excluded'])
+    inet.add_papers(list_coitems[:150])
+    inet.save(tmp_path / 'net.pkl')
+    inet = netmetrics.IncrementalNetwork.load(tmp_path / 'net.pkl')
+    inet.add_papers(list_coitems[150:])
+    C = cooccurrence_of(inet.labels, list_coitems, exclude = ['excluded'])
+
+    assert (inet.to_adjacency() != C).nnz == 0
+    assert inet.get_graph().ecount() == triu_nnz(C)
+
+def test_edges_array_matches_edges_list():
+    list_coitems = make_papers()
+    labels = sorted(set([cci for coitems in list_coitems for cci in coitems if cci.strip()]))
+    edges_list = netmetrics.construct_edges_list(labels, list_coitems = list_coitems)
+    edges_array = netmetrics.construct_edges_array(labels, list_coitems = list_coitems)
+
+    assert edges_array.tolist() == [list(edge) for edge in edges_list]
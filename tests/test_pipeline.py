@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import itertools
+import random
+import threading
+import time
+
+import pytest
+
+from puboracle.pipeline import pipefun
+
+def sleep_randomly(seed):
+    rng = random.Random(seed)
+    def stage(x):
+        time.sleep(rng.uniform(0, 0.005))
+        return x
+    
+    return stage
+
+def test_order_is_preserved():
+    stages = [sleep_randomly(0), lambda x: x * 10, sleep_randomly(1), lambda x: x + 1]
+    
+    results = list(pipefun.run_pipeline(iter(range(50)), stages = stages, queue_size = 1))
+    
+    assert results == [x * 10 + 1 for x in range(50)]
+
+def test_stage_exception_is_raised():
+    def fail_on_7(x):
+        if x == 7: raise ValueError('bad item 7')
+        return x
+    results = []
+    
+    with pytest.raises(ValueError, match = 'bad item 7'):
+        for result in pipefun.run_pipeline(range(100), stages = [lambda x: x, fail_on_7, lambda x: x]):
+            results.append(result)
+    
+    assert results == list(range(7))
+
+def test_source_exception_is_raised():
+    def source():
+        yield 1
+        raise OSError('connection lost')
+    
+    with pytest.raises(OSError):
+        list(pipefun.run_pipeline(source(), stages = [lambda x: x]))
+
+def test_closing_early_stops_all_threads():
+    nr_threads = threading.active_count()
+    # An endless source and stages that would block on the full queues
+    pipeline = pipefun.run_pipeline(itertools.count(), stages = [lambda x: x, lambda x: x], queue_size = 1)
+    assert [next(pipeline) for _ in range(3)] == [0, 1, 2]
+    
+    closer = threading.Thread(target = pipeline.close, daemon = True)
+    closer.start()
+    closer.join(timeout = 5)
+    
+    assert not closer.is_alive()
+    assert threading.active_count() == nr_threads
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import gzip
+from pathlib import Path
+import random
+import shutil
+
+import pytest
+
+from puboracle.writestoredata import pmidindex, readwritefun
+
+DATA_FOLDER = Path(__file__).parent / 'data'
+
+@pytest.fixture(params = ['.xml', '.xml.gz'])
+def xml_folder(request, tmp_path, write_pubmed_xml):
+    '''
+    The sample file and a file with more articles (PMID 31000002 is in 
+    both files), plain or gzip compressed
+    '''
+    write_pubmed_xml('xml_1.xml', [31000002] + list(range(1, 40)), title_prefix = 'Later ')
+    shutil.copy(DATA_FOLDER / 'pubmed_sample.xml', tmp_path / 'xml_0.xml')
+    if request.param == '.xml.gz':
+        for filename in ('xml_0.xml', 'xml_1.xml'):
+            data = (tmp_path / filename).read_bytes()
+            (tmp_path / filename).unlink()
+            with gzip.open(str(tmp_path / (filename + '.gz')), 'wb') as f:
+                f.write(data)
+    
+    return tmp_path, ['xml_0' + request.param, 'xml_1' + request.param]
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 4194304])
+def test_offsets_of_articles_spanning_chunks(xml_folder, chunk_size):
+    folder, all_xml_files = xml_folder
+    for current_xml in all_xml_files:
+        offsets = list(pmidindex.scan_article_offsets(folder / current_xml, chunk_size = chunk_size))
+        with readwritefun.open_xml_file(folder / current_xml) as f:
+            data = f.read()
+        pmids = [readwritefun.get_article_pmid(article) 
+                 for article in readwritefun.iter_pubmed_articles(folder / current_xml)]
+        
+        assert [str(pmid) for pmid, _, _ in offsets] == pmids
+        for pmid, offset, length in offsets:
+            element = data[offset:offset + length]
+            assert element.startswith(b'<PubmedArticle>') and element.endswith(b'</PubmedArticle>')
+            assert ('<PMID Version="1">' + str(pmid) + '</PMID>').encode() in element
+
+def test_get_records_matches_read_xml_to_dict(xml_folder, tmp_path):
+    folder, all_xml_files = xml_folder
+    path_to_index = tmp_path / 'pmid_index.sqlite'
+    
+    nr_indexed = pmidindex.build_pmid_index(folder, 
+                                            all_xml_files = all_xml_files,
+                                            path_to_index = path_to_index,
+                                            chunk_size = 7
+                                            )
+    values, xml_file = readwritefun.read_xml_to_dict(folder, 
+                                                     all_xml_files = all_xml_files,
+                                                     keys_to_parse = ['pmid', 'title']
+                                                     )
+    # The last file is kept for PMIDs in more than one file
+    expected = {pmid: {'pmid': pmid, 'title': title} for pmid, title in zip(*values)}
+    pmids = list(expected) + ['99999999']
+    random.Random(0).shuffle(pmids)
+    records = pmidindex.get_records(pmids,
+                                    path_to_index = path_to_index,
+                                    folder_to_xmls = folder,
+                                    keys_to_parse = ['pmid', 'title']
+                                    )
+    
+    assert nr_indexed == len(expected) == 42
+    assert records == expected
+    assert records['31000002']['title'] == 'Later 31000002'
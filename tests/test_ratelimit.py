@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from puboracle.aux.ratelimit import TokenBucket
+from puboracle.writestoredata import getdata
+
+def test_shared_bucket_limits_the_rate_of_all_workers():
+    limiter = TokenBucket(20)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers = 4) as executor:
+        list(executor.map(lambda i: limiter.acquire(), range(21)))
+    elapsed = time.monotonic() - start
+    
+    # The first token is available at once, the next 20 at 1/rate intervals
+    assert 0.9 <= elapsed < 2.
+
+def test_rate_limiter_of_eutils():
+    assert getdata.get_rate_limiter().rate == 3
+    assert getdata.get_rate_limiter(api_key = 'key').rate == 10
+    assert isinstance(getdata.get_rate_limiter(), TokenBucket)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from puboracle.aux import auxfun
+from puboracle.writestoredata import readwritefun
+
+def fail_on_negative(x):
+    if x < 0: raise ValueError('negative')
+    
+    return x * 2
+
+def test_map_in_processes_keeps_order():
+    assert list(auxfun.map_in_processes(fail_on_negative, range(20), n_jobs = 2)) == list(range(0, 40, 2))
+    assert list(auxfun.map_in_processes(fail_on_negative, range(20))) == list(range(0, 40, 2))
+
+def test_map_in_processes_raises_worker_errors():
+    with pytest.raises(ValueError):
+        list(auxfun.map_in_processes(fail_on_negative, [1, -1, 2], n_jobs = 2))
+
+def test_read_xml_to_dict_parallel_matches_sequential(tmp_path, write_pubmed_xml):
+    for batch in range(4):
+        write_pubmed_xml('xml_' + str(batch) + '.xml', range(batch * 10, batch * 10 + 10))
+    all_xml_files = readwritefun.get_files_in_folder(tmp_path, order = True)
+    
+    sequential = readwritefun.read_xml_to_dict(tmp_path, 
+                                               all_xml_files = all_xml_files, 
+                                               keys_to_parse = ['pmid', 'title']
+                                               )
+    parallel = readwritefun.read_xml_to_dict(tmp_path, 
+                                             all_xml_files = all_xml_files, 
+                                             keys_to_parse = ['pmid', 'title'],
+                                             n_jobs = 2
+                                             )
+    
+    assert parallel == sequential
+    assert sequential[0][0] == [str(pmid) for pmid in range(40)]
+
+def test_read_xml_to_table_parallel_matches_sequential(tmp_path, write_pubmed_xml):
+    for batch in range(3):
+        write_pubmed_xml('xml_' + str(batch) + '.xml', range(batch * 10 + 1, batch * 10 + 11))
+    all_xml_files = readwritefun.get_files_in_folder(tmp_path, order = True)
+    
+    sequential = readwritefun.read_xml_to_table(tmp_path, 
+                                                all_xml_files = all_xml_files, 
+                                                keys_to_parse = ['title']
+                                                )
+    parallel = readwritefun.read_xml_to_table(tmp_path, 
+                                              all_xml_files = all_xml_files, 
+                                              keys_to_parse = ['title'],
+                                              n_jobs = 2
+                                              )
+    
+    assert parallel.equals(sequential)
+    assert len(sequential) == 30
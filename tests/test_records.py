@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from pathlib import Path
+import pickle
+import random
+import tracemalloc
+
+from puboracle.aux import records
+from puboracle.writestoredata import readwritefun
+
+DATA_FOLDER = Path(__file__).parent / 'data'
+
+def test_all_extracted_fields_are_publication_fields():
+    assert set(readwritefun.FIELD_EXTRACTORS) <= set(records.PUBLICATION_FIELDS)
+
+def test_streamed_records_as_publications():
+    keys = ['pmid', 'journal', 'issue', 'pages', 'references']
+    dicts = [record for record, _ in readwritefun.iter_xml_records(DATA_FOLDER, 
+                                                                   all_xml_files = ['pubmed_sample.xml'],
+                                                                   keys_to_parse = keys
+                                                                   )]
+    pubs = [record for record, _ in readwritefun.iter_xml_records(DATA_FOLDER, 
+                                                                  all_xml_files = ['pubmed_sample.xml'],
+                                                                  keys_to_parse = keys,
+                                                                  as_records = True
+                                                                  )]
+    
+    assert [pub.as_dict(keys) for pub in pubs] == dicts
+    assert pubs[0].pages == '120-131'
+    assert pubs[0].xml_file == 'pubmed_sample.xml'
+
+def test_publication_pickle_round_trip():
+    pub = records.Publication(xml_file = 'xml_0.xml', 
+                              pmid = '1', 
+                              journal = 'NeuroImage',
+                              affiliations = 'Dept A, Uni B;Dept C, Uni D',
+                              references = '2;3'
+                              )
+    
+    restored = pickle.loads(pickle.dumps(pub))
+    
+    assert restored == pub
+    assert restored['references'] == '2;3'
+    assert restored.get('title', '') == ''
+
+def test_read_xml_to_dict_as_records_with_all_parser_keys():
+    keys = ['pmid', 'issue', 'pages', 'references']
+    
+    pubs = readwritefun.read_xml_to_dict(DATA_FOLDER, 
+                                         all_xml_files = ['pubmed_sample.xml'],
+                                         keys_to_parse = keys,
+                                         as_records = True
+                                         )
+    
+    assert [pub.pmid for pub in pubs] == ['31000001', '31000002', '31000003']
+    assert [pub.issue for pub in pubs] == ['195(2)', '', '12()']
+
+INSTITUTIONS = ['Dept of Physics, University ' + str(i) + ', City ' + str(i) + ', Country' for i in range(50)]
+
+def make_fields(nr_pubs = 2000, seed = 0):
+    '''
+    Fields of publications as returned from parse_medline_xml() (a dict 
+    with all the keys): every str is a new object, although the 
+    institutions and journals repeat across publications
+    '''
+    rng = random.Random(seed)
+    for i in range(nr_pubs):
+        fields = {key: '' for key in records.PUBLICATION_FIELDS}
+        fields.update(pmid = str(31000000 + i),
+                      journal = ''.join(['Journal ', str(i % 20)]),
+                      pubdate = ''.join(['20', str(10 + i % 10)]),
+                      affiliations = ';'.join([''.join(list(institution)) 
+                                               for institution in rng.sample(INSTITUTIONS, 4)])
+                      )
+        yield fields
+
+def traced_memory(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return built, size
+
+def test_affiliations_are_interned_parts():
+    pubs = [records.Publication(**fields) for fields in make_fields(nr_pubs = 200)]
+    parts = {}
+    for pub, fields in zip(pubs, make_fields(nr_pubs = 200)):
+        assert pub.affiliations == fields['affiliations']
+        assert pub['affiliations'] == fields['affiliations']
+        for part in pub._affiliations:
+            assert parts.setdefault(part, part) is part
+    
+    assert len(parts) <= len(INSTITUTIONS)
+    assert records.Publication(affiliations = '').affiliations == ''
+    assert records.Publication().affiliations is None
+
+def test_publications_use_less_memory_than_dicts():
+    dicts, dicts_size = traced_memory(lambda: list(make_fields()))
+    pubs, pubs_size = traced_memory(lambda: [records.Publication(**fields) for fields in make_fields()])
+    
+    assert [pub.as_dict(list(fields)) for pub, fields in zip(pubs, dicts)] == dicts
+    print('\nMemory of dict records...:', dicts_size, 'Publication records...:', pubs_size)
+    # About 3.5x less memory (no dict per record and one str per institution)
+    assert pubs_size * 3 < dicts_size
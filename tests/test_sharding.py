@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+from puboracle.writestoredata import getdata, readwritefun
+
+def daily_counts(per_day, crowded = {}):
+    '''
+    count_of() of the local E-utilities stub for a query with per_day 
+    records every day and crowded[date] records on the dates of crowded
+    '''
+    def count_of(mindate, maxdate):
+        lo = getdata.parse_query_date(mindate)
+        hi = getdata.parse_query_date(maxdate, end = True)
+        days = [lo + datetime.timedelta(days = i) for i in range((hi - lo).days + 1)]
+        return sum([crowded.get(day.strftime('%Y/%m/%d'), per_day) for day in days])
+    
+    return count_of
+
+def assert_covers(shards, mindate, maxdate):
+    dates = [(getdata.parse_query_date(lo), getdata.parse_query_date(hi)) for lo, hi, _ in shards]
+    assert dates[0][0] == getdata.parse_query_date(mindate)
+    assert dates[-1][1] == getdata.parse_query_date(maxdate, end = True)
+    for (lo, hi), (next_lo, _) in zip(dates, dates[1:]):
+        assert lo <= hi
+        # No gaps and no overlaps
+        assert next_lo == hi + datetime.timedelta(days = 1)
+
+def test_shards_are_split_below_the_cap(eutils_server):
+    eutils_server.stub.count_of = daily_counts(100)
+    
+    shards = getdata.shard_date_range('connectome',
+                                      mindate = '2020',
+                                      maxdate = '2020',
+                                      cap = 9999,
+                                      api_key = 'key',
+                                      base_url = eutils_server.url
+                                      )
+    
+    assert_covers(shards, '2020', '2020')
+    assert all([count <= 9999 for _, _, count in shards])
+    assert sum([count for _, _, count in shards]) == 36600
+    # 366 days: the halves (18300) are above the cap, the quarters are not
+    assert len(shards) == 4
+    assert len(eutils_server.requests) == 1 + 2 + 4
+    assert all(['usehistory' not in params for _, _, params in eutils_server.requests])
+
+def test_single_day_above_the_cap_is_kept(eutils_server, capsys):
+    eutils_server.stub.count_of = daily_counts(3, crowded = {'2020/01/15': 30})
+    
+    shards = getdata.shard_date_range('connectome',
+                                      mindate = '2020/01/01',
+                                      maxdate = '2020/01/31',
+                                      cap = 20,
+                                      api_key = 'key',
+                                      base_url = eutils_server.url
+                                      )
+    
+    assert_covers(shards, '2020/01/01', '2020/01/31')
+    assert ('2020/01/15', '2020/01/15', 30) in shards
+    assert all([count <= 20 for lo, hi, count in shards if lo != '2020/01/15'])
+    assert sum([count for _, _, count in shards]) == 30 * 3 + 30
+    assert 'WARNING: Count...: 30 above cap' in capsys.readouterr().out
+
+def test_sharded_harvest_fetches_every_shard(tmp_path, eutils_server):
+    eutils_server.stub.count_of = daily_counts(3, crowded = {'2020/01/15': 30})
+    
+    files = getdata.fetch_write_data_sharded(query = 'connectome',
+                                             mindate = '2020/01/01',
+                                             maxdate = '2020/01/31',
+                                             retmax = 25,
+                                             save_folder = str(tmp_path),
+                                             cap = 20,
+                                             api_key = 'key',
+                                             base_url = eutils_server.url
+                                             )
+    
+    pmids = [readwritefun.get_article_pmid(article) 
+             for f in files for article in readwritefun.iter_pubmed_articles(f)]
+    # Only the first cap PMIDs of the crowded day can be retrieved
+    assert len(pmids) == len(set(pmids)) == 30 * 3 + 20
+    assert '20200115-20' in pmids and '20200115-21' not in pmids
+    assert [f.split('/')[-1] for f in files] == ['xml_0.xml', 'xml_1.xml', 'xml_2.xml', 'xml_3.xml', 'xml_4.xml']
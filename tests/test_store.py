@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from puboracle.writestoredata import readwritefun
+
+def get_store_pmids(folder_path):
+    store_pmids = {}
+    for filename in readwritefun.get_files_in_folder(folder_path):
+        for article in readwritefun.iter_pubmed_articles(folder_path / filename):
+            store_pmids.setdefault(readwritefun.get_article_pmid(article), []).append(filename)
+            
+    return store_pmids
+
+def test_merge_builds_missing_index(tmp_path, write_pubmed_xml):
+    write_pubmed_xml('xml_0.xml', range(1, 10))
+    write_pubmed_xml('sync_0.xml', range(5, 15))
+    
+    nr_new, nr_updated = readwritefun.merge_into_store(tmp_path, ['sync_0.xml'])
+    
+    assert (nr_new, nr_updated) == (5, 5)
+    store_pmids = get_store_pmids(tmp_path)
+    assert all([len(files) == 1 for files in store_pmids.values()])
+    assert sorted(store_pmids, key = int) == [str(pmid) for pmid in range(1, 15)]
+    assert store_pmids['3'] == ['xml_0.xml']
+    assert store_pmids['7'] == ['sync_0.xml']
+    with open(tmp_path / 'pmid_index.json') as f:
+        assert json.load(f) == {pmid: files[0] for pmid, files in store_pmids.items()}
+
+def test_merge_supersedes_and_deletes_empty_files(tmp_path, write_pubmed_xml):
+    write_pubmed_xml('xml_0.xml', [1, 2])
+    readwritefun.merge_into_store(tmp_path, ['xml_0.xml'])
+    write_pubmed_xml('sync_0.xml', [1, 2, 3], title_prefix = 'Updated ')
+    
+    nr_new, nr_updated = readwritefun.merge_into_store(tmp_path, ['sync_0.xml'])
+    
+    assert (nr_new, nr_updated) == (1, 2)
+    assert not (tmp_path / 'xml_0.xml').exists()
+    articles = list(readwritefun.iter_pubmed_articles(tmp_path / 'sync_0.xml'))
+    assert [article.findtext('MedlineCitation/Article/ArticleTitle') for article in articles] == ['Updated 1', 'Updated 2', 'Updated 3']
+
+def test_merge_counts_pmid_in_several_new_files_once(tmp_path, write_pubmed_xml):
+    write_pubmed_xml('xml_0.xml', [1])
+    readwritefun.merge_into_store(tmp_path, ['xml_0.xml'])
+    write_pubmed_xml('sync_0.xml', [1, 2, 3])
+    write_pubmed_xml('sync_1.xml', [2, 3, 4])
+    
+    nr_new, nr_updated = readwritefun.merge_into_store(tmp_path, ['sync_0.xml', 'sync_1.xml'])
+    
+    assert (nr_new, nr_updated) == (3, 1)
+    store_pmids = get_store_pmids(tmp_path)
+    assert store_pmids == {'1': ['sync_0.xml'], '2': ['sync_1.xml'], '3': ['sync_1.xml'], '4': ['sync_1.xml']}
+
+def test_merge_rewrites_compressed_files_without_xml_temporary_files(tmp_path, pubmed_xml, monkeypatch):
+    readwritefun.write_xml_data(pubmed_xml([1, 2, 3]), tmp_path / 'xml_0.xml.gz')
+    readwritefun.write_xml_data(pubmed_xml([2, 4]), tmp_path / 'sync_0.xml')
+    # A merge interrupted before the temporary file replaces the old file
+    def interrupt(src, dst):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(readwritefun.os, 'replace', interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            readwritefun.merge_into_store(tmp_path, ['sync_0.xml'])
+    
+    assert sorted(readwritefun.get_files_in_folder(tmp_path)) == ['sync_0.xml', 'xml_0.xml.gz']
+    
+    nr_new, nr_updated = readwritefun.merge_into_store(tmp_path, ['sync_0.xml'])
+    
+    assert (nr_new, nr_updated) == (1, 1)
+    assert sorted(readwritefun.get_files_in_folder(tmp_path)) == ['sync_0.xml', 'xml_0.xml.gz']
+    with open(tmp_path / 'xml_0.xml.gz', 'rb') as f:
+        assert f.read(2) == b'\x1f\x8b'#still gzip compressed
+    assert get_store_pmids(tmp_path) == {'1': ['xml_0.xml.gz'], '2': ['sync_0.xml'], 
+                                         '3': ['xml_0.xml.gz'], '4': ['sync_0.xml']}
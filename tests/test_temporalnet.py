@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+
+from puboracle.metrics import netmetrics
+
+def make_papers(nr_papers = 600, nr_items = 40, seed = 0):
+    rng = random.Random(seed)
+    items = ['affil_' + str(i) for i in range(nr_items)]
+    list_coitems = [rng.sample(items, rng.randint(0, 4)) for _ in range(nr_papers)]
+    dates = ['{}-{:02d}-01'.format(rng.choice([2019, 2020]), rng.randint(1, 12)) for _ in range(nr_papers)]
+    dates[:5] = ['2020'] * 5#no month, not included
+    
+    return items, list_coitems, dates
+
+def test_month_index():
+    months = netmetrics.get_month_index(['2020-03-15', '2020/12', '2020', None])
+    
+    assert months.tolist() == [2020 * 12 + 2, 2020 * 12 + 11, -1, -1]
+
+def test_tumbling_windows_align_to_window_months():
+    months = netmetrics.get_month_index(['2019-02-01', '2019-11-01'])
+    
+    windows = netmetrics.get_time_windows(months, window_months = 3)
+    
+    assert [(netmetrics._month_to_str(start), complete) for start, end, complete in windows] == [
+        ('2019-01', True), ('2019-04', True), ('2019-07', True), ('2019-10', True)]
+
+def test_sliding_windows_lie_inside_the_data_range():
+    months = netmetrics.get_month_index(['2019-01-01', '2020-12-01'])
+    
+    windows = netmetrics.get_time_windows(months, window_months = 6, step_months = 3)
+    partial = netmetrics.get_time_windows(months, window_months = 6, step_months = 3, partial = True)
+    
+    assert all([end - start == 6 and complete for start, end, complete in windows])
+    assert netmetrics._month_to_str(windows[0][0]) == '2019-01'
+    assert netmetrics._month_to_str(windows[-1][1] - 1) == '2020-12'
+    assert len(windows) == 7
+    assert len(partial) == 9
+    assert [complete for _, _, complete in partial] == [False] + [True] * 7 + [False]
+
+def test_tumbling_slices_sum_to_the_full_network():
+    items, list_coitems, dates = make_papers()
+    
+    slices = netmetrics.construct_temporal_networks(items, 
+                                                    list_coitems = list_coitems,
+                                                    dates = dates,
+                                                    window_months = 3
+                                                    )
+    
+    assert len(slices) == 8
+    assert sum([s['nr_papers'] for s in slices]) == len(list_coitems) - 5
+    B = netmetrics.construct_incidence_matrix(items, list_coitems = list_coitems[5:])
+    full = netmetrics.cooccurrence_matrix(B)
+    assert (sum([s['adjacency'] for s in slices]) != full).nnz == 0
+    assert all([s['adjacency'].shape == (len(items), len(items)) for s in slices])
+
+def test_temporal_metrics_parallel_match_sequential():
+    items, list_coitems, dates = make_papers()
+    slices = netmetrics.construct_temporal_networks(items, 
+                                                    list_coitems = list_coitems,
+                                                    dates = dates,
+                                                    window_months = 6,
+                                                    step_months = 3
+                                                    )
+    
+    sequential = netmetrics.compute_temporal_metrics(slices, labels = items)
+    parallel = netmetrics.compute_temporal_metrics(slices, labels = items, n_jobs = 2)
+    
+    for metric in sequential:
+        assert sequential[metric].equals(parallel[metric])
+        assert list(sequential[metric].columns) == [s['start'] for s in slices]
+    strength = np.asarray(slices[0]['adjacency'].sum(axis = 1)).ravel()
+    assert np.allclose(sequential['strength'].iloc[:, 0].values, strength)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import random
+from urllib.error import HTTPError, URLError
+
+from geopy.exc import GeocoderTimedOut
+import numpy as np
+import pycountry
+import pytest
+
+from puboracle.txtprocess import txt2geo
+
+LOCATIONS = {' Germany': txt2geo.CachedLocation(51., 10.)}
+
+class FlakyNominatim():
+    '''
+    Nominatim that times out the first time ' Germany' is geocoded
+    '''
+    calls = []
+
+    def __init__(self, user_agent = None, timeout = None):
+        pass
+
+    def geocode(self, geophrase):
+        FlakyNominatim.calls.append(geophrase)
+        if geophrase == ' Germany' and FlakyNominatim.calls.count(geophrase) == 1:
+            raise GeocoderTimedOut('timed out')
+        return LOCATIONS.get(geophrase)
+
+def test_transient_error_is_retried_and_not_cached(monkeypatch, tmp_path):
+    FlakyNominatim.calls = []
+    monkeypatch.setattr(txt2geo, 'Nominatim', FlakyNominatim)
+    cache_path = tmp_path / 'geocode.sqlite'
+    lat, lon, txt = txt2geo.get_lat_lon_from_text(['Lab A, Germany', 'Lab B, Germany'],
+                                                  min_delay_seconds = None,
+                                                  cache_path = cache_path
+                                                  )
+    # The time out of the first string is not reused for the second one
+    assert lat[1] == 51. and lon[1] == 10.
+    assert txt == [' Germany']
+    con = txt2geo.open_geocode_cache(cache_path)
+    hit, location = txt2geo.lookup_geocode_cache(con, txt2geo.normalize_geophrase('Lab A'))
+    assert hit is True and location is None#a real negative answer is cached
+    hit, location = txt2geo.lookup_geocode_cache(con, txt2geo.normalize_geophrase(' Germany'))
+    assert hit is True and location == (51., 10.)
+    con.close()
+
+def test_failures_are_bounded(monkeypatch):
+    calls = []
+
+    def geocode(geophrase):
+        calls.append(geophrase)
+        raise GeocoderTimedOut('timed out')
+
+    class DownNominatim(FlakyNominatim):
+        def __init__(self, user_agent = None, timeout = None):
+            self.geocode = geocode
+
+    monkeypatch.setattr(txt2geo, 'Nominatim', DownNominatim)
+    strings = ['Lab ' + str(i) + ', Germany' for i in range(5)]
+    lat, lon, txt = txt2geo.get_lat_lon_from_text(strings, min_delay_seconds = None)
+    assert calls.count(' Germany') == txt2geo.MAX_GEOCODE_FAILURES
+    assert txt == []
+
+def test_concurrent_transient_error_is_retried(monkeypatch):
+    calls = []
+
+    def nominatim_search(geophrase, **kwargs):
+        calls.append(geophrase)
+        if calls.count(geophrase) == 1: raise URLError('connection reset')
+        return LOCATIONS.get(geophrase)
+
+    monkeypatch.setattr(txt2geo, 'nominatim_search', nominatim_search)
+    lat, lon, txt = txt2geo.get_lat_lon_from_text(['Lab A, Germany', 'Lab B, Germany'],
+                                                  endpoints = [{'url': 'http://localhost:8080',
+                                                                'rate': 1000.}]
+                                                  )
+    assert lat == [51., 51.] and lon == [10., 10.]
+    assert calls == [' Germany', ' Germany']
+
+def nominatim_stub(statuses = ()):
+    '''
+    respond() of a local Nominatim (see conftest.LocalServer) that answers 
+    with the HTTP statuses in statuses first and then with the search 
+    results of LOCATIONS
+    '''
+    statuses = list(statuses)
+    def respond(path, params):
+        if statuses: return statuses.pop(0), b''
+        location = LOCATIONS.get(params['q'])
+        results = [] if location is None else [{'lat': str(location.latitude), 
+                                                'lon': str(location.longitude)}]
+        return 200, json.dumps(results).encode()
+    
+    return respond
+
+def test_nominatim_search_retries_busy_server(local_server):
+    server = local_server(nominatim_stub(statuses = [429, 503]))
+    
+    location = txt2geo.nominatim_search(' Germany', url = server.url, backoff_sec = 0.01)
+    
+    assert location == (51., 10.)
+    assert server.paths() == ['/search'] * 3
+    assert server.requests[0][2] == {'q': ' Germany', 'format': 'json', 'limit': '1'}
+    assert txt2geo.nominatim_search('Nowhere', url = server.url) is None
+
+def test_nominatim_search_errors(local_server):
+    server = local_server(nominatim_stub(statuses = [503, 503, 404]))
+    with pytest.raises(HTTPError):#after max_attempts
+        txt2geo.nominatim_search(' Germany', url = server.url, max_attempts = 2, backoff_sec = 0.01)
+    with pytest.raises(HTTPError):#not retried
+        txt2geo.nominatim_search(' Germany', url = server.url, backoff_sec = 0.01)
+    assert len(server.requests) == 3
+    
+    server = local_server(lambda path, params: (200, b'{"error": "Rate limited"}'))
+    with pytest.raises(ValueError):
+        txt2geo.nominatim_search(' Germany', url = server.url)
+
+def test_geocode_concurrent_fails_over_to_next_endpoint(local_server):
+    down = local_server(lambda path, params: (503, b''))
+    up = local_server(nominatim_stub())
+    endpoints = [{'url': down.url, 'rate': 1000., 'concurrency': 2, 
+                  'max_attempts': 2, 'backoff_sec': 0.01},
+                 {'url': up.url, 'rate': 1000.}]
+    geophrases = [' Germany', 'Lab 0', 'Lab 1', 'Lab 2']
+    
+    locations, failed = txt2geo.geocode_concurrent(geophrases, endpoints = endpoints)
+    
+    assert failed == []
+    assert locations == {' Germany': (51., 10.), 'Lab 0': None, 'Lab 1': None, 'Lab 2': None}
+    # The geophrases taken by the workers of the endpoint that is down are 
+    # tried max_attempts times there and then at the next endpoint
+    down_geophrases = [params['q'] for _, _, params in down.requests]
+    up_geophrases = [params['q'] for _, _, params in up.requests]
+    assert sorted(up_geophrases) == sorted(geophrases)
+    assert all([down_geophrases.count(q) == 2 for q in down_geophrases])
+    assert len(down_geophrases) > 0
+    
+    locations, failed = txt2geo.geocode_concurrent(geophrases, endpoints = endpoints[:1])
+    assert locations == {} and sorted(failed) == sorted(geophrases)
+
+def test_get_lat_lon_from_local_endpoints(local_server):
+    busy = local_server(nominatim_stub(statuses = [429]))
+    up = local_server(nominatim_stub())
+    endpoints = [{'url': server.url, 'rate': 1000., 'backoff_sec': 0.01} for server in (busy, up)]
+    
+    lat, lon, txt = txt2geo.get_lat_lon_from_text(['Lab A, Germany', 'Lab B, Germany', 'Lab C'],
+                                                  endpoints = endpoints
+                                                  )
+    
+    assert lat[:2] == [51., 51.] and lon[:2] == [10., 10.] and np.isnan(lat[2])
+    assert txt == [' Germany', ' Germany']
+    
+def geonames_row(geonameid, name, lat, lon, feature_class, feature_code, 
+                 country_code, population):
+    row = {column: '' for column in txt2geo.GEONAMES_COLUMNS}
+    row.update(geonameid = str(geonameid), name = name, asciiname = name,
+               latitude = str(lat), longitude = str(lon), 
+               feature_class = feature_class, feature_code = feature_code,
+               country_code = country_code, population = str(population))
+    return '\t'.join([row[column] for column in txt2geo.GEONAMES_COLUMNS])
+
+def write_geonames(path, rows):
+    path.write_text('\n'.join([geonames_row(*row) for row in rows]) + '\n', 
+                    encoding = 'utf-8')
+    return path
+
+# Places of Greece, whose population-weighted mean is in the Aegean Sea
+GREEK_PLACES = [
+    (1, 'Athens', 37.98, 23.73, 'P', 'PPLC', 'GR', 664046),
+    (2, 'Thessaloniki', 40.64, 22.94, 'P', 'PPLA', 'GR', 354290),
+    (3, 'Heraklion', 35.33, 25.14, 'P', 'PPLA', 'GR', 140730),
+    ]
+
+def test_country_from_country_record(tmp_path):
+    path = write_geonames(tmp_path / 'allCountries.txt', 
+                          GREEK_PLACES + 
+                          [(4, 'Hellenic Republic', 39., 22., 'A', 'PCLI', 'GR', 10716322),
+                           # A historical entity must not override the country
+                           (5, 'Kingdom of Greece', 38., 21., 'A', 'PCLH', 'GR', 0)])
+    gazetteer = txt2geo.load_gazetteer(path)
+    assert gazetteer['greece'] == (39., 22.)
+    assert gazetteer['athens'] == (37.98, 23.73)
+
+def test_country_without_country_record(tmp_path):
+    path = write_geonames(tmp_path / 'cities15000.txt', GREEK_PLACES)
+    gazetteer = txt2geo.load_gazetteer(path)
+    # The most populated place, not the mean of the places
+    assert gazetteer['greece'] == (37.98, 23.73)
+    assert 'germany' not in gazetteer
+
+def trace_countries_loop(txt, allowed_countries = []):
+    # The loop over the countries of pycountry that trace_countries_in_text() 
+    # used before the automaton
+    txt_allowed = []
+    txt_not_allowed = []
+    for t in txt:
+        not_allowed = False
+        for country in pycountry.countries:
+            if country.name in t and country.name not in allowed_countries:
+                not_allowed = True
+        if not_allowed is True:
+            txt_not_allowed.append(t)
+        else:
+            txt_allowed.append(t)
+    
+    return txt_allowed, txt_not_allowed
+
+def test_overlapping_country_names():
+    matches = txt2geo.find_countries('Univ of Niamey, Niger and Lagos, Nigeria')
+    
+    assert matches == [(16, 21, 'Niger'), (33, 38, 'Niger'), (33, 40, 'Nigeria')]
+    assert txt2geo.find_countries('Lagos, Nigeria', whole_words = True) == [(7, 14, 'Nigeria')]
+
+def test_subdivisions_are_whole_words():
+    automaton = txt2geo.build_country_automaton(subdivisions = True)
+    
+    matches = txt2geo.find_countries('Bavaria, Germany and Ba, Fiji', automaton = automaton)
+    
+    assert matches == [(9, 16, 'Germany'), (21, 23, 'Fiji'), (25, 29, 'Fiji')]
+
+def test_trace_countries_matches_old_loop():
+    rng = random.Random(0)
+    names = [country.name for country in pycountry.countries]
+    words = ['Dept of Physics', 'University', 'Hospital', 'Niger', 'Nigeria', 
+             'Guinea', 'Papua New Guinea', 'Dominica', 'Dominican Republic', 
+             'Sudan', 'South Sudan', 'Indiana', 'India', 'Jersey', 'New Jersey']
+    txt = [', '.join(rng.sample(words + names, rng.randint(1, 4))) for _ in range(500)]
+    allowed_countries = ['Niger', 'India', 'Guinea', 'France', 'Germany']
+    
+    assert (txt2geo.trace_countries_in_text(txt, allowed_countries = allowed_countries) == 
+            trace_countries_loop(txt, allowed_countries = allowed_countries))